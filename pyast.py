@@ -0,0 +1,717 @@
+from pylex import TokenType
+from pyparser import Kind
+from pywalk import Visitor, preorder
+
+
+# 抽象语法树：去掉语法分析树中的标点(括号、冒号、花括号、逗号)、合成的NEWLINE结点和
+# 只起串联作用的*_rest/statement/compound_stmt等中间结点，每个结点只保留语义和所在的行号line。
+# children()按顺序列出子结点(结点列表展开)，供遍历使用；字符串等普通属性不在其中。
+
+class AstNode:
+    __slots__ = ("line",)
+
+    def children(self):
+        return ()
+
+
+# ---------------- 语句 ----------------
+
+class Module(AstNode):
+    # imports是import进来的名字(Name)，与语法树program结点的imported_names一一对应
+    __slots__ = ("body", "imports")
+
+    def __init__(self, body, imports, line=1):
+        self.body = body
+        self.imports = imports
+        self.line = line
+
+    def children(self):
+        return self.body
+
+
+class FunctionDef(AstNode):
+    # args是形参列表，元素为Name或带默认值的Keyword
+    __slots__ = ("name", "args", "body")
+
+    def __init__(self, name, args, body, line):
+        self.name = name
+        self.args = args
+        self.body = body
+        self.line = line
+
+    def children(self):
+        return self.args + self.body
+
+
+class If(AstNode):
+    # orelse：没有else时为None；elif时为一个If结点；else时为语句列表
+    __slots__ = ("test", "body", "orelse")
+
+    def __init__(self, test, body, orelse, line):
+        self.test = test
+        self.body = body
+        self.orelse = orelse
+        self.line = line
+
+    def children(self):
+        if self.orelse is None:
+            return [self.test] + self.body
+        if self.orelse.__class__ is If:
+            return [self.test] + self.body + [self.orelse]
+        return [self.test] + self.body + self.orelse
+
+
+class For(AstNode):
+    __slots__ = ("target", "iter", "body")
+
+    def __init__(self, target, iter, body, line):
+        self.target = target
+        self.iter = iter
+        self.body = body
+        self.line = line
+
+    def children(self):
+        return [self.target, self.iter] + self.body
+
+
+class While(AstNode):
+    __slots__ = ("test", "body")
+
+    def __init__(self, test, body, line):
+        self.test = test
+        self.body = body
+        self.line = line
+
+    def children(self):
+        return [self.test] + self.body
+
+
+class Return(AstNode):
+    __slots__ = ("value",)
+
+    def __init__(self, value, line):
+        self.value = value
+        self.line = line
+
+    def children(self):
+        return (self.value,)
+
+
+class Import(AstNode):
+    __slots__ = ("names",)
+
+    def __init__(self, names, line):
+        self.names = names
+        self.line = line
+
+    def children(self):
+        return self.names
+
+
+class Alias(AstNode):
+    # name是模块名("os.path")，asname是as后的别名，没有时为None
+    __slots__ = ("name", "asname")
+
+    def __init__(self, name, asname, line):
+        self.name = name
+        self.asname = asname
+        self.line = line
+
+
+class Assign(AstNode):
+    __slots__ = ("target", "value")
+
+    def __init__(self, target, value, line):
+        self.target = target
+        self.value = value
+        self.line = line
+
+    def children(self):
+        return (self.target, self.value)
+
+
+class AugAssign(AstNode):
+    # op是增量赋值号本身，如"+="
+    __slots__ = ("target", "op", "value")
+
+    def __init__(self, target, op, value, line):
+        self.target = target
+        self.op = op
+        self.value = value
+        self.line = line
+
+    def children(self):
+        return (self.target, self.value)
+
+
+class Expr(AstNode):
+    # 表达式语句
+    __slots__ = ("value",)
+
+    def __init__(self, value, line):
+        self.value = value
+        self.line = line
+
+    def children(self):
+        return (self.value,)
+
+
+class Pass(AstNode):
+    __slots__ = ()
+
+    def __init__(self, line):
+        self.line = line
+
+
+class Break(AstNode):
+    __slots__ = ()
+
+    def __init__(self, line):
+        self.line = line
+
+
+class Continue(AstNode):
+    __slots__ = ()
+
+    def __init__(self, line):
+        self.line = line
+
+
+# ---------------- 表达式 ----------------
+
+class Name(AstNode):
+    __slots__ = ("id",)
+
+    def __init__(self, id, line):
+        self.id = id
+        self.line = line
+
+
+class Constant(AstNode):
+    # value是Python值：字符串为str，数字为float，True/False/None为对应的常量
+    __slots__ = ("value",)
+
+    def __init__(self, value, line):
+        self.value = value
+        self.line = line
+
+
+class BinOp(AstNode):
+    # op是运算符记号的值，如"+"、"=="、"and"
+    __slots__ = ("left", "op", "right")
+
+    def __init__(self, left, op, right, line):
+        self.left = left
+        self.op = op
+        self.right = right
+        self.line = line
+
+    def children(self):
+        return (self.left, self.right)
+
+
+class UnaryOp(AstNode):
+    __slots__ = ("op", "operand")
+
+    def __init__(self, op, operand, line):
+        self.op = op
+        self.operand = operand
+        self.line = line
+
+    def children(self):
+        return (self.operand,)
+
+
+class Call(AstNode):
+    # args中按顺序是位置参数和关键字参数(Keyword)
+    __slots__ = ("func", "args")
+
+    def __init__(self, func, args, line):
+        self.func = func
+        self.args = args
+        self.line = line
+
+    def children(self):
+        return [self.func] + self.args
+
+
+class Keyword(AstNode):
+    __slots__ = ("arg", "value")
+
+    def __init__(self, arg, value, line):
+        self.arg = arg
+        self.value = value
+        self.line = line
+
+    def children(self):
+        return (self.value,)
+
+
+class Attribute(AstNode):
+    __slots__ = ("value", "attr")
+
+    def __init__(self, value, attr, line):
+        self.value = value
+        self.attr = attr
+        self.line = line
+
+    def children(self):
+        return (self.value,)
+
+
+class Subscript(AstNode):
+    __slots__ = ("value", "slices")
+
+    def __init__(self, value, slices, line):
+        self.value = value
+        self.slices = slices
+        self.line = line
+
+    def children(self):
+        return [self.value] + self.slices
+
+
+class Tuple(AstNode):
+    # 圆括号括起的表达式，(x)也是只有一个元素的Tuple，与语法分析树一致
+    __slots__ = ("elts",)
+
+    def __init__(self, elts, line):
+        self.elts = elts
+        self.line = line
+
+    def children(self):
+        return self.elts
+
+
+class List(AstNode):
+    __slots__ = ("elts",)
+
+    def __init__(self, elts, line):
+        self.elts = elts
+        self.line = line
+
+    def children(self):
+        return self.elts
+
+
+def ast_children(node):
+    return node.children()
+
+
+def walk(node):
+    """先序遍历抽象语法树，依次产生各个结点。"""
+    return preorder(node, ast_children)
+
+
+class AstVisitor(Visitor):
+    # 按抽象语法树结点的类分派：visit_BinOp处理BinOp结点，默认计算children()中的全部子结点
+    key = staticmethod(type)
+
+    @staticmethod
+    def key_of(name):
+        return globals()[name]
+
+    def generic_children(self, node):
+        return node.children()
+
+    def emit(self, *parts):
+        """按源程序顺序生成parts的文本。片段是原样输出的字符串、要展开的结点，
+        或(结点, 附加参数...)元组；处理函数visit_<类名>(self, node, *附加参数)返回结点的文本，
+        或者按顺序排列的片段列表。片段用显式栈展开，树再深也不递归；文本最后一次拼接。"""
+        dispatch = self.dispatch
+        text = []
+        stack = list(reversed(parts))
+        pop, extend, append = stack.pop, stack.extend, text.append
+        while stack:
+            part = pop()
+            cls = part.__class__
+            if cls is str:
+                append(part)
+                continue
+            if cls is tuple:
+                result = dispatch[part[0].__class__](self, *part)
+            else:
+                result = dispatch[cls](self, part)
+            if result.__class__ is str:
+                append(result)
+            else:
+                extend(reversed(result))
+        return "".join(text)
+
+
+# ---------------- 由语法分析树转换 ----------------
+# Lowering把语法分析树结点转换成抽象语法树结点(或结点列表)，行号取结点中第一个记号的行号。
+# children_<类型>列出要先转换的子结点：跳过标点，*_rest链展开成一串，block直接取其中的statements；
+# visit_<类型>由这些子结点转换的结果(values)构造这个结点。Visitor.visit用显式栈按后序进行，
+# 代码块、括号和elif嵌套再深也不递归。
+
+CONSTANTS = {
+    TokenType.NUMBER: lambda value: value,
+    TokenType.STRING: lambda value: value,
+    TokenType.TRUE: lambda value: True,
+    TokenType.FALSE: lambda value: False,
+    TokenType.NONE: lambda value: None,
+}
+
+
+def lower(tree):
+    """把pyparser得到的语法树(program或EMPTYprogram结点)转换成Module。"""
+    imports = lower_imports(tree)
+    if tree.kind != Kind.program:
+        return Module([], imports)
+    return Module(LOWERING.visit(tree.children[0]), imports)
+
+
+def lower_imports(tree):
+    return [Name(name.value.value, name.value.linenum) for name in tree.imported_names]
+
+
+def lower_statement(node):
+    # statement结点 -> 一条语句
+    return LOWERING.visit(node)
+
+
+def lower_arguments(node):
+    # arguments结点(没有参数时为None) -> 参数列表
+    return [] if node is None else LOWERING.visit(node)
+
+
+def lower_leaf(token):
+    if token.tokenType is TokenType.IDENTIFIER:
+        return Name(token.value, token.linenum)
+    return Constant(CONSTANTS[token.tokenType](token.value), token.linenum)
+
+
+def statement_body(node):
+    # statement-> compound_stmt| simple_stmt NEWLINE，复合语句取compound_stmt里面的结点
+    inner = node.children[0]
+    if inner.kind == Kind.compound_stmt:
+        return inner.children[0]
+    return inner
+
+
+def argument_operands(node):
+    # arguments-> kwarg arguments_rest| 空；arguments_rest-> COMMA arguments| 空
+    # 各个参数中要转换的结点。只是一个原子的参数(kwarg-> atom_rest，后面没有expr_rest)转换的结果就是这个原子，
+    # 直接列出原子，不再经过kwarg结点
+    args = []
+    while node is not None:
+        kwarg, rest = node.children
+        first, second = kwarg.children
+        args.append(first.children[0] if second is None and first.kind == ATOM_REST else kwarg)
+        node = rest.children[1] if rest is not None else None
+    return args
+
+
+def rest_operands(rest):
+    # expr_rest中要转换的结点：调用的各个参数、下标的slices或运算符右边的表达式
+    if rest is None:
+        return ()
+    children = rest.children
+    tokenType = children[0].value.tokenType
+    if tokenType is TokenType.DOT:
+        call = children[2]  # object_rest-> LPAREN arguments RPAREN
+        if call is None:
+            return ()
+        return argument_operands(call.children[1])
+    if tokenType is TokenType.LPAREN:
+        return argument_operands(children[1])
+    return (children[1],)
+
+
+def apply_rest(base, rest, values):
+    # expr_rest接在base后面：运算符和右操作数、.属性(及调用)、调用或下标；
+    # values是rest_operands中各结点转换的结果，调用时直接用作参数列表
+    if rest is None:
+        return base
+    children = rest.children
+    token = children[0].value
+    tokenType = token.tokenType
+    if tokenType is TokenType.DOT:
+        node = Attribute(base, children[1].value.value, base.line)
+        if children[2] is not None:
+            node = Call(node, values or [], base.line)
+        return node
+    if tokenType is TokenType.LPAREN:
+        return Call(base, values or [], base.line)
+    if tokenType is TokenType.LBRACKET:
+        return Subscript(base, values[0], base.line)
+    return BinOp(base, token.value, values[0], base.line)
+
+
+def lower_dotted_as_names(node):
+    # dotted_as_names->dotted_as_name dotted_as_names_rest；dotted_as_names_rest-> COMMA dotted_as_names| 空
+    names = []
+    while node is not None:
+        dotted_name, as_rest = node.children[0].children
+        first = dotted_name.children[0].value
+        name = first.value
+        if dotted_name.children[1] is not None:
+            name += "." + dotted_name.children[1].children[1].value.value
+        asname = as_rest.children[1].value.value if as_rest is not None else None
+        names.append(Alias(name, asname, first.linenum))
+        rest = node.children[1]
+        node = rest.children[1] if rest is not None else None
+    return names
+
+
+class Lowering(Visitor):
+    def generic_children(self, node):
+        return ()
+
+    def lower_token(self, node, values):
+        token = node.value
+        tokenType = token.tokenType
+        if tokenType is TokenType.IDENTIFIER:
+            return Name(token.value, token.linenum)
+        if tokenType is TokenType.NUMBER or tokenType is TokenType.STRING:
+            return Constant(token.value, token.linenum)
+        return Constant(CONSTANTS[tokenType](token.value), token.linenum)
+
+    visit_IDENTIFIER = visit_NUMBER = visit_STRING = visit_TRUE = visit_FALSE = visit_NONE = lower_token
+    children_IDENTIFIER = children_NUMBER = children_STRING = children_TRUE = children_FALSE = children_NONE = None
+
+    # ---------------- 语句 ----------------
+
+    def children_statements(self, node):
+        # statement-> compound_stmt| simple_stmt NEWLINE，直接列出里面的复合语句或简单语句
+        body = []
+        append = body.append
+        for statement in node.children:
+            inner = statement.children[0]
+            append(inner.children[0] if inner.kind == COMPOUND_STMT else inner)
+        return body
+
+    def visit_statements(self, node, values):
+        return values
+
+    def children_statement(self, node):
+        return (statement_body(node),)
+
+    def visit_statement(self, node, values):
+        return values[0]
+
+    def children_simple_stmt(self, node):
+        children = node.children
+        first = children[0]
+        kind = first.kind
+        if kind == Kind.identifier_stmt:
+            # identifier_stmt-> IDENTIFIER identifier_opt；identifier_opt-> 赋值号 expression| expr_rest
+            opt = first.children[1]
+            if opt is None:
+                return ()
+            if len(opt.children) == 2:
+                return (opt.children[1],)
+            return rest_operands(opt.children[0])
+        if kind == Kind.atom_rest:
+            # atom_rest: TRUE| FALSE| NONE| NUMBER| STRING| tuple| list
+            return (first.children[0], *rest_operands(children[1]))
+        if kind == Kind.return_stmt:
+            return (first.children[1],)
+        if kind == Kind.import_stmt or first.value.tokenType in SIMPLE_KEYWORDS:
+            return ()
+        return (children[1],)  # NOT inversion| PLUS factor| MINUS factor
+
+    def visit_simple_stmt(self, node, values):
+        first = node.children[0]
+        kind = first.kind
+        if kind == Kind.identifier_stmt:
+            token = first.children[0].value
+            name = Name(token.value, token.linenum)
+            opt = first.children[1]
+            if opt is None:
+                return Expr(name, name.line)
+            if len(opt.children) == 2:
+                operator = opt.children[0].value
+                if operator.tokenType is TokenType.ASSIGN:
+                    return Assign(name, values[0], name.line)
+                return AugAssign(name, operator.value, values[0], name.line)
+            return Expr(apply_rest(name, opt.children[0], values), name.line)
+        if kind == Kind.atom_rest:
+            base = values[0]
+            return Expr(apply_rest(base, node.children[1], values[1:]), base.line)
+        if kind == Kind.return_stmt:
+            return Return(values[0], first.children[0].value.linenum)
+        if kind == Kind.import_stmt:
+            return Import(lower_dotted_as_names(first.children[1]), first.children[0].value.linenum)
+        token = first.value
+        if token.tokenType is TokenType.PASS:
+            return Pass(token.linenum)
+        if token.tokenType is TokenType.BREAK:
+            return Break(token.linenum)
+        if token.tokenType is TokenType.CONTINUE:
+            return Continue(token.linenum)
+        return Expr(UnaryOp(token.value, values[0], token.linenum), token.linenum)
+
+    def children_function_def(self, node):
+        # function_def-> DEF IDENTIFIER LPAREN arguments RPAREN COLON block
+        # block-> NEWLINE LBRACE statements RBRACE NEWLINE，开头的NEWLINE不在结点中
+        children = node.children
+        body = children[6].children[1]
+        return (body,) if children[3] is None else (children[3], body)
+
+    def visit_function_def(self, node, values):
+        children = node.children
+        args = [] if children[3] is None else values[0]
+        return FunctionDef(children[1].value.value, args, values[-1], children[0].value.linenum)
+
+    def children_if_stmt(self, node):
+        # if_stmt-> IF expression COLON block if_stmt_rest，elif_stmt的形状与它相同；
+        # if_stmt_rest-> elif_stmt| else_block，else_block-> ELSE COLON block
+        children = node.children
+        operands = [children[1], children[3].children[1]]
+        rest = children[4]
+        if rest is not None:
+            inner = rest.children[0]
+            operands.append(inner if inner.kind == Kind.elif_stmt else inner.children[2].children[1])
+        return operands
+
+    def visit_if_stmt(self, node, values):
+        # orelse：elif时为If结点，else时为语句列表
+        orelse = values[2] if len(values) == 3 else None
+        return If(values[0], values[1], orelse, node.children[0].value.linenum)
+
+    children_elif_stmt = children_if_stmt
+    visit_elif_stmt = visit_if_stmt
+
+    def children_for_stmt(self, node):
+        # for_stmt: FOR IDENTIFIER IN expression COLON block；while语句也是for_stmt结点：WHILE expression COLON block
+        children = node.children
+        if children[0].value.tokenType is TokenType.WHILE:
+            return (children[1], children[3].children[1])
+        return (children[3], children[5].children[1])
+
+    def visit_for_stmt(self, node, values):
+        children = node.children
+        keyword = children[0].value
+        if keyword.tokenType is TokenType.WHILE:
+            return While(values[0], values[1], keyword.linenum)
+        target = children[1].value
+        return For(Name(target.value, target.linenum), values[0], values[1], keyword.linenum)
+
+    # ---------------- 表达式 ----------------
+
+    def children_binop(self, node):
+        # 同一优先级的运算符链[a, +, b, -, c]
+        return node.children[::2]
+
+    def visit_binop(self, node, values):
+        # 按左结合展开
+        children = node.children
+        left = values[0]
+        for i in range(1, len(values)):
+            left = BinOp(left, children[2 * i - 1].value.value, values[i], left.line)
+        return left
+
+    def children_primary(self, node):
+        # primary-> atom {DOT IDENTIFIER| LPAREN arguments RPAREN| LBRACKET slices RBRACKET}
+        children = node.children
+        operands = [children[0]]
+        i = 1
+        while i < len(children):
+            if children[i].value.tokenType is TokenType.DOT:
+                i += 2
+            else:
+                if children[i + 1] is not None:
+                    operands.append(children[i + 1])
+                i += 3
+        return operands
+
+    def visit_primary(self, node, values):
+        children = node.children
+        result = values[0]
+        k = 1
+        i = 1
+        while i < len(children):
+            tokenType = children[i].value.tokenType
+            if tokenType is TokenType.DOT:
+                result = Attribute(result, children[i + 1].value.value, result.line)
+                i += 2
+                continue
+            if tokenType is TokenType.LPAREN and children[i + 1] is None:
+                result = Call(result, [], result.line)
+            elif tokenType is TokenType.LPAREN:
+                result = Call(result, values[k], result.line)
+                k += 1
+            else:
+                result = Subscript(result, values[k], result.line)
+                k += 1
+            i += 3
+        return result
+
+    def children_unary(self, node):
+        return (node.children[1],)
+
+    def visit_unary(self, node, values):
+        token = node.children[0].value
+        return UnaryOp(token.value, values[0], token.linenum)
+
+    def children_tuple(self, node):
+        # tuple-> LPAREN tuple_rest；tuple_rest-> RPAREN| expressions RPAREN，list与它相同
+        rest = node.children[1]
+        return (rest.children[0],) if len(rest.children) == 2 else ()
+
+    def visit_tuple(self, node, values):
+        return Tuple(values[0] if values else [], node.children[0].value.linenum)
+
+    children_list = children_tuple
+
+    def visit_list(self, node, values):
+        return List(values[0] if values else [], node.children[0].value.linenum)
+
+    def children_expressions(self, node):
+        # expressions-> expression expressions_rest；expressions_rest-> COMMA expression expressions_rest| 空
+        elts = [node.children[0]]
+        rest = node.children[1]
+        while rest is not None:
+            elts.append(rest.children[1])
+            rest = rest.children[2]
+        return elts
+
+    def visit_expressions(self, node, values):
+        return values
+
+    def children_slices(self, node):
+        # slices-> expression slices_rest；slices_rest-> COMMA slices| 空
+        slices = []
+        while node is not None:
+            slices.append(node.children[0])
+            rest = node.children[1]
+            node = rest.children[1] if rest is not None else None
+        return slices
+
+    visit_slices = visit_expressions
+
+    def children_arguments(self, node):
+        return argument_operands(node)
+
+    visit_arguments = visit_expressions
+
+    def children_kwarg(self, node):
+        # kwarg-> IDENTIFIER kwarg_rest| atom_rest expr_rest| NOT inversion| PLUS factor| MINUS factor
+        first, second = node.children
+        if first.kind == Kind.atom_rest:
+            return (first.children[0], *rest_operands(second))
+        if first.value.tokenType is not TokenType.IDENTIFIER:
+            return (second,)
+        # kwarg_rest-> ASSIGN expression| expr_rest
+        if len(second.children) == 2:
+            return (second.children[1],)
+        return rest_operands(second.children[0])
+
+    def visit_kwarg(self, node, values):
+        first, second = node.children
+        if first.kind == Kind.atom_rest:
+            return apply_rest(values[0], second, values[1:])
+        token = first.value
+        if token.tokenType is not TokenType.IDENTIFIER:
+            return UnaryOp(token.value, values[0], token.linenum)
+        if len(second.children) == 2:
+            return Keyword(token.value, values[0], token.linenum)
+        return apply_rest(Name(token.value, token.linenum), second.children[0], values)
+
+
+ATOM_REST = Kind.atom_rest
+COMPOUND_STMT = Kind.compound_stmt
+SIMPLE_KEYWORDS = frozenset({TokenType.PASS, TokenType.BREAK, TokenType.CONTINUE})
+LOWERING = Lowering()
@@ -0,0 +1,734 @@
+import contextlib
+import gc
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from pylex import Lexer, DFALexer, TableLexer, TokenBuffer
+from pylex import MappedSource, ParallelLexer, EditableLexer, LexError, table_tokens, relex_lines
+from pylex import translate_run_only
+from pylex import read_file_to_string
+
+
+def sample_source(copies=200):
+    """把test.py重复若干次，作为基准测试的输入。"""
+    program = read_file_to_string("test.py")
+    return "\n".join([program] * copies) + "\n"
+
+
+def timeit(fun, *args, repeat=3):
+    # 取多次运行中最快的一次
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fun(*args)
+        cost = time.perf_counter() - start
+        if best is None or cost < best:
+            best = cost
+    return best, result
+
+
+def token_tuples(tokens):
+    return [(token.tokenType, token.value, token.linenum) for token in tokens]
+
+
+def bench_lexer(copies=200):
+    # 比较手写DFA与表驱动DFA的吞吐量（字符/秒），并确认两者的记号流一致
+    source = sample_source(copies)
+    dfa_time, dfa_tokens = timeit(DFALexer, source)
+    table_time, table_tokens = timeit(TableLexer, source)
+    assert token_tuples(dfa_tokens) == token_tuples(table_tokens)
+    print(f"lexer  {len(source)} chars, {len(dfa_tokens)} tokens")
+    print(f"  dfa    {len(source) / dfa_time:>12.0f} chars/sec")
+    print(f"  table  {len(source) / table_time:>12.0f} chars/sec  x{dfa_time / table_time:.2f}")
+
+
+def first_error_time(source, stream):
+    # 语法分析器遇到第一个错误就退出，记录从开始到退出所用的时间
+    from pyparser import Parser
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            Parser(source if stream else Lexer(source)).parse()
+    except SystemExit:
+        pass
+    return time.perf_counter() - start
+
+
+def bench_stream(copies=200):
+    # 第2行就有语法错误的大文件：先得到整个记号表再分析 vs 边分析边取记号
+    source = "import turtle\nx = = 1\n" + sample_source(copies)
+    list_time = first_error_time(source, stream=False)
+    stream_time = first_error_time(source, stream=True)
+    print(f"first syntax error in {len(source)} chars")
+    print(f"  token list  {list_time * 1000:>8.2f} ms")
+    print(f"  stream      {stream_time * 1000:>8.2f} ms")
+
+
+def allocated(fun, *args):
+    # fun(*args)的结果仍然存活时占用的内存（字节）
+    gc.collect()
+    tracemalloc.start()
+    result = fun(*args)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, result
+
+
+def bench_token_buffer(copies=200):
+    # Token对象列表与结构数组记号表的内存对比
+    source = sample_source(copies)
+    list_size, tokens = allocated(TableLexer, source)
+    buffer_size, buffer = allocated(TokenBuffer, source)
+    assert token_tuples(tokens) == token_tuples(buffer)
+    print(f"token memory  {len(source)} chars source, {len(tokens)} tokens")
+    print(f"  Token list   {list_size:>12} bytes")
+    print(f"  TokenBuffer  {buffer_size:>12} bytes  x{list_size / buffer_size:.1f} smaller")
+
+
+def peak_allocated(fun, *args):
+    # fun(*args)运行期间的内存峰值（字节）
+    gc.collect()
+    tracemalloc.start()
+    result = fun(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, result
+
+
+def count_read_tokens(filename):
+    return sum(1 for _ in table_tokens(read_file_to_string(filename)))
+
+
+def count_mapped_tokens(filename):
+    with MappedSource(filename) as source:
+        return sum(1 for _ in source)
+
+
+def bench_mapped(copies=1000):
+    # 读成str后分析 vs mmap映射后在字节上分析，记号都是边产生边丢弃
+    fd, filename = tempfile.mkstemp(suffix=".py")
+    with os.fdopen(fd, "w", encoding="utf-8") as file:
+        file.write(sample_source(copies))
+    try:
+        size = os.path.getsize(filename)
+        read_peak, read_count = peak_allocated(count_read_tokens, filename)
+        mapped_peak, mapped_count = peak_allocated(count_mapped_tokens, filename)
+        read_time = timeit(count_read_tokens, filename, repeat=1)[0]
+        mapped_time = timeit(count_mapped_tokens, filename, repeat=1)[0]
+    finally:
+        os.remove(filename)
+    assert read_count == mapped_count
+    print(f"file lexing  {size} bytes, {read_count} tokens")
+    print(f"  read str  peak {read_peak:>12} bytes  {read_time:.2f} s")
+    print(f"  mmap      peak {mapped_peak:>12} bytes  {mapped_time:.2f} s")
+
+
+def bench_parallel(copies=1000):
+    # 多进程分块词法分析随进程数的扩展情况
+    source = sample_source(copies)
+    serial_time, serial_tokens = timeit(TableLexer, source, repeat=1)
+    expected = token_tuples(serial_tokens)
+    print(f"parallel lexing  {len(source)} chars, {os.cpu_count()} cpus")
+    print(f"  serial     {serial_time:.2f} s")
+    workers = 1
+    while workers <= max(4, os.cpu_count()):
+        cost, tokens = timeit(ParallelLexer, source, workers, len(source) // (workers * 4) + 1, repeat=1)
+        assert token_tuples(tokens) == expected
+        print(f"  {workers:>2} procs   {cost:.2f} s  x{serial_time / cost:.2f}")
+        workers *= 2
+
+
+def bench_relex(edits=200):
+    # 在文件中间改一行、加一行再删掉，单次增量分析的耗时应与文件大小无关
+    print("incremental relex, one-line edit")
+    for copies in (100, 1000):
+        source = sample_source(copies)
+        tokens = EditableLexer(source)
+        middle = source.count("\n") // 2
+        start = time.perf_counter()
+        for _ in range(edits):
+            relex_lines(tokens, middle, middle, "turtle.forward(size * 2)\n")
+        same_cost = (time.perf_counter() - start) / edits
+        start = time.perf_counter()
+        for _ in range(edits):
+            relex_lines(tokens, middle, middle, "turtle.forward(size * 2)\nturtle.left(90)\n")
+            relex_lines(tokens, middle, middle + 1, "turtle.forward(size * 2)\n")
+        shift_cost = (time.perf_counter() - start) / (2 * edits)
+        assert token_tuples(tokens) == token_tuples(TableLexer(tokens_source(source, middle)))
+        # 编辑到一半的行有词法错误(未结束的字符串)：不退出，记下错误或抛出LexError，不给errors时记号表不变
+        unchanged = token_tuples(tokens)
+        try:
+            relex_lines(tokens, middle, middle, "turtle.forward('abc)\n")
+        except LexError as error:
+            assert error.diagnostic.linenum == middle
+        else:
+            raise AssertionError("relex_lines没有报告词法错误")
+        assert token_tuples(tokens) == unchanged
+        errors = []
+        relex_lines(tokens, middle, middle, "turtle.forward('abc)\n", errors)
+        assert [error.linenum for error in errors] == [middle]
+        relex_lines(tokens, middle, middle, "turtle.forward(size * 2)\n")
+        print(f"  {len(source):>9} chars  same lines {same_cost * 1e6:>8.1f} us/edit  "
+              f"line added/removed {shift_cost * 1e6:>8.1f} us/edit  (full relex {timeit(TableLexer, source, repeat=1)[0] * 1e3:.1f} ms)")
+
+
+def tokens_source(source, line):
+    # bench_relex改过第line行之后的源程序
+    lines = source.splitlines(keepends=True)
+    lines[line - 1] = "turtle.forward(size * 2)\n"
+    return "".join(lines)
+
+
+def bench_run_only(copies=3):
+    # 只运行时：记号流上直接去掉花括号 vs 完整的语法分析和代码生成
+    import pysyntax
+    from pyparser import Parser
+    source = sample_source(copies)
+
+    def full(source):
+        parser = Parser(source)
+        return pysyntax.analyse_program(parser.parse(), pysyntax.SyntaxContext(echo=False), parser.call_sites)
+
+    full_time = timeit(full, source)[0]
+    fast_time = timeit(translate_run_only, source)[0]
+    print(f"run-only translation  {len(source)} chars")
+    print(f"  parse + codegen  {full_time * 1e3:>8.2f} ms")
+    print(f"  token strip      {fast_time * 1e3:>8.2f} ms  x{full_time / fast_time:.1f}")
+
+
+def variant_program(k):
+    # 第k个测试程序：改动test.py中的常数和函数名，使每个程序的结果都不同
+    program = read_file_to_string("test.py")
+    return program.replace("100", str(100 + k)).replace("draw_star", f"draw_star{k}")
+
+
+def stress_threads(programs=16, threads=8, rounds=4):
+    # 多个线程同时编译不同的程序，结果必须与逐个编译时完全相同
+    from concurrent.futures import ThreadPoolExecutor
+    from pysyntax import compile_source
+    sources = [variant_program(k) for k in range(programs)]
+    expected = [compile_source(source) for source in sources]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)  # 让线程频繁切换，尽量交错执行
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for _ in range(rounds):
+                assert list(executor.map(compile_source, sources)) == expected
+    finally:
+        sys.setswitchinterval(interval)
+    print(f"thread stress  {programs} programs x {rounds} rounds on {threads} threads: ok")
+
+
+def flat_program(statements):
+    # 有statements条顶层语句的程序
+    lines = ["import turtle"]
+    for k in range(statements - 1):
+        lines.append(f"x{k % 10} = {k} * 2" if k % 2 else f"turtle.forward({k})")
+    return "\n".join(lines) + "\n"
+
+
+def bench_statements(sizes=(25000, 50000, 100000)):
+    # 顶层语句很多的程序：编译时间应随语句数线性增长，且不需要调整递归深度限制
+    from pysyntax import compile_source
+    print(f"statement scaling  (recursion limit {sys.getrecursionlimit()})")
+    for size in sizes:
+        source = flat_program(size)
+        cost = timeit(compile_source, source, repeat=1)[0]
+        print(f"  {size:>7} statements  {cost:.2f} s  {cost / size * 1e6:.1f} us/stmt")
+
+
+def expression_program(lines):
+    # 以表达式为主的程序：路径数据列表和较长的算术表达式
+    rows = ["import turtle"]
+    for k in range(lines):
+        points = ", ".join(f"({k + i} * 1.5 + 2, -{i} / 3 - {k} * 2)" for i in range(8))
+        rows.append(f"path{k % 10} = [{points}]")
+        rows.append(f"turtle.goto(x + {k} * 2 - y / 3 + z * 4 - {k}, c or not a == b and d)")
+    return "\n".join(rows) + "\n"
+
+
+def count_nodes(node):
+    # 语法树中的结点数（不计None）
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node is not None:
+            count += 1
+            stack.extend(node.children)
+    return count
+
+
+def bench_expressions(lines=500):
+    # 以表达式为主的程序：语法树结点数与语法分析时间
+    from pyparser import Parser
+    source = expression_program(lines)
+    cost, tree = timeit(lambda: Parser(source).parse())
+    print(f"expression parsing  {len(source)} chars")
+    print(f"  {count_nodes(tree):>9} nodes  {cost * 1e3:.1f} ms")
+
+
+def tree_shape(node):
+    # 语法树的结构（结点类型、记号、导入名和子结点）展开成元组列表，用于比较两棵树是否相同
+    shape = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            shape.append(None)
+            continue
+        token = node.value and (node.value.tokenType, node.value.value, node.value.linenum)
+        names = [name.value.value for name in node.imported_names]
+        shape.append((node.type, token, names, len(node.children)))
+        stack.extend(reversed(node.children))
+    return shape
+
+
+# 两个分析器都必须拒绝的程序：没有else的if后面还有语句、以一元运算符开头、
+# 调用参数中缺少"["、import语句后面紧跟"}"等
+REJECTED_PROGRAMS = (
+    "import turtle\nif x:\n{turtle.forward(1)}\ny = 1\n",
+    "-x\n",
+    "not x\n",
+    "f(x y 1])\n",
+    "x 1\n",
+    "1 2]\n",
+    "if x:\n{import turtle}\n",
+    "import a.b.c\n",
+    "(1, 2]\n",
+    "f(1\n",
+    "def f():\n{}\n",
+)
+
+
+def rejects(parser_class, tokens):
+    # 语法错误时分析器打印错误后退出
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            parser_class(tokens).parse()
+    except SystemExit:
+        return True
+    return False
+
+
+def bench_ll1(copies=200, lines=500):
+    # 递归下降与表驱动LL(1)分析器的对比，两者得到的语法树必须完全相同，也必须拒绝同样的程序；
+    # 先得到记号表，只比较语法分析本身的时间
+    from pyparser import Parser
+    from pyll1 import LL1Parser
+    print("recursive descent vs LL(1) table")
+    for source in REJECTED_PROGRAMS:
+        tokens = TableLexer(source)
+        assert rejects(Parser, tokens) and rejects(LL1Parser, tokens), source
+    for name, source in (("test.py", sample_source(copies)), ("expressions", expression_program(lines))):
+        tokens = TableLexer(source)
+        rd_time, rd_tree = timeit(lambda: Parser(tokens).parse())
+        ll_time, ll_tree = timeit(lambda: LL1Parser(tokens).parse())
+        assert tree_shape(rd_tree) == tree_shape(ll_tree)
+        print(f"  {name:<12} {len(source):>8} chars  recursive {rd_time * 1e3:>8.1f} ms  LL(1) {ll_time * 1e3:>8.1f} ms  x{rd_time / ll_time:.2f}")
+
+
+# 增量分析的窗口从以一元运算符开头的语句开始时，这些语句在程序中间是合法的
+PREFIX_PROGRAM = "import turtle\n-x\nnot y\n+z\nturtle.forward(1)\nturtle.left(2)\n"
+
+
+def check_reparse(source, first, last, new_text):
+    # reparse的结果(语法树和错误行号)必须与对修改后的整个程序做parse_with_errors相同
+    from pyparser import parse_with_errors, reparse
+    tokens = EditableLexer(source)
+    tree, errors = reparse(parse_with_errors(tokens)[0], tokens, first, last, new_text)
+    lines = source.splitlines(keepends=True)
+    lines[first - 1:last] = [new_text]
+    full_tree, full_errors = parse_with_errors("".join(lines))
+    assert tree_shape(tree) == tree_shape(full_tree), (first, new_text)
+    assert [(e.linenum, e.kind) for e in errors] == [(e.linenum, e.kind) for e in full_errors], (first, new_text, errors)
+
+
+def bench_reparse(edits=50):
+    # 在文件中间改一行：增量语法分析只重新分析被修改的顶层语句。
+    # 行数不变和增删行时耗时都与文件大小无关
+    from pyparser import Parser, reparse
+    lines = PREFIX_PROGRAM.count("\n")
+    for line in range(2, lines + 1):
+        for new_text in ("turtle.forward(5)\n", "-w\n", "turtle.left(3\n", "turtle.forward('abc)\n"):
+            check_reparse(PREFIX_PROGRAM, line, line, new_text)
+    print("incremental reparse, one-line edit")
+    for copies in (20, 200):
+        source = sample_source(copies)
+        lines = source.splitlines(keepends=True)
+        middle = len(lines) // 2
+        while not lines[middle - 1].startswith("turtle."):
+            middle += 1
+        line = lines[middle - 1]
+        tokens = EditableLexer(source)
+        tree = Parser(tokens).parse()
+        start = time.perf_counter()
+        for _ in range(edits):
+            tree, errors = reparse(tree, tokens, middle, middle, line.replace("(", "( "))
+        same_cost = (time.perf_counter() - start) / edits
+        start = time.perf_counter()
+        for _ in range(edits):
+            tree, errors = reparse(tree, tokens, middle, middle, line + line)
+            tree, errors = reparse(tree, tokens, middle, middle + 1, line)
+        shift_cost = (time.perf_counter() - start) / (2 * edits)
+        assert not errors
+        # 编辑到一半的行暂时有语法错误：只报告窗口内的错误，改回来后语法树恢复
+        start = time.perf_counter()
+        tree, errors = reparse(tree, tokens, middle, middle, line.replace(")", "", 1))
+        error_cost = time.perf_counter() - start
+        assert [error.linenum for error in errors] == [middle], errors
+        tree, errors = reparse(tree, tokens, middle, middle, line)
+        assert not errors
+        assert tree_shape(tree) == tree_shape(Parser(TableLexer(source)).parse())
+        full = timeit(lambda: Parser(TableLexer(source)).parse(), repeat=1)[0]
+        print(f"  {len(source):>9} chars  same lines {same_cost * 1e3:>6.2f} ms  "
+              f"line added/removed {shift_cost * 1e3:>6.2f} ms  syntax error {error_cost * 1e3:>6.2f} ms  "
+              f"(full parse {full * 1e3:.1f} ms)")
+
+
+def def_program(functions):
+    # 有functions个函数定义的程序，每个函数后面跟一条顶层调用
+    rows = ["import turtle"]
+    for k in range(functions):
+        rows.append(f"def shape{k}(size, angle):")
+        rows.append(f"    {{turtle.forward(size * {k % 7 + 1})")
+        rows.append("    for _ in range(4):")
+        rows.append("        {turtle.left(angle)")
+        rows.append("        turtle.forward(size / 2)}")
+        rows.append("    turtle.right(angle)}")
+        rows.append(f"shape{k}({k}, 90)")
+    return "\n".join(rows) + "\n"
+
+
+def bench_parallel_parse(functions=5000):
+    # 多进程分块语法分析随进程数的扩展情况，语法树和导入名必须与顺序分析相同
+    from pyparser import Parser, ParallelParser
+    source = def_program(functions)
+    serial_time, serial_tree = timeit(lambda: Parser(TableLexer(source)).parse(), repeat=1)
+    expected = tree_shape(serial_tree)
+    print(f"parallel parsing  {functions} defs, {len(source)} chars, {os.cpu_count()} cpus")
+    print(f"  serial     {serial_time:.2f} s")
+    workers = 1
+    while workers <= max(4, os.cpu_count()):
+        cost, tree = timeit(ParallelParser, source, workers, len(source) // (workers * 4) + 1, repeat=1)
+        assert tree_shape(tree) == expected
+        print(f"  {workers:>2} procs   {cost:.2f} s  x{serial_time / cost:.2f}")
+        workers *= 2
+
+
+def top_level_summary(tree):
+    # 只看顶层结构：导入名、函数名和模块级语句的个数
+    names = [name.value.value for name in tree.imported_names]
+    functions = []
+    statements = tree.children[0].children
+    for statement in statements:
+        inner = statement.children[0]
+        if inner.type == "compound_stmt" and inner.children[0].type == "function_def":
+            functions.append(inner.children[0].children[1].value.value)
+    return names, functions, len(statements) - len(functions)
+
+
+def bench_lazy(functions=5000):
+    # 延迟分析函数体：只看顶层结构时接近词法分析的速度，全部展开后与完整分析的语法树相同
+    import pysyntax
+    from pyparser import Parser, LazyParser
+    from pylex import TokenIndex
+    source = def_program(functions)
+    lex_time, index = timeit(TokenIndex, source, repeat=1)
+    lazy_time, summary = timeit(lambda: top_level_summary(LazyParser(index).parse()), repeat=1)
+    full_time, full_tree = timeit(lambda: Parser(index.tokens).parse(), repeat=1)
+    assert summary == top_level_summary(full_tree)
+    lazy_tree = LazyParser(index).parse()
+    assert tree_shape(lazy_tree) == tree_shape(full_tree)
+    assert (pysyntax.analyse_program(lazy_tree, pysyntax.SyntaxContext(echo=False))
+            == pysyntax.analyse_program(full_tree, pysyntax.SyntaxContext(echo=False)))
+    print(f"lazy function bodies  {functions} defs, {len(source)} chars")
+    print(f"  lex + brace index   {lex_time:.2f} s")
+    print(f"  lazy top level      {lazy_time:.2f} s")
+    print(f"  full parse          {full_time:.2f} s")
+
+
+def first_error_line(source):
+    # 出错即退出的语法分析：返回第一个错误所在的行号，没有错误时返回None
+    from pyparser import Parser
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            Parser(source).parse()
+    except SystemExit:
+        return int(output.getvalue().split()[1])
+    return None
+
+
+def bench_recovery(copies=20, errors=5):
+    # 有多个错误的程序：出错即退出时每次只能发现一个错误，改正后重新分析；
+    # 恐慌模式恢复一次分析就能得到所有错误
+    from pyparser import parse_with_errors
+    lines = sample_source(copies).splitlines(keepends=True)
+    broken = [k for k, line in enumerate(lines) if line.startswith("turtle.")][::7][:errors]
+    bad = list(lines)
+    for k in broken:
+        bad[k] = bad[k].replace(")", "", 1)
+    start = time.perf_counter()
+    found = []
+    source = list(bad)
+    while True:
+        line = first_error_line("".join(source))
+        if line is None:
+            break
+        found.append(line)
+        source[line - 1] = lines[line - 1]
+    rerun_time = time.perf_counter() - start
+    recover_time, (tree, diagnostics) = timeit(parse_with_errors, "".join(bad), repeat=1)
+    assert [d.linenum for d in diagnostics] == found == [k + 1 for k in broken]
+    # 程序开头的错误记号(多余的RBRACE、一元运算符)每处只报告一次，顶层的语句不当作空的代码块
+    for source, lines in (("}\nx=1\n", [1]), ("-\nx=1\n}\n", [1, 3]), ("}\n}\n", [1, 2])):
+        assert [d.linenum for d in parse_with_errors(source)[1]] == lines, source
+    print(f"syntax errors  {errors} errors in {len(bad)} lines")
+    print(f"  exit on first error  {len(found) + 1} runs  {rerun_time * 1e3:>8.1f} ms")
+    print(f"  panic-mode recovery  1 run   {recover_time * 1e3:>8.1f} ms")
+
+
+def bench_tree_memory(copies=200):
+    # 语法分析的时间和语法树占用的内存
+    from pyparser import Parser
+    source = sample_source(copies)
+    tokens = TableLexer(source)
+    cost, tree = timeit(lambda: Parser(tokens).parse())
+    size = allocated(lambda: Parser(tokens).parse())[0]
+    walk, nodes = timeit(count_nodes, tree)
+    print(f"syntax tree  {len(source)} chars, {nodes} nodes, {len(tree.imported_names)} imports")
+    print(f"  parse {cost * 1e3:>8.1f} ms  tree {size:>12} bytes  {size / nodes:>6.1f} bytes/node  walk {walk * 1e3:>6.1f} ms")
+
+
+def bench_profile(lines=500, limit=8):
+    # 按语法规则剖析以表达式为主的程序；剖析只作用于profile_parse创建的Parser，普通分析不受影响
+    from pyparser import Parser, profile_parse
+    source = expression_program(lines)
+    plain, tree = timeit(lambda: Parser(source).parse())
+    profiled, (profiled_tree, profiler) = timeit(lambda: profile_parse(source))
+    assert tree_shape(profiled_tree) == tree_shape(tree)
+    assert sum(row[4] for row in profiler.rows()) == count_nodes(tree)
+    # 代码块中分析时建立又丢弃的结点不计入，各规则的结点数之和仍是语法树的结点数
+    blocks_tree, blocks_profiler = profile_parse(sample_source(5))
+    assert sum(row[4] for row in blocks_profiler.rows()) == count_nodes(blocks_tree)
+    print(f"rule profile  {len(source)} chars")
+    print(f"  plain parse {plain * 1e3:>8.1f} ms  profiled {profiled * 1e3:>8.1f} ms")
+    print(profiler.table(limit=limit))
+
+def bench_ast(copies=200):
+    # 语法分析树与抽象语法树的结点数，以及转换和代码生成的时间
+    from pyparser import Parser
+    from pyast import lower, walk
+    from pysyntax import generate_python_code
+    source = sample_source(copies)
+    tree = Parser(TableLexer(source)).parse()
+    lower_time, module = timeit(lower, tree)
+    codegen_time = timeit(generate_python_code, module)[0]
+    print(f"abstract syntax tree  {len(source)} chars")
+    print(f"  parse tree {count_nodes(tree):>9} nodes  ast {sum(1 for _ in walk(module)):>9} nodes")
+    print(f"  lower {lower_time * 1e3:>8.1f} ms  codegen {codegen_time * 1e3:>8.1f} ms")
+
+
+class ChunkedFile(io.BytesIO):
+    # 记下每次写入的最大字节数和读取时请求的最大字节数
+    largest_write = largest_read = 0
+
+    def write(self, data):
+        self.largest_write = max(self.largest_write, len(data))
+        return super().write(data)
+
+    def read(self, size=-1):
+        self.largest_read = max(self.largest_read, size if size >= 0 else sys.maxsize)
+        return super().read(size)
+
+
+def bench_tree_format(copies=200, functions=5000):
+    # pytree紧凑格式与pickle的大小和编解码时间；深的语法树pickle时要调高递归上限。
+    # pytree按块写出和读入，不在内存中攒整个文件
+    import pickle
+    import pytree
+    from pyparser import Parser
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, 100000))
+    try:
+        for name, source in (("sample", sample_source(copies)), ("defs", def_program(functions))):
+            tree = Parser(TableLexer(source)).parse()
+            expected = tree_shape(tree)
+            print(f"tree format  {name}, {len(source)} chars, {count_nodes(tree)} nodes")
+            for label, dumps, loads in (("pytree", pytree.dumps, pytree.loads),
+                                        ("pickle", lambda t: pickle.dumps(t, pickle.HIGHEST_PROTOCOL), pickle.loads)):
+                dump_time, data = timeit(dumps, tree)
+                load_time, loaded = timeit(loads, data)
+                assert tree_shape(loaded) == expected
+                print(f"  {label}  {len(data):>10} bytes  dump {dump_time * 1e3:>8.1f} ms  load {load_time * 1e3:>8.1f} ms")
+            file = ChunkedFile()
+            pytree.dump(tree, file)
+            file.seek(0)
+            assert tree_shape(pytree.load(file)) == expected
+            assert file.largest_write < 2 * pytree.CHUNK and file.largest_read == pytree.CHUNK
+    finally:
+        sys.setrecursionlimit(limit)
+
+
+def wrapper_program(k):
+    # 第k个程序：同一个辅助函数定义在名字不同的外层函数中
+    return ("import turtle\n"
+            f"def wrap{k}(n):\n"
+            "    {def helper(size):\n"
+            "        {turtle.forward(size)\n"
+            "        turtle.color(size)}\n"
+            "    helper(n)}\n"
+            f"wrap{k}({k})\n")
+
+
+def bench_batch(programs=200):
+    # 批量编译：逐个compile_source与BatchCompiler(结构相同的函数定义只转换、生成和检查一次)的时间；
+    # 再看整批语法树的结点数与InternTable共享后实际保存的结点数
+    from pyparser import Parser, InternTable
+    from pysyntax import compile_source, analyse_program, SyntaxContext, BatchCompiler
+    sources = [variant_program(k) for k in range(programs)]
+    single_time, expected = timeit(lambda: [compile_source(source) for source in sources])
+
+    def listed(source):
+        # 与BatchCompiler一样先得到整个记号表，只比较缓存省下的时间
+        ctx = SyntaxContext(echo=False)
+        parser = Parser(TableLexer(source))
+        return analyse_program(parser.parse(), ctx, parser.call_sites), ctx.faults
+    listed_time, results = timeit(lambda: [listed(source) for source in sources])
+    assert results == expected
+
+    def batch(sources):
+        compiler = BatchCompiler()
+        return [compiler.compile(source) for source in sources], compiler
+    batch_time, (results, compiler) = timeit(batch, sources)
+    assert results == expected
+    # draw_star每个程序都改了名字，draw_heart和draw_spiral在第一个程序之后都直接复用
+    assert compiler.hits == 2 * (programs - 1)
+    # 外层函数各不相同，里面相同的辅助函数仍然共享
+    wrappers = [wrapper_program(k) for k in range(programs)]
+    results, compiler = batch(wrappers)
+    assert results == [compile_source(source) for source in wrappers]
+    assert compiler.hits == programs - 1
+
+    trees = [Parser(source).parse() for source in sources]
+    nodes = sum(count_nodes(tree) for tree in trees)
+    table = InternTable()
+    intern_time = timeit(lambda: [table.intern(tree) for tree in trees], repeat=1)[0]
+    print(f"batch compile  {programs} programs")
+    print(f"  single {single_time * 1e3:>8.1f} ms  single from token list {listed_time * 1e3:>8.1f} ms  "
+          f"batch {batch_time * 1e3:>8.1f} ms  x{listed_time / batch_time:.2f}")
+    print(f"  intern {intern_time * 1e3:>8.1f} ms  nodes {nodes:>9}  stored {len(table.nodes):>7}")
+
+
+def nested_program(depth):
+    # depth层嵌套的if，最里面是一个也嵌套了depth层的调用
+    return ("import turtle\n" + "if x:\n{" * depth
+            + "turtle.forward(" + "f(" * depth + "1" + ")" * depth + ")" + "}\n" * depth)
+
+
+def bench_walk(copies=200, terms=20000, depth=1000):
+    # 遍历语法树的时间；一个很长的运算链，抽象语法树嵌套得很深，代码生成也不能超过递归深度限制；
+    # LL1Parser对嵌套的语句和调用生成的分析树更深，转换和代码生成同样不能超过递归深度限制
+    from pyparser import Parser
+    from pyll1 import LL1Parser
+    from pyast import lower
+    from pysyntax import compile_source, generate_python_code
+    source = sample_source(copies)
+    tree = Parser(TableLexer(source)).parse()
+    with contextlib.redirect_stdout(io.StringIO()):
+        print_time = timeit(tree.print_tree)[0]
+    extract_time = timeit(tree.extract_arguments)[0]
+    chain = "import turtle\nx = " + "+".join(["1"] * terms) + "\n"
+    chain_time, (code, faults) = timeit(compile_source, chain)
+    assert code.count("+") == terms - 1
+    deep = LL1Parser(TableLexer(nested_program(depth))).parse()
+    deep_time, deep_code = timeit(lambda: generate_python_code(lower(deep)))
+    assert deep_code.count("if x:") == depth and deep_code.count("f(") == depth
+    print(f"tree walks  {len(source)} chars")
+    print(f"  print_tree {print_time * 1e3:>8.1f} ms  extract_arguments {extract_time * 1e3:>8.1f} ms")
+    print(f"  {terms}-term expression compiled in {chain_time * 1e3:.1f} ms")
+    print(f"  {depth}-deep LL(1) tree lowered and generated in {deep_time * 1e3:.1f} ms")
+
+
+def bench_dump(copies=200):
+    # 语法树和记号序列输出的时间：逐个print的print_tree/show与pydump的缓冲输出；
+    # 输出写到内存，不计终端的开销
+    from pyparser import Parser
+    from pydump import Dumper
+    source = sample_source(copies)
+    tokens = TableLexer(source)
+    tree = Parser(tokens).parse()
+
+    def printed(fun, *args):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return fun(*args)
+
+    def shown():
+        for token in tokens:
+            token.show()
+
+    def dumped(method, data, format, max_depth=None):
+        getattr(Dumper(io.StringIO(), format, max_depth=max_depth), method)(data)
+    print(f"dumps  {len(source)} chars, {count_nodes(tree)} nodes, {len(tokens)} tokens")
+    print(f"  print_tree {timeit(printed, tree.print_tree)[0] * 1e3:>8.1f} ms  show {timeit(printed, shown)[0] * 1e3:>8.1f} ms")
+    for format in ("jsonl", "sexp"):
+        print(f"  {format:<5} tree {timeit(dumped, 'tree', tree, format)[0] * 1e3:>8.1f} ms"
+              f"  depth<=3 {timeit(dumped, 'tree', tree, format, 3)[0] * 1e3:>8.1f} ms"
+              f"  tokens {timeit(dumped, 'tokens', tokens, format)[0] * 1e3:>8.1f} ms")
+
+
+def bench_call_sites(calls=20000):
+    # turtle调用检查：Parser分析时登记的调用点与从语法树中找出的调用点，检查阶段的时间；
+    # 再看整个语义检查和代码生成的时间
+    from pyparser import Parser, collect_call_sites
+    from pyast import lower
+    from pysyntax import SyntaxContext, analyse_program, check_call_sites
+    methods = ["forward(10)", "setpos(1, 2)", "color('red')", "left(90)", "distance(3, 4)"]
+    source = "import turtle\n" + "".join(f"turtle.{methods[i % len(methods)]}\nx{i % 50} = {i}\n" for i in range(calls))
+    parser = Parser(source)
+    tree = parser.parse()
+    imports = lower(tree).imports
+    assert parser.call_sites == collect_call_sites(tree)
+
+    def check(sites):
+        ctx = SyntaxContext(echo=False)
+        check_call_sites(sites, imports, ctx)
+        return ctx.faults
+    index_time = timeit(check, parser.call_sites)[0]
+    collect_time = timeit(lambda: check(collect_call_sites(tree)))[0]
+    full_time = timeit(analyse_program, tree, SyntaxContext(echo=False), parser.call_sites)[0]
+    print(f"call site checks  {calls} turtle calls, {len(parser.call_sites)} sites")
+    print(f"  parser index {index_time * 1e3:>8.1f} ms  collected from tree {collect_time * 1e3:>8.1f} ms")
+    print(f"  codegen + checks {full_time * 1e3:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    bench_lexer()
+    bench_stream()
+    bench_token_buffer()
+    bench_mapped()
+    bench_parallel()
+    bench_relex()
+    bench_run_only()
+    stress_threads()
+    bench_statements()
+    bench_expressions()
+    bench_ll1()
+    bench_reparse()
+    bench_parallel_parse()
+    bench_lazy()
+    bench_recovery()
+    bench_tree_memory()
+    bench_profile()
+    bench_ast()
+    bench_tree_format()
+    bench_batch()
+    bench_walk()
+    bench_dump()
+    bench_call_sites()
@@ -0,0 +1,149 @@
+import json
+import math
+
+from pyparser import KIND_NAMES, kind_of
+
+
+# 记号序列和语法树的机器可读输出，用于调试和外部工具。
+# 只有显式创建Dumper并传给getTokenList/getPaserTree(或直接调用tokens/tree)时才输出，平时编译没有任何开销。
+# 两种格式，每行一条记录：
+#   jsonl  记号 {"type": "IDENTIFIER", "value": "x", "line": 3}
+#          结点 {"kind": "binop", "depth": 2}，带记号的结点再加上type/value/line，
+#               因max_depth省略了子结点时再加上"truncated": true
+#   sexp   记号 (IDENTIFIER "x" 3)
+#          一棵(子)树一行，如 (binop (IDENTIFIER "x" 3) (TokenType.PLUS "+" 3) (NUMBER 1.0 3))，
+#          因max_depth省略的子结点写成 ...
+# max_depth限制输出的层数(子树的根为第0层)；kinds给出结点类型名时只输出以这些类型的结点为根的子树
+# (最外层的，不再单独输出其中嵌套的同类子树)。
+# 输出先攒在内存里，凑够buffer_size个字符才写一次文件，最后flush写出剩下的部分。
+
+FORMATS = ("jsonl", "sexp")
+
+
+def json_value(value):
+    # 记号值：字符串按JSON转义(绝大多数不需要转义，直接加引号)，数字为float。
+    # JSON中没有inf和nan，溢出的常数(如1e999)写成字符串"inf"
+    if value.__class__ is str:
+        if value.isprintable() and '"' not in value and "\\" not in value:
+            return '"' + value + '"'
+        return json.dumps(value, ensure_ascii=False)
+    if value is None:
+        return "null"
+    if value.__class__ is float and not math.isfinite(value):
+        return '"' + repr(value) + '"'
+    return repr(value)
+
+
+class Dumper:
+    def __init__(self, file, format="jsonl", max_depth=None, kinds=None, buffer_size=1 << 16):
+        if format not in FORMATS:
+            raise ValueError(f"不支持的输出格式：{format}")
+        self.file = file
+        self.format = format
+        self.max_depth = max_depth
+        self.kinds = None if kinds is None else {kind_of(name) for name in kinds}
+        self.buffer_size = buffer_size
+        self.parts = []
+        self.size = 0
+
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.buffer_size:
+            self.drain()
+
+    def drain(self):
+        # 把攒下的输出写进文件
+        if self.parts:
+            self.file.write("".join(self.parts))
+            self.parts = []
+            self.size = 0
+
+    def flush(self):
+        self.drain()
+        self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def tokens(self, tokens):
+        """逐个输出记号，tokens可以是任何记号序列或生成器。"""
+        write = self.write
+        if self.format == "jsonl":
+            for token in tokens:
+                write(f'{{"type": "{token.tokenType._name_}", "value": {json_value(token.value)}, "line": {token.linenum}}}\n')
+        else:
+            for token in tokens:
+                write(f"({token.tokenType._name_} {json_value(token.value)} {token.linenum})\n")
+        self.flush()
+
+    def roots(self, tree):
+        # 要输出的子树的根，按先序
+        if self.kinds is None:
+            yield tree
+            return
+        kinds = self.kinds
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            if node.kind in kinds:
+                yield node
+            else:
+                stack.extend(reversed(node.children))
+
+    def tree(self, tree):
+        """输出语法树(或kinds选出的各个子树)。"""
+        for root in self.roots(tree):
+            if self.format == "jsonl":
+                self.jsonl_tree(root)
+            else:
+                self.sexp_tree(root)
+        self.flush()
+
+    def jsonl_tree(self, root):
+        write = self.write
+        max_depth = self.max_depth
+        stack = [(root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if node is None:
+                continue
+            token = node.value
+            record = f'{{"kind": "{KIND_NAMES[node.kind]}", "depth": {depth}'
+            if token is not None:
+                record += f', "type": "{token.tokenType._name_}", "value": {json_value(token.value)}, "line": {token.linenum}'
+            if node.children:
+                if max_depth is None or depth < max_depth:
+                    stack.extend([(child, depth + 1) for child in reversed(node.children)])
+                else:
+                    record += ', "truncated": true'
+            write(record + "}\n")
+
+    def sexp_tree(self, root):
+        # 栈中的字符串是结点结束时要写的右括号
+        write = self.write
+        max_depth = self.max_depth
+        stack = [(root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if node.__class__ is str:
+                write(node)
+                continue
+            if node is None:
+                continue
+            token = node.value
+            if token is None:
+                write(f" ({KIND_NAMES[node.kind]}" if depth else f"({KIND_NAMES[node.kind]}")
+            else:
+                write(f"{' ' if depth else ''}({KIND_NAMES[node.kind]} {json_value(token.value)} {token.linenum}")
+            stack.append((")" if depth else ")\n", depth))
+            if node.children:
+                if max_depth is None or depth < max_depth:
+                    stack.extend([(child, depth + 1) for child in reversed(node.children)])
+                else:
+                    write(" ...")
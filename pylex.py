@@ -1,3 +1,9 @@
+import mmap
+import re
+import sys
+from bisect import bisect_left, bisect_right
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
 
 
@@ -96,15 +102,65 @@ class Token:
     def show(self):
         print(f"{self.tokenType.name.ljust(15)} {str(self.value).ljust(15)} {str(self.linenum)}")
 
+    def same_line(self, tokentype, value):
+        # 与本记号同一行的新记号(语法分析器合成的NEWLINE等)；LineToken的行号随所在行一起变化
+        return Token(tokentype, value, self.linenum)
+
+class Diagnostic:
+    # 一条错误信息：行号、期望的记号类型(可能有几种时为元组，没有明确期望时为None)、
+    # 实际遇到的记号类型(词法错误时为出错的文本)
+    def __init__(self, linenum, expected, received, kind="语法错误"):
+        self.linenum = linenum
+        self.expected = expected
+        self.received = received
+        self.kind = kind
+
+    def __str__(self):
+        # 与出错即退出时打印的信息相同
+        if self.kind == "词法错误":
+            return "line " + str(self.linenum) + " 词法错误: " + str(self.received)
+        if self.expected is None:
+            return "line " + str(self.linenum) + " 语法错误：received  " + str(self.received)
+        expected = self.expected if isinstance(self.expected, tuple) else (self.expected,)
+        return ("line " + str(self.linenum) + " 语法错误：Expected " + " 或 ".join(map(str, expected))
+                + " received  " + str(self.received))
+
+    def __repr__(self):
+        return f"Diagnostic({self.linenum!r}, {self.expected!r}, {self.received!r}, {self.kind!r})"
+
+
+class LexError(Exception):
+    # 没有给出errors列表的增量词法分析(relex_lines)遇到词法错误时抛出，不退出进程
+    def __init__(self, diagnostic):
+        super().__init__(str(diagnostic))
+        self.diagnostic = diagnostic
+
+
 def getChar(str, pos):
 	if pos<len(str):
 		return str[pos]
 	else:
 		return ""
 
-# 用状态机获取token
-def Lexer(string):
-    tokens = []  # 识别出的token
+# 选择词法分析器：engine="dfa"为手写状态机，engine="table"为表驱动的状态机，
+# engine="parallel"为多进程分块的表驱动状态机
+# stream=True时返回生成器，语法分析器取一个记号才向后分析一个记号
+def Lexer(string, engine="dfa", stream=False):
+    if engine == "table":
+        tokens = table_tokens(string)
+    elif engine == "parallel":
+        tokens = iter(ParallelLexer(string))
+    else:
+        tokens = dfa_tokens(string)
+    if stream:
+        return tokens
+    return list(tokens)
+
+def DFALexer(string):
+    return list(dfa_tokens(string))
+
+# 用状态机逐个产生token
+def dfa_tokens(string):
     cur_state = LexDFA.Start0
     linenum = 1
     tmptoken = ""
@@ -115,16 +171,21 @@ def Lexer(string):
 
         if cur_state == LexDFA.Start0:
             if c=="\n" :
-                tokens.append(Token(TokenType.NEWLINE, c, linenum))
+                yield Token(TokenType.NEWLINE, c, linenum)
                 linenum+=1
                 i += 1
                 cur_state = LexDFA.Start0
+            elif c=="\r":# \r\n和单独的\r也是换行，与TOKEN_SPEC相同
+                yield Token(TokenType.NEWLINE, "\n", linenum)
+                linenum+=1
+                i += 2 if getChar(string, i+1)=="\n" else 1
+                cur_state = LexDFA.Start0
             elif  c == " " or c=="\t":
                 i += 1
                 cur_state = LexDFA.Start0
             elif c=="":
-                tokens.append(Token(TokenType.END, c, linenum))
-                break
+                yield Token(TokenType.END, c, linenum)
+                return
             elif c== "_" or c.isalpha():
                 tmptoken += c
                 i += 1
@@ -145,6 +206,9 @@ def Lexer(string):
                 tmptoken += c
                 i += 1
                 cur_state = LexDFA.State19
+            elif c=="#":
+                i += 1
+                cur_state = LexDFA.State2
             elif c=="\"":
                 i += 1
                 cur_state = LexDFA.State5
@@ -153,49 +217,49 @@ def Lexer(string):
                 cur_state = LexDFA.State6
             elif c==":":
                 tmptoken += c
-                tokens.append(Token(TokenType.COLON, tmptoken, linenum))
+                yield Token(TokenType.COLON, tmptoken, linenum)
                 tmptoken = ""
                 i += 1
                 cur_state = LexDFA.Start0
             elif c==",":
                 tmptoken += c
-                tokens.append(Token(TokenType.COMMA, tmptoken, linenum))
+                yield Token(TokenType.COMMA, tmptoken, linenum)
                 tmptoken = ""
                 i += 1
                 cur_state = LexDFA.Start0
             elif c=="(":
                 tmptoken += c
-                tokens.append(Token(TokenType.LPAREN, tmptoken, linenum))
+                yield Token(TokenType.LPAREN, tmptoken, linenum)
                 tmptoken = ""
                 i += 1
                 cur_state = LexDFA.Start0
             elif c==")":
                 tmptoken += c
-                tokens.append(Token(TokenType.RPAREN, tmptoken, linenum))
+                yield Token(TokenType.RPAREN, tmptoken, linenum)
                 tmptoken = ""
                 i += 1
                 cur_state = LexDFA.Start0
             elif c=="{":
                 tmptoken += c
-                tokens.append(Token(TokenType.LBRACE, tmptoken, linenum))
+                yield Token(TokenType.LBRACE, tmptoken, linenum)
                 tmptoken = ""
                 i += 1
                 cur_state = LexDFA.Start0
             elif c=="}":
                 tmptoken += c
-                tokens.append(Token(TokenType.RBRACE, tmptoken, linenum))
+                yield Token(TokenType.RBRACE, tmptoken, linenum)
                 tmptoken = ""
                 i += 1
                 cur_state = LexDFA.Start0
             elif c=="[":
                 tmptoken += c
-                tokens.append(Token(TokenType.LBRACKET, tmptoken, linenum))
+                yield Token(TokenType.LBRACKET, tmptoken, linenum)
                 tmptoken = ""
                 i += 1
                 cur_state = LexDFA.Start0
             elif c=="]":
                 tmptoken += c
-                tokens.append(Token(TokenType.RBRACKET, tmptoken, linenum))
+                yield Token(TokenType.RBRACKET, tmptoken, linenum)
                 tmptoken = ""
                 i += 1
                 cur_state = LexDFA.Start0
@@ -212,38 +276,44 @@ def Lexer(string):
                 # 判断tmptoken是否为关键字
                 if tmptoken.upper() in TokenType.__members__:
                     token_type = TokenType[tmptoken.upper()]  # 获取相应的枚举类型
-                    tokens.append(Token(token_type, tmptoken, linenum))
+                    yield Token(token_type, tmptoken, linenum)
                 else:
-                    tokens.append(Token(TokenType.IDENTIFIER, tmptoken, linenum))
+                    yield Token(TokenType.IDENTIFIER, tmptoken, linenum)
                 # 重置tmptoken
                 tmptoken = ""
                 cur_state = LexDFA.Start0
 
+        elif cur_state == LexDFA.State2:# 注释一直到行尾
+            if c=="\n" or c=="\r" or c=="":
+                cur_state = LexDFA.Start0
+            else:
+                i += 1
+
         elif cur_state == LexDFA.State5:
-            if c!="\"" and c!="\n":
+            if c!="\"" and c!="\n" and c!="":
                 tmptoken += c
                 i += 1
                 cur_state = LexDFA.State5
             elif c=="\"":
-                tokens.append(Token(TokenType.STRING, tmptoken, linenum))
+                yield Token(TokenType.STRING, tmptoken, linenum)
                 tmptoken = ""
                 i += 1
                 cur_state = LexDFA.Start0
-            elif c=="\n":
+            else:  # 行尾或文件末尾，字符串没有结束
                 print("line " + str(linenum) + " 词法错误: " + tmptoken + c)
                 exit(0)
 
         elif cur_state == LexDFA.State6:
-            if c!="\'" and c!="\n":
+            if c!="\'" and c!="\n" and c!="":
                 tmptoken += c
                 i += 1
                 cur_state = LexDFA.State6
             elif c=="\'":
-                tokens.append(Token(TokenType.STRING, tmptoken, linenum))
+                yield Token(TokenType.STRING, tmptoken, linenum)
                 tmptoken = ""
                 i += 1
                 cur_state = LexDFA.Start0
-            elif c=="\n":
+            else:  # 行尾或文件末尾，字符串没有结束
                 print("line " + str(linenum) + " 词法错误: " + tmptoken + c)
                 exit(0)
 
@@ -261,7 +331,7 @@ def Lexer(string):
                 i += 1
                 cur_state = LexDFA.State11
             else:
-                tokens.append(Token(TokenType.NUMBER, float(tmptoken), linenum))
+                yield Token(TokenType.NUMBER, float(tmptoken), linenum)
                 tmptoken = ""
                 cur_state = LexDFA.Start0
 
@@ -271,7 +341,7 @@ def Lexer(string):
                 i += 1
                 cur_state = LexDFA.State9
             else:
-                tokens.append(Token(TokenType.NUMBER, float(tmptoken), linenum))
+                yield Token(TokenType.NUMBER, float(tmptoken), linenum)
                 tmptoken = ""
                 cur_state = LexDFA.Start0
 
@@ -285,7 +355,7 @@ def Lexer(string):
                 i += 1
                 cur_state = LexDFA.State11
             else:
-                tokens.append(Token(TokenType.NUMBER, float(tmptoken), linenum))
+                yield Token(TokenType.NUMBER, float(tmptoken), linenum)
                 tmptoken = ""
                 cur_state = LexDFA.Start0
 
@@ -304,19 +374,15 @@ def Lexer(string):
                 i += 1
                 cur_state = LexDFA.State12
             else:
-                tokens.append(Token(TokenType.NUMBER, float(tmptoken), linenum))
+                yield Token(TokenType.NUMBER, float(tmptoken), linenum)
                 tmptoken = ""
                 cur_state = LexDFA.Start0
 
         elif cur_state==LexDFA.State13:
-            if c.isdigit():
-                tmptoken += c
-                i += 1
-                cur_state = LexDFA.State14
-            else:
-                tokens.append(Token(TokenType.DOT, tmptoken, linenum))
-                tmptoken = ""
-                cur_state = LexDFA.Start0
+            # "."后面是数字时也只得到DOT，数字另成一个NUMBER记号，与TOKEN_SPEC相同
+            yield Token(TokenType.DOT, tmptoken, linenum)
+            tmptoken = ""
+            cur_state = LexDFA.Start0
 
         elif cur_state == LexDFA.State16:
             if c=="=":
@@ -325,24 +391,24 @@ def Lexer(string):
                 cur_state = LexDFA.State17
             else:
                 if tmptoken=="+":
-                    tokens.append(Token(TokenType.PLUS, tmptoken, linenum))
+                    yield Token(TokenType.PLUS, tmptoken, linenum)
                     tmptoken = ""
                     cur_state = LexDFA.Start0
                 elif tmptoken=="-":
-                    tokens.append(Token(TokenType.MINUS, tmptoken, linenum))
+                    yield Token(TokenType.MINUS, tmptoken, linenum)
                     tmptoken = ""
                     cur_state = LexDFA.Start0
                 elif tmptoken=="*":
-                    tokens.append(Token(TokenType.TIMES, tmptoken, linenum))
+                    yield Token(TokenType.TIMES, tmptoken, linenum)
                     tmptoken = ""
                     cur_state = LexDFA.Start0
                 else:
-                    tokens.append(Token(TokenType.DIVIDE, tmptoken, linenum))
+                    yield Token(TokenType.DIVIDE, tmptoken, linenum)
                     tmptoken = ""
                     cur_state = LexDFA.Start0
 
         elif cur_state == LexDFA.State17:
-            tokens.append(Token(TokenType.AUGASSIGN, tmptoken, linenum))
+            yield Token(TokenType.AUGASSIGN, tmptoken, linenum)
             tmptoken = ""
             cur_state = LexDFA.Start0
 
@@ -353,15 +419,15 @@ def Lexer(string):
                 cur_state = LexDFA.State20
             else:
                 if tmptoken=="=":
-                    tokens.append(Token(TokenType.ASSIGN, tmptoken, linenum))
+                    yield Token(TokenType.ASSIGN, tmptoken, linenum)
                     tmptoken = ""
                     cur_state = LexDFA.Start0
                 elif tmptoken=="<":
-                    tokens.append(Token(TokenType.LT. tmptoken, linenum))
+                    yield Token(TokenType.LT, tmptoken, linenum)
                     tmptoken = ""
                     cur_state = LexDFA.Start0
                 elif tmptoken == ">":
-                    tokens.append(Token(TokenType.RT, tmptoken, linenum))
+                    yield Token(TokenType.RT, tmptoken, linenum)
                     tmptoken = ""
                     cur_state = LexDFA.Start0
                 else:
@@ -370,44 +436,758 @@ def Lexer(string):
 
         elif cur_state == LexDFA.State20:
             if tmptoken=="==":
-                tokens.append(Token(TokenType.EQ, tmptoken, linenum))
+                yield Token(TokenType.EQ, tmptoken, linenum)
                 tmptoken = ""
                 cur_state = LexDFA.Start0
             elif tmptoken=="<=":
-                tokens.append(Token(TokenType.LTEQ, tmptoken, linenum))
+                yield Token(TokenType.LTEQ, tmptoken, linenum)
                 tmptoken = ""
                 cur_state = LexDFA.Start0
             elif tmptoken==">=":
-                tokens.append(Token(TokenType.RTEQ, tmptoken, linenum))
+                yield Token(TokenType.RTEQ, tmptoken, linenum)
                 tmptoken = ""
                 cur_state = LexDFA.Start0
             elif tmptoken=="!=":
-                tokens.append(Token(TokenType.NOTEQ, tmptoken, linenum))
+                yield Token(TokenType.NOTEQ, tmptoken, linenum)
                 tmptoken = ""
                 cur_state = LexDFA.Start0
 
 
+# ---------------- 表驱动的词法分析器 ----------------
+# 记号规则写成声明式的模式表（对应README中flex文件的词法部分），
+# 模块加载时一次性把它构造成DFA转移表。分析时先查字符类表，再查转移表，
+# 按最长匹配切分记号，关键字用哈希表查找。
+# 规则与上面的手写DFA保持一致：例如"**"仍是两个TIMES，小数点后接数字的写法不支持。
+
+class CharSet:
+    # 字符集合：chars中列出的字符，加上可选的字母/数字谓词，negate表示取补集
+    def __init__(self, chars="", alpha=False, digit=False, negate=False):
+        self.chars = chars
+        self.alpha = alpha
+        self.digit = digit
+        self.negate = negate
+
+    def __contains__(self, c):
+        hit = c in self.chars or (self.alpha and c.isalpha()) or (self.digit and c.isdigit())
+        return hit != self.negate
+
+# 模式的组合方式：字符串表示逐字符匹配，CharSet表示匹配一个字符
+def seq(*parts):
+    return ("seq",) + parts
+
+def alt(*parts):
+    return ("alt",) + parts
+
+def star(part):
+    return ("star", part)
+
+def plus(part):
+    return seq(part, star(part))
+
+def opt(part):
+    return ("opt", part)
+
+LETTER = CharSet("_", alpha=True)
+WORD = CharSet("_", alpha=True, digit=True)
+DIGIT = CharSet(digit=True)
+EXPONENT = seq(CharSet("eE"), CharSet("-", digit=True), star(DIGIT))
+
+# 记号规则表：靠前的规则优先；类型为TokenType.EMPTY的规则（空白和注释）匹配后直接丢弃
+TOKEN_SPEC = [
+    (TokenType.EMPTY, plus(CharSet(" \t"))),
+    (TokenType.EMPTY, seq("#", star(CharSet("\r\n", negate=True)))),
+    (TokenType.NEWLINE, alt("\n", "\r\n", "\r")),
+    (TokenType.IDENTIFIER, seq(LETTER, star(WORD))),
+    (TokenType.NUMBER, seq(plus(DIGIT), opt(alt(EXPONENT, seq(".", opt(seq(plus(DIGIT), opt(EXPONENT)))))))),
+    (TokenType.STRING, seq('"', star(CharSet('"\n', negate=True)), '"')),
+    (TokenType.STRING, seq("'", star(CharSet("'\n", negate=True)), "'")),
+    (TokenType.AUGASSIGN, alt("+=", "-=", "*=", "/=")),
+    (TokenType.EQ, "=="),
+    (TokenType.NOTEQ, "!="),
+    (TokenType.LTEQ, "<="),
+    (TokenType.RTEQ, ">="),
+    (TokenType.ASSIGN, "="),
+    (TokenType.LT, "<"),
+    (TokenType.RT, ">"),
+    (TokenType.PLUS, "+"),
+    (TokenType.MINUS, "-"),
+    (TokenType.TIMES, "*"),
+    (TokenType.DIVIDE, "/"),
+    (TokenType.DOT, "."),
+    (TokenType.COLON, ":"),
+    (TokenType.COMMA, ","),
+    (TokenType.LPAREN, "("),
+    (TokenType.RPAREN, ")"),
+    (TokenType.LBRACE, "{"),
+    (TokenType.RBRACE, "}"),
+    (TokenType.LBRACKET, "["),
+    (TokenType.RBRACKET, "]"),
+]
+
+# 非ASCII字符只按isalpha/isdigit区分，用这几个代表字符求出它们所属的字符类
+_NON_ASCII_SAMPLES = "\u00e9\u00b2\u3002"
+
+def _collect_charsets(pattern, charsets):
+    if isinstance(pattern, CharSet):
+        if pattern not in charsets:
+            charsets.append(pattern)
+    elif isinstance(pattern, str):
+        for c in pattern:
+            _collect_charsets(CharSet(c), charsets)
+    else:
+        for part in pattern[1:]:
+            _collect_charsets(part, charsets)
+
+def _build_nfa(pattern, nfa, charset_ids):
+    # Thompson构造：nfa为[(epsilon目标列表, [(字符集编号, 目标)])]，返回(入口, 出口)
+    def new_state():
+        nfa.append(([], []))
+        return len(nfa) - 1
+
+    if isinstance(pattern, CharSet) or (isinstance(pattern, str) and len(pattern) == 1):
+        cs = pattern if isinstance(pattern, CharSet) else CharSet(pattern)
+        start, end = new_state(), new_state()
+        nfa[start][1].append((charset_ids[_charset_key(cs)], end))
+        return start, end
+    if isinstance(pattern, str):
+        pattern = seq(*pattern)
+    kind = pattern[0]
+    start, end = new_state(), new_state()
+    if kind == "seq":
+        cur = start
+        for part in pattern[1:]:
+            s, e = _build_nfa(part, nfa, charset_ids)
+            nfa[cur][0].append(s)
+            cur = e
+        nfa[cur][0].append(end)
+    elif kind == "alt":
+        for part in pattern[1:]:
+            s, e = _build_nfa(part, nfa, charset_ids)
+            nfa[start][0].append(s)
+            nfa[e][0].append(end)
+    else:
+        s, e = _build_nfa(pattern[1], nfa, charset_ids)
+        nfa[start][0].extend([s, end])
+        if kind == "star":
+            nfa[e][0].append(s)
+        nfa[e][0].append(end)
+    return start, end
+
+def _charset_key(cs):
+    return (cs.chars, cs.alpha, cs.digit, cs.negate)
+
+def _build_tables(spec):
+    # 1. 按字符落在哪些字符集中把字符划分成字符类
+    charsets = []
+    for _, pattern in spec:
+        _collect_charsets(pattern, charsets)
+    keys = []
+    for cs in charsets:
+        if _charset_key(cs) not in keys:
+            keys.append(_charset_key(cs))
+    charset_ids = {key: i for i, key in enumerate(keys)}
+    unique = [CharSet(*key) for key in keys]
+
+    signatures = {}
+    def signature_class(c):
+        sig = tuple(c in cs for cs in unique)
+        if sig not in signatures:
+            signatures[sig] = len(signatures)
+        return signatures[sig]
+
+    char_classes = {code: signature_class(chr(code)) for code in range(128)}
+    non_ascii = {}
+    for c in _NON_ASCII_SAMPLES:
+        char_classes[ord(c)] = non_ascii[tuple(c in cs for cs in unique)] = signature_class(c)
+    class_members = {}
+    for sig, cls in signatures.items():
+        class_members[cls] = {i for i, hit in enumerate(sig) if hit}
+
+    # 2. 每条规则构造NFA，用一个公共入口连接
+    nfa = [([], [])]
+    final = {}
+    for rule, (tokentype, pattern) in enumerate(spec):
+        s, e = _build_nfa(pattern, nfa, charset_ids)
+        nfa[0][0].append(s)
+        final[e] = rule
+
+    def closure(states):
+        stack = list(states)
+        seen = set(states)
+        while stack:
+            for t in nfa[stack.pop()][0]:
+                if t not in seen:
+                    seen.add(t)
+                    stack.append(t)
+        return frozenset(seen)
+
+    # 3. 子集构造得到DFA。转移表展开成一维列表，状态用"行号*字符类数"表示，
+    #    这样查表只需一次下标运算；-1表示没有转移
+    ncls = len(signatures)
+    start = closure([0])
+    dfa_ids = {start: 0}
+    todo = [start]
+    trans = []
+    accept = []
+    while todo:
+        states = todo.pop(0)
+        for cls in range(ncls):
+            members = class_members[cls]
+            targets = [t for s in states for cs_id, t in nfa[s][1] if cs_id in members]
+            if not targets:
+                trans.append(-1)
+                continue
+            nxt = closure(targets)
+            if nxt not in dfa_ids:
+                dfa_ids[nxt] = len(dfa_ids)
+                todo.append(nxt)
+            trans.append(dfa_ids[nxt] * ncls)
+        rules = [final[s] for s in states if s in final]
+        accept.extend([spec[min(rules)][0] if rules else None] * ncls)
+
+    return trans, accept, char_classes, unique, non_ascii
+
+
+class CharClassTable(dict):
+    # 码位 -> 字符类编号，可直接用于str.translate；
+    # ASCII字符预先填好，其余字符第一次出现时再计算
+    def __init__(self, ascii_classes, charsets, non_ascii):
+        super().__init__(ascii_classes)
+        self.charsets = charsets
+        self.non_ascii = non_ascii
+
+    def __missing__(self, code):
+        # 既不是字母也不是数字的字符归入"\u3002"所在的字符类
+        cls = self.non_ascii.get(tuple(chr(code) in cs for cs in self.charsets), self[0x3002])
+        self[code] = cls
+        return cls
+
+
+_DFA_TRANS, _DFA_ACCEPT, _ascii_classes, _charsets, _non_ascii = _build_tables(TOKEN_SPEC)
+CHAR_CLASSES = CharClassTable(_ascii_classes, _charsets, _non_ascii)
+KEYWORDS = {name: tokentype for name, tokentype in TokenType.__members__.items()}
+
+
+def _table_scan(data, classes, linenum=1, errors=None):
+    # 按最长匹配扫描data，classes[i]为data[i]的字符类，data的第一行行号为linenum；
+    # 产生(记号类型, 起始位置, 结束位置, 行号)。
+    # 遇到词法错误时打印并退出；给出errors列表时把错误记在其中，跳过出错的文本继续分析
+    trans = _DFA_TRANS
+    accept = _DFA_ACCEPT
+    empty = TokenType.EMPTY
+    newline = TokenType.NEWLINE
+    n = len(data)
+    i = 0
+    while i < n:
+        state = 0
+        j = i
+        while j < n:
+            nxt = trans[state + classes[j]]
+            if nxt < 0:
+                break
+            state = nxt
+            j += 1
+        tokentype = accept[state]
+        if tokentype is None:
+            received = data[i:j + 1]
+            if received.__class__ is not str:
+                # 字节串(mapped_tokens)：带上出错字符的其余UTF-8字节，解码后报告
+                end = j + 1
+                while end < n and 0x80 <= data[end] < 0xC0:
+                    end += 1
+                received = data[i:end].decode("utf-8", "replace")
+            diagnostic = Diagnostic(linenum, None, received, "词法错误")
+            if errors is None:
+                print(diagnostic)
+                exit(0)
+            errors.append(diagnostic)
+            i = j if j > i else i + 1
+            continue
+        if tokentype is not empty:
+            yield tokentype, i, j, linenum
+            if tokentype is newline:
+                linenum += 1
+        i = j
+    yield TokenType.END, n, n, linenum
+
+
+def TableLexer(string):
+    return list(table_tokens(string))
+
+# 用表驱动的状态机逐个产生token
+def table_tokens(string, linenum=1, errors=None):
+    identifiers = {}  # 标识符 -> 记号类型，同一个标识符只查一次关键字表
+    classes = string.translate(CHAR_CLASSES).encode("latin-1")
+    for tokentype, start, end, linenum in _table_scan(string, classes, linenum, errors):
+        if tokentype is TokenType.IDENTIFIER:
+            lexeme = string[start:end]
+            tokentype = identifiers.get(lexeme)
+            if tokentype is None:
+                tokentype = identifiers[lexeme] = KEYWORDS.get(lexeme.upper(), TokenType.IDENTIFIER)
+            yield Token(tokentype, lexeme, linenum)
+        elif tokentype is TokenType.NUMBER:
+            yield Token(tokentype, float(string[start:end]), linenum)
+        elif tokentype is TokenType.STRING:
+            yield Token(tokentype, string[start + 1:end - 1], linenum)
+        elif tokentype is TokenType.NEWLINE:
+            yield Token(tokentype, "\n", linenum)
+        else:
+            yield Token(tokentype, string[start:end], linenum)
+
+
+# ---------------- 带花括号配对信息的记号表 ----------------
+# 词法分析时顺便记下每个LBRACE对应的RBRACE，以及各IMPORT记号的位置，
+# 语法分析器可以据此在O(1)时间内跳过一个代码块，并知道跳过的部分里有没有import语句。
+
+class TokenIndex:
+    def __init__(self, string):
+        self.tokens = []
+        self.braces = {}  # LBRACE的下标 -> 配对的RBRACE的下标
+        self.imports = []  # IMPORT记号的下标，递增
+        opened = []
+        for index, token in enumerate(table_tokens(string)):
+            self.tokens.append(token)
+            tokentype = token.tokenType
+            if tokentype is TokenType.LBRACE:
+                opened.append(index)
+            elif tokentype is TokenType.RBRACE:
+                if opened:
+                    self.braces[opened.pop()] = index
+            elif tokentype is TokenType.IMPORT:
+                self.imports.append(index)
+
+    def has_import(self, start, stop):
+        # tokens[start:stop]中是否有IMPORT记号
+        i = bisect_left(self.imports, start)
+        return i < len(self.imports) and self.imports[i] < stop
+
+
+# ---------------- 结构数组形式的记号表 ----------------
+# 每个记号只占四列数组中的一格：类型编号、起止位置和行号，
+# 记号的值在访问时才从源程序中切出，标识符统一驻留，不再为每个记号创建Token对象。
+
+KIND_TYPES = list(TokenType)  # 类型编号 -> TokenType
+KIND_CODES = {tokentype: code for code, tokentype in enumerate(KIND_TYPES)}
+
+
+class TokenBuffer:
+    def __init__(self, string):
+        self.source = string
+        offset = "I" if len(string) < 2 ** 32 else "Q"
+        self.kinds = array("B")
+        self.starts = array(offset)
+        self.ends = array(offset)
+        self.lines = array("I")
+        self.names = {}  # 标识符驻留表
+
+        kinds, starts, ends, lines = self.kinds, self.starts, self.ends, self.lines
+        identifiers = {}
+        classes = string.translate(CHAR_CLASSES).encode("latin-1")
+        for tokentype, start, end, linenum in _table_scan(string, classes):
+            if tokentype is TokenType.IDENTIFIER:
+                lexeme = string[start:end]
+                tokentype = identifiers.get(lexeme)
+                if tokentype is None:
+                    tokentype = identifiers[lexeme] = KEYWORDS.get(lexeme.upper(), TokenType.IDENTIFIER)
+            kinds.append(KIND_CODES[tokentype])
+            starts.append(start)
+            ends.append(end)
+            lines.append(linenum)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.kinds)
+        if not 0 <= index < len(self.kinds):
+            raise IndexError("token index out of range")
+        return TokenView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self.kinds)):
+            yield TokenView(self, index)
+
+    def token_type(self, index):
+        return KIND_TYPES[self.kinds[index]]
+
+    def token_value(self, index):
+        tokentype = KIND_TYPES[self.kinds[index]]
+        start = self.starts[index]
+        end = self.ends[index]
+        if tokentype is TokenType.NUMBER:
+            return float(self.source[start:end])
+        if tokentype is TokenType.STRING:
+            return self.source[start + 1:end - 1]
+        if tokentype is TokenType.NEWLINE:
+            return "\n"
+        lexeme = self.source[start:end]
+        if tokentype is TokenType.IDENTIFIER:
+            # 只在第一次遇到这个标识符时驻留，之后直接从表中取
+            name = self.names.get(lexeme)
+            if name is None:
+                name = self.names[lexeme] = sys.intern(lexeme)
+            return name
+        return lexeme
+
+
+class TokenView:
+    # 记号表中某一格的视图，与Token有相同的tokenType、value、linenum和show()
+    __slots__ = ("buffer", "index")
+
+    def __init__(self, buffer, index):
+        self.buffer = buffer
+        self.index = index
+
+    @property
+    def tokenType(self):
+        return self.buffer.token_type(self.index)
 
-    return tokens;
+    @property
+    def value(self):
+        return self.buffer.token_value(self.index)
 
+    @property
+    def linenum(self):
+        return self.buffer.lines[self.index]
 
-# 过滤注释
+    def show(self):
+        print(f"{self.tokenType.name.ljust(15)} {str(self.value).ljust(15)} {str(self.linenum)}")
+
+    def same_line(self, tokentype, value):
+        return Token(tokentype, value, self.linenum)
+
+
+# ---------------- 内存映射的字节级词法分析 ----------------
+# 用mmap映射源文件，直接在字节上查表分析，不把整个文件读成str。
+# 文件按换行切成若干窗口（记号不会跨行），每次只复制一个窗口；
+# 只有标识符和字符串需要按UTF-8解码，数字直接由字节转换，运算符和分隔符查表得到。
+# 非ASCII字符按解码后的字符查CHAR_CLASSES，它的各个字节都归入这个字符类，
+# 与str上的两种词法分析器接受同样的输入；不合法的UTF-8字节按非字母非数字处理。
+
+BYTE_CLASSES = bytes(CHAR_CLASSES[b] if b < 128 else CHAR_CLASSES[0x3002] for b in range(256))
+NON_ASCII_RUN = re.compile(rb"[\x80-\xff]+")
+MAP_WINDOW = 1 << 20
+
+
+def byte_classes(chunk, runs):
+    # chunk[i]的字符类；窗口在换行处切开，多字节字符不会被切断。
+    # runs缓存 非ASCII字节串 -> 字符类字节串，注释里重复出现的文字只解码一次
+    classes = chunk.translate(BYTE_CLASSES)
+    if chunk.isascii():
+        return classes
+    classes = bytearray(classes)
+    for match in NON_ASCII_RUN.finditer(chunk):
+        run = match.group()
+        run_classes = runs.get(run)
+        if run_classes is None:
+            run_classes = bytearray()
+            for c in run.decode("utf-8", "surrogateescape"):
+                size = 1 if "\udc80" <= c <= "\udcff" else len(c.encode("utf-8"))
+                run_classes += bytes((CHAR_CLASSES[ord(c)],)) * size
+            run_classes = runs[run] = bytes(run_classes)
+        classes[match.start():match.end()] = run_classes
+    return classes
+
+
+class MappedSource:
+    # 可以代替源程序字符串传给Parser()，迭代时逐个产生Token
+    def __init__(self, filename):
+        self.file = open(filename, "rb")
+        size = self.file.seek(0, 2)
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return mapped_tokens(self.data)
+
+
+def mapped_tokens(data, window=MAP_WINDOW):
+    identifiers = {}  # 标识符的字节串 -> (记号类型, 解码后的标识符)
+    texts = {}  # 运算符、分隔符的字节串 -> str
+    runs = {}  # 见byte_classes
+    n = len(data)
+    linenum = 1
+    base = 0
+    while base < n:
+        stop = data.rfind(b"\n", base, base + window) + 1 if base + window < n else n
+        if stop <= base:
+            stop = data.find(b"\n", base + window) + 1 or n
+        chunk = data[base:stop]
+        for tokentype, start, end, line in _table_scan(chunk, byte_classes(chunk, runs), linenum):
+            if tokentype is TokenType.END:
+                linenum = line
+            elif tokentype is TokenType.IDENTIFIER:
+                lexeme = chunk[start:end]
+                entry = identifiers.get(lexeme)
+                if entry is None:
+                    text = lexeme.decode("utf-8")
+                    entry = identifiers[lexeme] = (KEYWORDS.get(text.upper(), TokenType.IDENTIFIER), text)
+                yield Token(entry[0], entry[1], line)
+            elif tokentype is TokenType.NUMBER:
+                yield Token(tokentype, float(chunk[start:end]), line)
+            elif tokentype is TokenType.STRING:
+                yield Token(tokentype, chunk[start + 1:end - 1].decode("utf-8"), line)
+            elif tokentype is TokenType.NEWLINE:
+                yield Token(tokentype, "\n", line)
+            else:
+                lexeme = chunk[start:end]
+                text = texts.get(lexeme)
+                if text is None:
+                    text = texts[lexeme] = lexeme.decode("ascii")
+                yield Token(tokentype, text, line)
+        base = stop
+    yield Token(TokenType.END, "", linenum)
+
+
+# ---------------- 多进程分块词法分析 ----------------
+# 字符串不能跨行、注释到行尾结束，所以源程序可以在换行处切成若干块分别分析。
+# 每块的起始行号在主进程中用str.count算出，子进程用表驱动的状态机分析，
+# 去掉各块的END后按顺序拼接，最后补一个END，结果与顺序分析完全相同。
+
+def split_lines(string, size):
+    # 把string切成约size个字符、以换行结尾的若干块，产生(块, 起始行号)
+    n = len(string)
+    start = 0
+    linenum = 1
+    while start < n:
+        stop = string.find("\n", start + size) + 1 or n
+        yield string[start:stop], linenum
+        linenum += string.count("\n", start, stop) + string.count("\r", start, stop) - string.count("\r\n", start, stop)
+        start = stop
+
+
+def split_statements(string, size):
+    # 与split_lines相同，但只在顶层语句之间切开：花括号深度为0的NEWLINE之后，
+    # 下一个记号不是LBRACE(def/if/for的代码块)、elif、else时，新的顶层语句从下一行开始
+    classes = string.translate(CHAR_CLASSES).encode("latin-1")
+    depth = 0
+    start = 0
+    start_line = 1
+    boundary = None  # 深度为0的NEWLINE之后的位置
+    for tokentype, i, j, linenum in _table_scan(string, classes):
+        if boundary is not None and tokentype is not TokenType.NEWLINE:
+            if tokentype is TokenType.IDENTIFIER and string[i:j].upper() in ("ELIF", "ELSE"):
+                pass
+            elif tokentype is not TokenType.LBRACE and tokentype is not TokenType.END and boundary - start >= size:
+                yield string[start:boundary], start_line
+                start, start_line = boundary, linenum
+            boundary = None
+        if tokentype is TokenType.LBRACE:
+            depth += 1
+        elif tokentype is TokenType.RBRACE:
+            depth -= 1
+        elif tokentype is TokenType.NEWLINE and depth == 0:
+            boundary = j
+    if start < len(string):
+        yield string[start:], start_line
+
+
+def _lex_chunk(chunk, linenum):
+    # 子进程中执行；返回(类型编号, 值, 行号)，比Token对象更便于进程间传递
+    return [(KIND_CODES[token.tokenType], token.value, token.linenum)
+            for token in table_tokens(chunk, linenum)]
+
+
+def ParallelLexer(string, workers=None, chunk_size=1 << 16):
+    tokens = []
+    append = tokens.append
+    types = KIND_TYPES
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_lex_chunk, chunk, linenum)
+                   for chunk, linenum in split_lines(string, chunk_size)]
+        linenum = 1
+        for future in futures:
+            rows = future.result()
+            for code, value, line in rows[:-1]:
+                append(Token(types[code], value, line))
+            linenum = rows[-1][2]
+    append(Token(TokenType.END, "", linenum))
+    return tokens
+
+
+# ---------------- 按行增量的词法分析 ----------------
+# 记号不会跨行，修改第a..b行只会影响这些行上的记号。
+# 增删行时不能逐个改后面记号的行号(那样每次修改都与文件大小成正比)，所以可增量修改的记号表中
+# 每一行有一个Line对象，记号只记住自己所在的Line。各行按排序键排列，LineTable.keys是全部行的
+# 有序键表，行号就是键在表中的位置加一：改动第a..b行只是在keys中换掉这几行的键，
+# 其后的行和记号都不用动，读行号时再用二分查找求出(结果按LineTable.version缓存)。
+
+LINE_GAP = 1 << 16  # 初始各行键之间的间隔，给以后插入的行留出位置
+
+
+class LineTable:
+    def __init__(self, count):
+        self.keys = [((i + 1) * LINE_GAP,) for i in range(count)]
+        self.version = 0  # 行数变化时加一，Line缓存的行号随之失效
+
+    def replace(self, first, old_count, new_count):
+        # 第first行起的old_count行换成new_count行，返回新行的键；键是整数元组，按字典序排列
+        keys = self.keys
+        lo = keys[first - 2] if first > 1 else None
+        hi = keys[first - 1 + old_count] if first - 1 + old_count < len(keys) else None
+        new_keys = keys_between(lo, hi, new_count)
+        keys[first - 1:first - 1 + old_count] = new_keys
+        if old_count != new_count:
+            self.version += 1
+        return new_keys
+
+
+def keys_between(lo, hi, count):
+    # 严格位于lo与hi之间(None表示没有这一端)的count个递增的键：先在lo的最后一位上找空隙，
+    # 空隙不够时在lo后面加一位；hi以lo为前缀时新的一位要小于hi在这一位上的值
+    if lo is None:
+        top = hi[0] if hi is not None else (count + 1) * LINE_GAP
+        return [(top - (count - i) * LINE_GAP,) for i in range(count)]
+    base, start = lo[:-1], lo[-1]
+    if hi is None or hi[:len(base)] != base:
+        stop = start + (count + 1) * LINE_GAP
+    else:
+        stop = hi[len(base)]
+    step = (stop - start) // (count + 1)
+    if step > 0:
+        return [base + (start + step * (i + 1),) for i in range(count)]
+    if hi is not None and len(hi) > len(lo) and hi[:len(lo)] == lo:
+        top = hi[len(lo)]
+        return [lo + (top - (count - i) * LINE_GAP,) for i in range(count)]
+    return [lo + ((i + 1) * LINE_GAP,) for i in range(count)]
+
+
+class Line:
+    __slots__ = ("table", "key", "number", "version")
+
+    def __init__(self, table, key, number):
+        self.table = table
+        self.key = key
+        self.number = number
+        self.version = table.version
+
+    def linenum(self):
+        table = self.table
+        if self.version != table.version:
+            self.number = bisect_left(table.keys, self.key) + 1
+            self.version = table.version
+        return self.number
+
+
+class LineToken(Token):
+    # 行号由所在行的Line给出
+    def __init__(self, tokentype, value, line):
+        self.tokenType = tokentype
+        self.value = value
+        self.line = line
+
+    @property
+    def linenum(self):
+        return self.line.linenum()
+
+    def same_line(self, tokentype, value):
+        return LineToken(tokentype, value, self.line)
+
+
+def line_tokens(tokens, lines, first_line):
+    # tokens中的行号换成Line，lines[i]为第first_line+i行
+    return [LineToken(token.tokenType, token.value, lines[token.linenum - first_line]) for token in tokens]
+
+
+def EditableLexer(string):
+    """可以用relex_lines增量修改的记号表。"""
+    tokens = TableLexer(string)
+    table = LineTable(tokens[-1].linenum)
+    lines = [Line(table, key, i + 1) for i, key in enumerate(table.keys)]
+    return line_tokens(tokens, lines, 1)
+
+
+def relex_lines(tokens, first_line, last_line, new_text, errors=None):
+    """用new_text替换第first_line..last_line行（含行尾换行符）后，就地更新记号表tokens。
+
+    tokens必须是EditableLexer得到的记号表。只重新分析new_text，其后的记号不用改动，
+    行号随LineTable自动平移；返回(tokens, (lo, hi))，tokens[lo:hi]为新分析出的记号。
+    编辑中的行常常不完整，词法错误不退出：给出errors列表时把Diagnostic记在其中，跳过出错的文本；
+    否则抛出LexError，tokens保持不变。
+    """
+    if not isinstance(tokens[-1], LineToken):
+        raise ValueError("relex_lines需要EditableLexer得到的记号表")
+
+    def line_of(token):
+        return token.linenum
+
+    lo = bisect_left(tokens, first_line, key=line_of)
+    hi = min(bisect_right(tokens, last_line, lo, key=line_of), len(tokens) - 1)  # END不参与替换
+    old_lines = sum(1 for token in tokens[lo:hi] if token.tokenType is TokenType.NEWLINE)
+
+    found = []
+    new_tokens = list(table_tokens(new_text, first_line, errors=found))
+    if found and errors is None:
+        raise LexError(found[0])
+    if errors is not None:
+        errors.extend(found)
+    end = new_tokens.pop()
+    table = tokens[-1].line.table
+    new_lines = [Line(table, key, first_line + i)
+                 for i, key in enumerate(table.replace(first_line, old_lines, end.linenum - first_line))]
+    new_lines.append(tokens[hi].line)  # new_text最后没有换行时，剩下的记号接在下一行上
+    new_tokens = line_tokens(new_tokens, new_lines, first_line)
+
+    tokens[lo:hi] = new_tokens
+    return tokens, (lo, lo + len(new_tokens))
+
+
+# ---------------- 只运行时的快速翻译 ----------------
+# 可信的程序只需要运行时，不建语法树，直接在记号流上去掉作为分隔符的花括号；
+# 花括号之外的原文（缩进、空白、注释、字符串内容）原样保留。
+
+def translate_run_only(string):
+    parts = []
+    begin = 0
+    classes = string.translate(CHAR_CLASSES).encode("latin-1")
+    for tokentype, start, end, linenum in _table_scan(string, classes):
+        if tokentype is TokenType.LBRACE or tokentype is TokenType.RBRACE:
+            parts.append(string[begin:start])
+            begin = end
+    parts.append(string[begin:])
+    return "".join(parts)
+
+
+# 过滤注释，字符串中的"#"不是注释；词法分析器已经能跳过注释，这里只用于输出过滤后的文件
 def filterComment(string):
-    filterstr = ""
+    parts = []
     cur_state = LexDFA.Start0
+    begin = 0
 
-    for c in string:
+    for i, c in enumerate(string):
         if cur_state == LexDFA.Start0:
             if c=="#":
+                parts.append(string[begin:i])
                 cur_state = LexDFA.State1
-            else:
-                filterstr+=c
+            elif c=="\"":
+                cur_state = LexDFA.State5
+            elif c=="\'":
+                cur_state = LexDFA.State6
         elif cur_state == LexDFA.State1:
-            if c=="\n":
-                filterstr+=c
+            if c=="\n" or c=="\r":
+                begin = i
+                cur_state = LexDFA.Start0
+        elif cur_state == LexDFA.State5:
+            if c=="\"" or c=="\n":
+                cur_state = LexDFA.Start0
+        elif cur_state == LexDFA.State6:
+            if c=="\'" or c=="\n":
                 cur_state = LexDFA.Start0
 
-    return filterstr
+    if cur_state != LexDFA.State1:
+        parts.append(string[begin:])
+    return "".join(parts)
 
 def read_file_to_string(filename):
     """读取指定文件的全部内容并返回一个字符串。"""
@@ -429,25 +1209,20 @@ def write_string_to_file(content, filename):
     except IOError:
         return "文件写入失败。"
 
-    content = content.replace("{", "")
-    content = content.replace("}", "")
-    try:
-        with open("test_run.py", 'w', encoding='utf-8') as file:
-            file.write(content)
-    except IOError:
-        return "文件写入失败。"
-
 
 
 
-def getTokenList():
+# filter_file不为空时，把过滤注释后的源程序写入该文件；dumper(pydump.Dumper)不为空时输出记号序列
+def getTokenList(filter_file=None, dumper=None):
     str = read_file_to_string("test.py")
-    str = filterComment(str)
-    write_string_to_file(str, "test_filter.py")
+    if filter_file:
+        write_string_to_file(filterComment(str), filter_file)
     tokens = Lexer(str)
-    for token in tokens:
-        token.show()
+    if dumper is not None:
+        dumper.tokens(tokens)
     return tokens
 
 
-getTokenList()
\ No newline at end of file
+if __name__ == "__main__":
+    for token in getTokenList():
+        token.show()
\ No newline at end of file
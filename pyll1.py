@@ -0,0 +1,458 @@
+import hashlib
+import json
+import os
+import sys
+
+from pylex import Lexer, TokenType
+from pylex import read_file_to_string
+from pyparser import Node, Kind, LEAF_KINDS, QUALIFIED_KINDS, kind_of, leaf
+
+
+# 文法：每行一个非终结符，"|"分隔候选式，ε表示空串；大写名字是TokenType中的记号，小写名字是非终结符。
+# 与pyparser.py中各parser_*函数注释里的产生式一一对应，表达式部分按优先级分层改写成了LL(1)形式。
+# 候选式后面的[记号...]是递归下降版本在这里额外检查的向前看记号：只有下一个记号在其中时才选用这个候选式，
+# 这样两个分析器接受和拒绝的程序完全相同(例如程序不能以NOT/PLUS/MINUS开头，没有else的if只能是最后一条语句)
+GRAMMAR = """
+program -> NEWLINE program | END
+    | statements END [DEF IF FOR WHILE RETURN IMPORT PASS BREAK CONTINUE IDENTIFIER TRUE FALSE NONE NUMBER STRING LPAREN LBRACKET]
+statements -> statement_list
+statement_list -> compound_stmt statements_more | simple_stmt simple_end
+simple_end -> NEWLINE statements_more | ε
+statements_more -> statement_list | ε
+compound_stmt -> function_def | if_stmt | for_stmt | while_stmt
+simple_stmt -> identifier_stmt | atom_rest expr_rest | NOT inversion | PLUS factor | MINUS factor
+    | return_stmt | import_stmt | PASS | BREAK | CONTINUE
+identifier_stmt -> IDENTIFIER identifier_opt
+identifier_opt -> ASSIGN expression | AUGASSIGN expression | expr_rest
+expr_rest -> OR expression | AND expression | NOT expression
+    | EQ expression | NOTEQ expression | LT expression | LTEQ expression | RT expression | RTEQ expression
+    | PLUS expression | MINUS expression | TIMES expression | DIVIDE expression | POWER expression
+    | DOT IDENTIFIER object_rest | LPAREN arguments RPAREN | LBRACKET slices RBRACKET | ε
+object_rest -> LPAREN arguments RPAREN | ε
+block -> NEWLINE LBRACE statements RBRACE NEWLINE
+expression -> disjunction
+disjunction -> conjunction disjunction_rest
+disjunction_rest -> OR conjunction disjunction_rest | ε
+conjunction -> inversion conjunction_rest
+conjunction_rest -> AND inversion conjunction_rest | ε
+inversion -> NOT inversion | comparison
+comparison -> sum comparison_rest
+comparison_rest -> compare_op sum comparison_rest | ε
+compare_op -> EQ | NOTEQ | LTEQ | LT | RT | RTEQ
+sum -> term sum_rest
+sum_rest -> PLUS term sum_rest | MINUS term sum_rest | ε
+term -> factor term_rest
+term_rest -> TIMES factor term_rest | DIVIDE factor term_rest | ε
+factor -> PLUS factor | MINUS factor | power
+power -> primary power_rest
+power_rest -> POWER factor | ε
+primary -> atom trailers
+trailers -> DOT IDENTIFIER trailers | LPAREN arguments RPAREN trailers | LBRACKET slices RBRACKET trailers | ε
+atom -> IDENTIFIER | TRUE | FALSE | NONE | NUMBER | STRING | tuple | list
+slices -> expression slices_rest
+slices_rest -> COMMA slices | ε
+tuple -> LPAREN tuple_rest
+tuple_rest -> RPAREN | expressions RPAREN
+list -> LBRACKET list_rest
+list_rest -> RBRACKET | expressions RBRACKET
+expressions -> expression expressions_rest
+expressions_rest -> COMMA expression expressions_rest | ε
+arguments -> kwarg arguments_rest | ε
+arguments_rest -> COMMA arguments | ε
+kwarg -> IDENTIFIER kwarg_rest | atom_rest expr_rest | NOT inversion | PLUS factor | MINUS factor
+atom_rest -> TRUE | FALSE | NONE | NUMBER | STRING | tuple | list
+kwarg_rest -> ASSIGN expression | expr_rest
+return_stmt -> RETURN expression
+import_stmt -> IMPORT dotted_as_names
+dotted_as_names -> dotted_as_name dotted_as_names_rest
+dotted_as_names_rest -> COMMA dotted_as_names | ε [NEWLINE END]
+dotted_as_name -> dotted_name dotted_as_name_rest
+dotted_as_name_rest -> AS IDENTIFIER | ε [NEWLINE END COMMA]
+dotted_name -> IDENTIFIER dotted_name_rest
+dotted_name_rest -> DOT IDENTIFIER | ε [NEWLINE END COMMA AS]
+function_def -> DEF IDENTIFIER LPAREN arguments RPAREN COLON block
+if_stmt -> IF expression COLON block if_stmt_rest
+if_stmt_rest -> elif_stmt | else_block | ε [NEWLINE END RBRACE]
+elif_stmt -> ELIF expression COLON block if_stmt_rest
+else_block -> ELSE COLON block
+for_stmt -> FOR IDENTIFIER IN expression COLON block
+while_stmt -> WHILE expression COLON block
+"""
+
+EMPTY = "ε"
+TABLE_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pyll1_table.json")
+
+
+def read_grammar(text):
+    # 返回产生式列表[(左部, 右部符号元组, 限定的向前看记号集合或None)]，第一条产生式的左部是开始符号
+    productions = []
+    lhs = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if "->" in line:
+            lhs, line = (part.strip() for part in line.split("->", 1))
+        elif line.startswith("|"):
+            line = line[1:]  # 上一行候选式的续行
+        else:
+            raise ValueError("文法格式错误: " + line)
+        for alternative in line.split("|"):
+            alternative, _, restriction = alternative.partition("[")
+            lookahead = frozenset(restriction.rstrip("] ").split()) if restriction else None
+            productions.append((lhs, tuple(s for s in alternative.split() if s != EMPTY), lookahead))
+    return productions
+
+
+def is_terminal(symbol):
+    return symbol in TokenType.__members__
+
+
+def first_sets(productions):
+    # FIRST(A)：A能推导出的串的第一个记号；能推导出空串时包含EMPTY
+    first = {lhs: set() for lhs, _, _ in productions}
+    changed = True
+    while changed:
+        changed = False
+        for lhs, rhs, _ in productions:
+            before = len(first[lhs])
+            first[lhs] |= first_of(rhs, first)
+            changed |= len(first[lhs]) != before
+    return first
+
+
+def first_of(symbols, first):
+    # 符号串的FIRST集
+    result = set()
+    for symbol in symbols:
+        if is_terminal(symbol):
+            result.add(symbol)
+            return result
+        result |= first[symbol] - {EMPTY}
+        if EMPTY not in first[symbol]:
+            return result
+    result.add(EMPTY)
+    return result
+
+
+def follow_sets(productions, first):
+    # FOLLOW(A)：句型中紧跟在A后面的记号，开始符号以END结束
+    follow = {lhs: set() for lhs, _, _ in productions}
+    changed = True
+    while changed:
+        changed = False
+        for lhs, rhs, _ in productions:
+            for i, symbol in enumerate(rhs):
+                if is_terminal(symbol):
+                    continue
+                before = len(follow[symbol])
+                rest = first_of(rhs[i + 1:], first)
+                follow[symbol] |= rest - {EMPTY}
+                if EMPTY in rest:
+                    follow[symbol] |= follow[lhs]
+                changed |= len(follow[symbol]) != before
+    return follow
+
+
+def build_table(productions):
+    # LL(1)分析表：非终结符 -> {记号名: 产生式编号}，有冲突时说明文法不是LL(1)的
+    first = first_sets(productions)
+    follow = follow_sets(productions, first)
+    table = {lhs: {} for lhs, _, _ in productions}
+    conflicts = []
+    for index, (lhs, rhs, restriction) in enumerate(productions):
+        lookahead = first_of(rhs, first)
+        if EMPTY in lookahead:
+            lookahead = (lookahead - {EMPTY}) | follow[lhs]
+        if restriction is not None:
+            lookahead &= restriction
+        for terminal in lookahead:
+            if table[lhs].setdefault(terminal, index) != index:
+                conflicts.append(f"{lhs} 遇到 {terminal}: 产生式{table[lhs][terminal]}与{index}冲突")
+    if conflicts:
+        raise ValueError("文法不是LL(1)的:\n" + "\n".join(sorted(conflicts)))
+    return table
+
+
+def load_table(grammar=GRAMMAR, cache=TABLE_CACHE):
+    # 分析表缓存在磁盘上，用文法文本的摘要判断缓存是否过期
+    digest = hashlib.sha1(grammar.encode("utf-8")).hexdigest()
+    productions = read_grammar(grammar)
+    try:
+        with open(cache, "r", encoding="utf-8") as file:
+            cached = json.load(file)
+        if cached["grammar"] == digest:
+            return productions, cached["table"]
+    except (OSError, ValueError, KeyError):
+        pass
+    table = build_table(productions)
+    try:
+        with open(cache, "w", encoding="utf-8") as file:
+            json.dump({"grammar": digest, "table": table}, file)
+    except OSError:
+        pass
+    return productions, table
+
+
+# 归约动作：由子结点列表构造与pyparser.Parser相同的语法树。
+# 没有专门动作的非终结符：空产生式得到None，其余得到Node(非终结符, 子结点)
+
+def reduce_program(parser, children):
+    if len(children) == 2 and children[0].kind == LEAF_KINDS["NEWLINE"]:
+        return children[1]  # 开头的空行
+    if len(children) == 1:
+        return Node(Kind.EMPTYprogram)
+    return Node(Kind.program, children=(children[0],), imported_names=parser.imported_names)
+
+
+def reduce_statements(parser, children):
+    # statement_list得到的是倒序的语句列表
+    statements = children[0]
+    statements.reverse()
+    return Node(Kind.statements, children=statements)
+
+
+def reduce_statement_list(parser, children):
+    # 简单语句后面必须有NEWLINE，只有最后一条语句(后面是END或RBRACE)可以省略；
+    # 这里给简单语句合成一个NEWLINE结点，与递归下降版本一致
+    if children[0].kind == Kind.compound_stmt:
+        statements = children[1]
+        statements.append(Node(Kind.statement, children=(children[0],)))
+    else:
+        newline_node, statements = children[1]
+        statements.append(Node(Kind.statement, children=(children[0], newline_node)))
+    return statements
+
+
+def reduce_simple_end(parser, children):
+    # 合成的NEWLINE结点与简单语句后面那个记号(NEWLINE、END或RBRACE)在同一行
+    if children:
+        token, statements = children[0].value, children[1]
+    else:
+        token, statements = parser.tokenNow, []
+    return Node(QUALIFIED_KINDS["NEWLINE"], value=token.same_line(TokenType.NEWLINE, "\n")), statements
+
+
+def reduce_statements_more(parser, children):
+    return children[0] if children else []
+
+
+def reduce_more(parser, children):
+    # 右递归的*_rest/trailers：把本层的符号倒序追加到内层得到的列表末尾，避免每层复制整个列表
+    if not children:
+        return []
+    items = children[-1]
+    items.extend(reversed(children[:-1]))
+    return items
+
+
+def reduce_identifier_opt(parser, children):
+    # 赋值号结点的类型是str(TokenType)而不是记号名，与递归下降版本一致
+    if len(children) == 2:
+        children[0].kind = QUALIFIED_KINDS[children[0].value.tokenType._name_]
+    return Node(Kind.identifier_opt, children=children)
+
+
+def reduce_block(parser, children):
+    # 开头的NEWLINE不放进block结点
+    return Node(Kind.block, children=children[1:])
+
+
+def reduce_chain(parser, children):
+    # 同一优先级的左结合运算符链合并在一个binop结点中，没有运算符时直接返回操作数
+    operands = children[1]
+    if not operands:
+        return children[0]
+    operands.append(children[0])
+    operands.reverse()
+    return Node(Kind.binop, children=operands)
+
+
+def reduce_prefix(parser, children):
+    if len(children) == 1:
+        return children[0]
+    return Node(Kind.unary, children=children)
+
+
+def reduce_power_rest(parser, children):
+    return children[::-1]
+
+
+def reduce_power(parser, children):
+    if not children[1]:
+        return children[0]
+    return Node(Kind.binop, children=(children[0], children[1][1], children[1][0]))
+
+
+def reduce_primary(parser, children):
+    trailers = children[1]
+    if not trailers:
+        return children[0]
+    trailers.append(children[0])
+    trailers.reverse()
+    return Node(Kind.primary, children=trailers)
+
+
+def reduce_single(parser, children):
+    return children[0]
+
+
+def reduce_dotted_as_name(parser, children):
+    # 登记导入名：有as时是别名，否则是模块名的第一个标识符
+    if children[1] is not None:
+        parser.imported_names.append(children[1].children[1])
+    else:
+        parser.imported_names.append(children[0].children[0])
+    return Node(Kind.dotted_as_name, children=children)
+
+
+def reduce_if_stmt_rest(parser, children):
+    if not children:
+        return None
+    if children[0].kind == Kind.else_block:
+        return Node(Kind.else_block_node, children=children)
+    return Node(Kind.if_stmt_rest, children=children)
+
+
+def reduce_while_stmt(parser, children):
+    # 与递归下降版本一致，while语句也得到for_stmt结点
+    return Node(Kind.for_stmt, children=children)
+
+
+ACTIONS = {
+    "program": reduce_program,
+    "statements": reduce_statements,
+    "statement_list": reduce_statement_list,
+    "simple_end": reduce_simple_end,
+    "statements_more": reduce_statements_more,
+    "identifier_opt": reduce_identifier_opt,
+    "block": reduce_block,
+    "expression": reduce_single,
+    "disjunction": reduce_chain, "disjunction_rest": reduce_more,
+    "conjunction": reduce_chain, "conjunction_rest": reduce_more,
+    "inversion": reduce_prefix,
+    "comparison": reduce_chain, "comparison_rest": reduce_more,
+    "compare_op": reduce_single,
+    "sum": reduce_chain, "sum_rest": reduce_more,
+    "term": reduce_chain, "term_rest": reduce_more,
+    "factor": reduce_prefix,
+    "power": reduce_power, "power_rest": reduce_power_rest,
+    "primary": reduce_primary, "trailers": reduce_more,
+    "atom": reduce_single,
+    "dotted_as_name": reduce_dotted_as_name,
+    "if_stmt_rest": reduce_if_stmt_rest,
+    "while_stmt": reduce_while_stmt,
+}
+
+
+def default_action(lhs):
+    kind = kind_of(lhs)
+
+    def reduce(parser, children):
+        if not children:
+            return None
+        return Node(kind, children=children)
+    return reduce
+
+
+# 只是把唯一的子结点原样向上传的归约动作，这样的单符号产生式不需要归约标记
+PASSTHROUGH = frozenset({reduce_single, reduce_prefix})
+
+
+def compile_table(productions, table):
+    # 把缓存中的表转换成驱动程序直接使用的形式：非终结符 -> {记号名: (归约标记, 倒序的右部符号)}，
+    # 右部中的终结符用TokenType表示。空产生式的表项是(归约动作, None)，展开时直接归约；
+    # 原样上传子结点的单符号产生式没有归约标记
+    entries = []
+    for lhs, rhs, _ in productions:
+        action = ACTIONS.get(lhs) or default_action(lhs)
+        symbols = tuple(TokenType[s] if is_terminal(s) else s for s in reversed(rhs))
+        if not rhs:
+            entries.append((action, None))
+        elif len(rhs) == 1 and action in PASSTHROUGH:
+            entries.append((None, symbols))
+        else:
+            entries.append(((action, len(rhs)), symbols))
+    return {
+        lhs: {terminal: entries[index] for terminal, index in row.items()}
+        for lhs, row in table.items()
+    }
+
+
+_parse_table = None
+
+
+def parse_table():
+    # 第一次创建LL1Parser时才读取分析表(缓存过期时重新生成并写回)，导入模块不读写磁盘。
+    # 返回(驱动程序使用的表, 开始符号)
+    global _parse_table
+    if _parse_table is None:
+        productions, table = load_table()
+        _parse_table = compile_table(productions, table), productions[0][0]
+    return _parse_table
+
+
+class LL1Parser:
+    # 表驱动的LL(1)预测分析器：用显式的栈代替函数递归，得到的语法树与pyparser.Parser相同。
+    # 栈中的元素是终结符(TokenType)、非终结符(str)或归约标记(归约动作, 子结点个数)；
+    # 分析过程中values保存已经归约得到的结点。查表用记号名(_name_)而不是TokenType本身，
+    # 因为Enum成员的__hash__是Python函数，每个记号都要查表时开销很明显。
+    # table是parse_table()返回的(分析表, 开始符号)，默认使用GRAMMAR的表
+
+    def __init__(self, string, table=None):
+        if isinstance(string, str):
+            self.tokenIter = Lexer(string, stream=True)
+        else:
+            self.tokenIter = iter(string)
+        self.tokenNow = None
+        self.table, self.start = table or parse_table()
+        self.imported_names = []
+
+    def FetchToken(self):
+        try:
+            self.tokenNow = next(self.tokenIter)
+            return self.tokenNow
+        except StopIteration:
+            sys.exit()
+
+    def parse(self):
+        table = self.table
+        fetch = self.FetchToken
+        end = TokenType.END
+        token = fetch()
+        stack = [self.start]
+        values = []
+        pop, push, extend = stack.pop, stack.append, stack.extend
+        append = values.append
+        while stack:
+            symbol = pop()
+            if symbol.__class__ is TokenType:
+                if token.tokenType is not symbol:
+                    print("line " + str(token.linenum) + " 语法错误：Expected " + str(symbol) + " received ",
+                          token.tokenType)
+                    exit(0)
+                append(leaf(token))
+                if symbol is not end:
+                    token = fetch()
+            elif symbol.__class__ is str:
+                entry = table[symbol].get(token.tokenType._name_)
+                if entry is None:
+                    print("line " + str(token.linenum) + " 语法错误：received ", token.tokenType)
+                    exit(0)
+                marker, symbols = entry
+                if symbols is None:
+                    append(marker(self, []))
+                else:
+                    if marker is not None:
+                        push(marker)
+                    extend(symbols)
+            else:
+                action, count = symbol
+                children = values[-count:]
+                del values[-count:]
+                append(action(self, children))
+        return values[0]
+
+
+if __name__ == "__main__":
+    LL1Parser(read_file_to_string("test.py")).parse().print_tree(0)
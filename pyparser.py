@@ -1,1075 +1,1401 @@
+import gc
+import json
 import sys
+import time
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from operator import attrgetter, length_hint
 
 from pylex import Lexer, write_string_to_file
 from pylex import Token
 from pylex import TokenType
 from pylex import read_file_to_string
 from pylex import filterComment
+from pylex import MappedSource
+from pylex import relex_lines
+from pylex import Diagnostic
+from pylex import split_statements, table_tokens
+from pywalk import preorder, preorder_depth, leaves
+
+
+# 结点类型的整数编码。结点中只存编码(kind)，type属性按编码查回原来的类型名，兼容按名字比较的代码；
+# 新的类型名在第一次用到时编号，同一进程内编码不变
+KIND_NAMES = []
+KINDS = {}
+
+
+def kind_of(name):
+    kind = KINDS.get(name)
+    if kind is None:
+        kind = KINDS[name] = len(KIND_NAMES)
+        KIND_NAMES.append(name)
+    return kind
+
+
+# 记号结点的编码，按记号名(_name_)查：LEAF_KINDS对应类型名"IF"，QUALIFIED_KINDS对应"TokenType.ASSIGN"
+LEAF_KINDS = {name: kind_of(name) for name in TokenType.__members__}
+QUALIFIED_KINDS = {name: kind_of(str(member)) for name, member in TokenType.__members__.items()}
+
+
+class Kind:
+    # 非终结符结点的编码
+    program = kind_of("program")
+    EMPTYprogram = kind_of("EMPTYprogram")
+    statements = kind_of("statements")
+    statement = kind_of("statement")
+    simple_stmt = kind_of("simple_stmt")
+    compound_stmt = kind_of("compound_stmt")
+    identifier_stmt = kind_of("identifier_stmt")
+    identifier_opt = kind_of("identifier_opt")
+    expr_rest = kind_of("expr_rest")
+    object_rest = kind_of("object_rest")
+    block = kind_of("block")
+    binop = kind_of("binop")
+    unary = kind_of("unary")
+    primary = kind_of("primary")
+    slices = kind_of("slices")
+    slices_rest = kind_of("slices_rest")
+    tuple = kind_of("tuple")
+    tuple_rest = kind_of("tuple_rest")
+    list = kind_of("list")
+    list_rest = kind_of("list_rest")
+    expressions = kind_of("expressions")
+    expressions_rest = kind_of("expressions_rest")
+    arguments = kind_of("arguments")
+    arguments_rest = kind_of("arguments_rest")
+    kwarg = kind_of("kwarg")
+    kwarg_rest = kind_of("kwarg_rest")
+    atom_rest = kind_of("atom_rest")
+    return_stmt = kind_of("return_stmt")
+    import_stmt = kind_of("import_stmt")
+    dotted_as_names = kind_of("dotted_as_names")
+    dotted_as_names_rest = kind_of("dotted_as_names_rest")
+    dotted_as_name = kind_of("dotted_as_name")
+    dotted_as_name_rest = kind_of("dotted_as_name_rest")
+    dotted_name = kind_of("dotted_name")
+    dotted_name_rest = kind_of("dotted_name_rest")
+    function_def = kind_of("function_def")
+    if_stmt = kind_of("if_stmt")
+    if_stmt_rest = kind_of("if_stmt_rest")
+    elif_stmt = kind_of("elif_stmt")
+    else_block = kind_of("else_block")
+    else_block_node = kind_of("else_block_node")
+    for_stmt = kind_of("for_stmt")
+    while_stmt = kind_of("while_stmt")
 
 
 class Node:
-    def __init__(self, type, children=None, value=None, imported_names=None):
-        self.type = type
-        self.children = children if children is not None else []
+    # children是元组；imported_names只有program结点上是导入名列表，其余结点都是空元组
+    __slots__ = ("kind", "children", "value", "imported_names")
+
+    def __init__(self, kind, children=(), value=None, imported_names=()):
+        if kind.__class__ is str:
+            kind = kind_of(kind)
+        if children.__class__ is not tuple:
+            children = tuple(children)
+        self.kind = kind
+        self.children = children
         self.value = value
-        self.imported_names = imported_names if imported_names is not None else []
+        self.imported_names = imported_names
+
+    @property
+    def type(self):
+        return KIND_NAMES[self.kind]
+
+    @type.setter
+    def type(self, name):
+        self.kind = kind_of(name)
 
     def add_child(self, node):
-        self.children.append(node)
-
-    def collect_imports(self):
-        # 递归收集所有子节点的imported_names
-        collected_imports = list(self.imported_names)  # 现在self.imported_names已经保证是列表
-        # 递归收集所有子节点的imported_names
-        for child in self.children:
-            if child:  # 确保child不是None
-                # 合并子节点的导入名称，处理可能的NoneType错误
-                child_imports = child.collect_imports()
-                if child_imports is not None:
-                    collected_imports.extend(child_imports)
-        return collected_imports
+        self.children += (node,)
 
     def print_tree(self, level=0):
-        indent = ' ' * (level * 4)  # 每一级增加4个空格的缩进
-        if self.value:
-            # 当存在 value 时，它是一个 Token 对象
-            value_str = f"{self.value.tokenType.value}【{self.value.value}】, Line: {self.value.linenum}"
-        else:
-            value_str = "None"
-
+        for node, depth in preorder_depth(self, depth=level):
+            indent = ' ' * (depth * 4)  # 每一级增加4个空格的缩进
+            if node.value:
+                # 当存在 value 时，它是一个 Token 对象
+                value_str = f"{node.value.tokenType.value}【{node.value.value}】, Line: {node.value.linenum}"
+            else:
+                value_str = "None"
             # 打印节点信息
-        print(f"{indent}{self.type}({value_str})")
-        for child in self.children:
-            if child is not None:
-                child.print_tree(level + 1)
-
+            print(f"{indent}{node.type}({value_str})")
 
     def extract_arguments(self):
-        # 初始化一个列表来存储所有终结符节点
-        argument_nodes = []
-
-        # 定义一个辅助函数来递归遍历所有子节点
-        def traverse(node):
-            if node is None:
-                return  # 如果节点为None，直接返回不做处理
-            # 如果节点是终结符，添加到列表中
-            if node.value is not None:
-                argument_nodes.append(node)
-            # 否则递归遍历该节点的所有子节点
-            else:
-                for child in node.children:
-                    traverse(child)  # 只有当child不为None时，才进行递归
-        # 从根节点开始遍历
-        traverse(self)
-        return argument_nodes
-
-
-def FetchToken():
-	global tokenNow
-	try:
-		tokenNow = next(tokenIter)
-		return tokenNow
-	except StopIteration:
-		sys.exit()
-
-def MatchToken(tokenType, show=False):
-	if show:
-		tokenNow.show()
-	if tokenNow.tokenType==tokenType:
-		return True
-	else:
-		return False
-
-def parse_program():
-    # program-> /* empty */ | statements END
-    while tokenNow.tokenType == TokenType.NEWLINE:
-        MatchToken(TokenType.NEWLINE)
-        FetchToken()
-    if tokenNow.tokenType==TokenType.END:
-        return Node("EMPTYprogram")
-    elif tokenNow.tokenType in {
-        TokenType.DEF, TokenType.IF, TokenType.FOR, TokenType.WHILE,
-        TokenType.RETURN, TokenType.IMPORT, TokenType.PASS, TokenType.BREAK, TokenType.CONTINUE, TokenType.GLOBAL,
-        TokenType.IDENTIFIER,
-        TokenType.TRUE, TokenType.FALSE, TokenType.NONE, TokenType.NUMBER, TokenType.STRING, TokenType.LPAREN, TokenType.LBRACKET
-    }:
-        statements_node = parse_statements()
-        if MatchToken(TokenType.END):
-            program_node = Node("program", children=[statements_node])
-            program_node.imported_names = program_node.collect_imports()
-            return program_node
+        # 按顺序取出所有终结符节点(带记号的结点)
+        return leaves(self)
+
+
+# 二元运算符表：记号类型 -> (优先级, 是否右结合)，数值越大结合越紧
+BINARY_OPERATORS = {
+    TokenType.OR: (1, False),
+    TokenType.AND: (2, False),
+    TokenType.EQ: (4, False), TokenType.NOTEQ: (4, False),
+    TokenType.LTEQ: (4, False), TokenType.LT: (4, False), TokenType.RT: (4, False), TokenType.RTEQ: (4, False),
+    TokenType.PLUS: (5, False), TokenType.MINUS: (5, False),
+    TokenType.TIMES: (6, False), TokenType.DIVIDE: (6, False),
+    TokenType.POWER: (8, True),
+}
+
+# 前缀运算符表：记号类型 -> 操作数的优先级
+PREFIX_OPERATORS = {
+    TokenType.NOT: 3,
+    TokenType.PLUS: 7, TokenType.MINUS: 7,
+}
+
+PRIMARY_TRAILERS = frozenset({TokenType.DOT, TokenType.LPAREN, TokenType.LBRACKET})
+
+# 表达式之后可以出现的记号
+EXPRESSION_FOLLOW = frozenset({
+    TokenType.NEWLINE, TokenType.END, TokenType.RBRACE, TokenType.IN,
+    TokenType.RBRACKET, TokenType.COMMA, TokenType.RPAREN, TokenType.COLON,
+}) | frozenset(BINARY_OPERATORS)
+
+
+def leaf(token):
+    # 记号结点，类型名是记号名
+    return Node(LEAF_KINDS[token.tokenType._name_], value=token)
+
+
+# 调用点：以标识符开头的语句(identifier_stmt)各对应一条 (对象名, 方法名, arguments结点, 行号, 是否含.属性)，
+# 按语句在源程序中的顺序排列。只有 对象.方法(参数) 形式的语句才有方法名和参数，此时语法树为
+#   identifier_opt-> expr_rest(DOT IDENTIFIER object_rest(LPAREN arguments RPAREN))
+# 其余语句的方法名和参数为None；没有参数时arguments结点也是None。
+# Parser在分析时登记，其他方法得到的语法树用collect_call_sites从树中找出。
+
+def call_site(token, rest, dotted):
+    # token是语句开头的标识符，rest是identifier_opt结点
+    method = arguments = None
+    if dotted and rest is not None:
+        expr_rest = rest.children[0]
+        if (expr_rest is not None and expr_rest.kind == Kind.expr_rest
+                and expr_rest.children[0].value.tokenType is TokenType.DOT and expr_rest.children[2] is not None):
+            method = expr_rest.children[1].value.value
+            arguments = expr_rest.children[2].children[1]
+    return token.value, method, arguments, token.linenum, dotted
+
+
+def collect_call_sites(tree):
+    """从语法树中找出全部调用点，结果与Parser分析时登记的相同。"""
+    dot = LEAF_KINDS["DOT"]
+    sites = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            continue
+        if node.kind == Kind.identifier_stmt:
+            rest = node.children[1]
+            dotted = rest is not None and any(child.kind == dot for child in preorder(rest))
+            sites.append(call_site(node.children[0].value, rest, dotted))
+        elif node.value is None:
+            stack.extend(reversed(node.children))
+    return sites
+
+
+class ParseError(Exception):
+    # recover=True时，ReportError用它回到最近的语句边界
+    def __init__(self, diagnostic):
+        super().__init__(str(diagnostic))
+        self.diagnostic = diagnostic
+
+
+class Parser:
+    # 递归下降的语法分析器。记号游标保存在对象中，不使用模块级全局变量，
+    # 所以多个Parser对象可以在不同线程中同时分析不同的程序
+
+    def __init__(self, string, recover=False, intern=None):
+        # 传入源程序字符串时，词法分析器以生成器方式工作，FetchToken每取一个记号才向后分析一个记号；
+        # 也可以直接传入已经得到的记号序列。
+        # recover=True时遇到错误不退出：错误记在self.errors中，跳到语句边界后继续分析(恐慌模式)，
+        # 出错的语句不放进语法树
+        # intern是InternTable时，分析完把语法树中与之前的程序相同的子树换成共享的结点
+        self.recover = recover
+        self.intern = intern
+        self.errors = []
+        self.imported_names = []  # 已经分析过的import语句导入的名字(IDENTIFIER结点)，按出现顺序
+        self.call_sites = []  # 以标识符开头的语句的调用点，见call_site
+        self.dots = 0  # 已经分析过的表达式中 .属性 的个数
+        if isinstance(string, str):
+            self.tokenIter = table_tokens(string, errors=self.errors) if recover else Lexer(string, stream=True)
         else:
-            print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.END received ", tokenNow.tokenType)
-            exit(0)
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.END received ", tokenNow.tokenType)
-        exit(0)
-
-def parse_statements():
-    # statements->statement statements_rest
-    statement_node = parse_statement()
-    statements_rest_node = parser_statements_rest()
-    return Node("statements", children=[statement_node, statements_rest_node])
-
-def parse_statement():
-    # statement-> compound_stmt| simple_stmt NEWLINE
-    if tokenNow.tokenType in {
-        TokenType.DEF, TokenType.IF, TokenType.FOR, TokenType.WHILE,
-        }:
-        compound_stmt_node = parser_compound_stmt()
-        return Node("statement", children=[compound_stmt_node])
-    else:
-        simple_stmt_node = parser_simple_stmt()
-        if MatchToken(TokenType.NEWLINE) or MatchToken(TokenType.END) or MatchToken(TokenType.RBRACE):
-            node = Node(str(TokenType.NEWLINE), children=[], value=Token(TokenType.NEWLINE, "\n", tokenNow.linenum))
-            if MatchToken(TokenType.NEWLINE):
-                FetchToken()
-            return Node("statement", children=[simple_stmt_node, node])
+            self.tokenIter = iter(string)
+        self.tokenNow = None
+
+    def parse(self):
+        self.FetchToken()
+        tree = self.parse_program()
+        if self.intern is not None:
+            tree = self.intern.intern(tree)
+        return tree
+
+    def FetchToken(self):
+        try:
+            self.tokenNow = next(self.tokenIter)
+            return self.tokenNow
+        except StopIteration:
+            sys.exit()
+
+    def MatchToken(self, tokenType, show=False):
+        if show:
+            self.tokenNow.show()
+        if self.tokenNow.tokenType==tokenType:
+            return True
         else:
-            print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.NEWLINE received ", tokenNow.tokenType)
-            exit(0)
+            return False
 
-def parser_statements_rest():
-    # statements_rest->  /* empty */| statements
-    if MatchToken(TokenType.NEWLINE) or MatchToken(TokenType.END) or MatchToken(TokenType.RBRACE):
-        pass
-    else:
-        statements_node = parse_statements()
-        return Node("statements_rest", children=[statements_node])
-
-def parser_compound_stmt():
-    # compound_stmt-> function_def| if_stmt| for_stmt| while_stmt
-    if tokenNow.tokenType==TokenType.DEF:
-        function_def_node = parser_function_def()
-        return Node("compound_stmt", children=[function_def_node])
-    elif tokenNow.tokenType==TokenType.IF:
-        if_stmt_node = parser_if_stmt()
-        return Node("compound_stmt", children=[if_stmt_node])
-    elif tokenNow.tokenType==TokenType.FOR:
-        for_stmt_node = parser_for_stmt()
-        return Node("compound_stmt", children=[for_stmt_node])
-    elif tokenNow.tokenType==TokenType.WHILE:
-        while_stmt_node = parser_while_stmt()
-        return Node("compound_stmt", children=[while_stmt_node])
-
-
-def parser_simple_stmt():
-    # simple_stmt-> identifier_stmt| atom_rest expr_rest
-    # |NOT inversion|PLUS factor| MINUS factor
-    # | return_stmt| import_stmt| PASS| BREAK| CONTINUE| global_stmt
-    if tokenNow.tokenType==TokenType.IDENTIFIER:
-        identifier_stmt_node = parser_identifier_stmt()
-        return Node("simple_stmt", children=[identifier_stmt_node])
-    elif MatchToken(TokenType.NOT):
-        node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        inversion_node = parser_inversion()
-        return Node("simple_stmt", children=[node, inversion_node])
-    elif MatchToken(TokenType.PLUS) or MatchToken(TokenType.MINUS):
-        node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        factor_node = parser_factor()
-        return Node("simple_stmt", children=[node, factor_node])
-    elif tokenNow.tokenType==TokenType.RETURN:
-        return_stmt_node = parser_return_stmt()
-        return Node("simple_stmt", children=[return_stmt_node])
-    elif tokenNow.tokenType==TokenType.IMPORT:
-        import_stmt_node = parser_import_stmt()
-        return Node("simple_stmt", children=[import_stmt_node])
-    # elif tokenNow.tokenType==TokenType.GLOBAL:
-    #     global_stmt_node = parser_global_stmt()
-    #     return Node("simple_stmt", children=[global_stmt_node])
-    elif tokenNow.tokenType in {
-        TokenType.PASS, TokenType.BREAK, TokenType.CONTINUE
-    }:
-        node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        return Node("simple_stmt", children=[node])
-    else:
-        atom_rest_node = parser_atom_rest()
-        expr_rest = parser_expr_rest()
-        return Node("simple_stmt", children=[atom_rest_node, expr_rest])
-
-def parser_identifier_stmt():
-    # identifier_stmt-> IDENTIFIER identifier_opt
-    MatchToken(TokenType.IDENTIFIER)
-    node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-    FetchToken()
-    identifier_opt_node = parser_identifier_opt()
-    return Node("identifier_stmt", children=[node, identifier_opt_node])
-
-def parser_identifier_opt():
-    # identifier_opt-> ASSIGN expression| AUGASSIGN expression| expr_rest
-    if MatchToken(TokenType.ASSIGN):
-        node = Node(str(tokenNow.tokenType), children=[], value=tokenNow)
-        FetchToken()
-        expression_node = parser_expression()
-        return Node("identifier_opt", children=[node, expression_node])
-    elif MatchToken(TokenType.AUGASSIGN):
-        node = Node(str(tokenNow.tokenType), children=[], value=tokenNow)
-        FetchToken()
-        expression_node = parser_expression()
-        return Node("identifier_opt", children=[node, expression_node])
-    elif tokenNow.tokenType in {
-        TokenType.NEWLINE, TokenType.END, TokenType.RBRACE,
-        TokenType.OR, TokenType.AND, TokenType.NOT,
-        TokenType.EQ, TokenType.NOTEQ, TokenType.LTEQ, TokenType.LT, TokenType.RT, TokenType.RTEQ,
-        TokenType.PLUS, TokenType.MINUS, TokenType.TIMES, TokenType.DIVIDE, TokenType.POWER,
-        TokenType.DOT, TokenType.LPAREN, TokenType.LBRACKET
-    }:
-        expr_rest_node = parser_expr_rest()
-        return Node("identifier_opt", children=[expr_rest_node])
-
-def parser_expr_rest():
-    # expr_rest-> /* 空 */
-    if tokenNow.tokenType in {
-        TokenType.NEWLINE, TokenType.END, TokenType.RBRACE,
-        TokenType.RBRACKET, TokenType.COMMA, TokenType.RPAREN, TokenType.COLON
-    }:
-        pass
-    # expr_rest->(OR|AND|NOT|EQ...)expression
-    elif tokenNow.tokenType in {
-        TokenType.OR, TokenType.AND, TokenType.NOT,
-        TokenType.EQ, TokenType.NOTEQ,
-        TokenType.LT, TokenType.LTEQ, TokenType.RT, TokenType.RTEQ,
-        TokenType.PLUS, TokenType.MINUS, TokenType.TIMES, TokenType.DIVIDE, TokenType.POWER,
-    }:
-        node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        exp_node = parser_expression()
-        return Node("expr_rest", children=[node, exp_node])
-    # DOT IDENTIFIER object_rest
-    elif MatchToken(TokenType.DOT):
-        dot_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        if MatchToken(TokenType.IDENTIFIER):
-            id_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-            FetchToken()
-            object_rest_node = parser_object_rest()
-            return Node("expr_rest", children=[dot_node, id_node, object_rest_node])
-        else:
-            print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.IDENTIFIER received ",
-                  tokenNow.tokenType)
+    def ReportError(self, expected=None):
+        # 语法错误：默认打印后退出；recover=True时记下错误，抛出ParseError回到parse_statements中同步
+        diagnostic = Diagnostic(self.tokenNow.linenum, expected, self.tokenNow.tokenType)
+        if not self.recover:
+            print(diagnostic)
             exit(0)
-    #  LPAREN arguments RPAREN
-    elif MatchToken(TokenType.LPAREN):
-        lparen_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        arguments_node = parser_arguments()
-        if MatchToken(TokenType.RPAREN):
-            rparen_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-            FetchToken()
-            return Node("expr_rest", children=[lparen_node, arguments_node, rparen_node])
+        self.errors.append(diagnostic)
+        raise ParseError(diagnostic)
+
+    def Synchronize(self):
+        # 恐慌模式：跳过出错语句剩下的记号。语句在同一层的NEWLINE之后结束(后面是代码块或elif/else时除外)，
+        # 遇到同一层的RBRACE或END时停在它前面，交给外层处理
+        depth = 0
+        while True:
+            tokentype = self.tokenNow.tokenType
+            if tokentype == TokenType.END:
+                return
+            if tokentype == TokenType.LBRACE:
+                depth += 1
+            elif tokentype == TokenType.RBRACE:
+                if depth == 0:
+                    return
+                depth -= 1
+            elif tokentype == TokenType.NEWLINE and depth == 0:
+                self.FetchToken()
+                if self.tokenNow.tokenType not in {TokenType.LBRACE, TokenType.ELIF, TokenType.ELSE}:
+                    return
+                continue
+            self.FetchToken()
+
+    def parse_program(self, start=True):
+        # program-> /* empty */ | statements END
+        # start=False时分析的是从程序中间的语句开始的一段(reparse的窗口)，不检查程序开头的记号
+        while self.tokenNow.tokenType == TokenType.NEWLINE:
+            self.MatchToken(TokenType.NEWLINE)
+            self.FetchToken()
+        if self.tokenNow.tokenType==TokenType.END:
+            return Node(Kind.EMPTYprogram)
         else:
-            print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.RPAREN received ",
-                  tokenNow.tokenType)
-            exit(0)
-    # LBRACKET slices RBRACKET
-    else:
-        lbracket_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        slices_node = parser_slices()
-        if MatchToken(TokenType.RBRACKET):
-            rbracket_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-            FetchToken()
-            return Node("expr_rest", children=[lbracket_node, slices_node, rbracket_node])
+            if start and self.tokenNow.tokenType not in {
+                TokenType.DEF, TokenType.IF, TokenType.FOR, TokenType.WHILE,
+                TokenType.RETURN, TokenType.IMPORT, TokenType.PASS, TokenType.BREAK, TokenType.CONTINUE, TokenType.GLOBAL,
+                TokenType.IDENTIFIER,
+                TokenType.TRUE, TokenType.FALSE, TokenType.NONE, TokenType.NUMBER, TokenType.STRING, TokenType.LPAREN, TokenType.LBRACKET
+            }:
+                if not self.recover:
+                    self.ReportError(TokenType.END)
+                if self.tokenNow.tokenType != TokenType.RBRACE:
+                    # 程序不能以这个记号开头(例如一元运算符)：记下错误，跳过这条语句，仍然分析后面的语句；
+                    # 这条语句中的其他错误不再重复报告，开头多余的RBRACE只由下面的循环记录一次
+                    self.errors.append(Diagnostic(self.tokenNow.linenum, TokenType.END, self.tokenNow.tokenType))
+                    self.Synchronize()
+            statements = self.parse_statements()
+            while self.recover and self.MatchToken(TokenType.RBRACE):
+                # 多余的RBRACE：记下错误，跳过它和后面的换行，继续分析后面的语句
+                self.errors.append(Diagnostic(self.tokenNow.linenum, TokenType.END, self.tokenNow.tokenType))
+                self.FetchToken()
+                while self.MatchToken(TokenType.NEWLINE):
+                    self.FetchToken()
+                if not self.MatchToken(TokenType.END):
+                    statements = Node(Kind.statements, children=statements.children + self.parse_statements().children)
+            if self.MatchToken(TokenType.END):
+                return Node(Kind.program, children=(statements,), imported_names=self.imported_names)
+            else:
+                self.ReportError(TokenType.END)
+
+    def parse_statements(self, block=False):
+        # statements-> statement {statement}
+        # 用循环依次分析各条语句，得到扁平的语句列表，语句再多也不会加深调用栈；
+        # block表示分析的是代码块中的语句，只有代码块才检查是否为空
+        statements = []
+        errors = len(self.errors)
+        while True:
+            if self.recover:
+                if self.MatchToken(TokenType.RBRACE) or self.MatchToken(TokenType.END):
+                    if block and not statements and len(self.errors) == errors:
+                        # 空的代码块
+                        self.errors.append(Diagnostic(self.tokenNow.linenum, None, self.tokenNow.tokenType))
+                    return Node(Kind.statements, children=statements)  # 前面的语句出错后同步到了这里
+                imported = len(self.imported_names)
+                sites = len(self.call_sites)
+                try:
+                    statements.append(self.parse_statement())
+                except ParseError:
+                    del self.imported_names[imported:]  # 出错的语句不在语法树中，它登记的导入名和调用点也去掉
+                    del self.call_sites[sites:]
+                    self.Synchronize()
+                if self.MatchToken(TokenType.NEWLINE):
+                    # 语句之间的空行：记下错误后跳过
+                    self.errors.append(Diagnostic(self.tokenNow.linenum, None, self.tokenNow.tokenType))
+                    while self.MatchToken(TokenType.NEWLINE):
+                        self.FetchToken()
+            else:
+                statements.append(self.parse_statement())
+            if self.MatchToken(TokenType.NEWLINE) or self.MatchToken(TokenType.END) or self.MatchToken(TokenType.RBRACE):
+                return Node(Kind.statements, children=statements)
+
+    def parse_statement(self):
+        # statement-> compound_stmt| simple_stmt NEWLINE
+        if self.tokenNow.tokenType in {
+            TokenType.DEF, TokenType.IF, TokenType.FOR, TokenType.WHILE,
+            }:
+            compound_stmt_node = self.parser_compound_stmt()
+            return Node(Kind.statement, children=(compound_stmt_node,))
         else:
-            print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.RBRACKET received ",
-                  tokenNow.tokenType)
-            exit(0)
-
-def parser_object_rest():
-    # object_rest-> /* 空 */| LPAREN arguments RPAREN
-    if tokenNow.tokenType in {
-        TokenType.NEWLINE, TokenType.END, TokenType.RBRACE,
-    }:
-        pass
-    elif MatchToken(TokenType.LPAREN):
-        lparen_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        arguments_node = parser_arguments()
-        if MatchToken(TokenType.RPAREN):
-            rparen_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-            FetchToken()
-            return Node("object_rest", children=[lparen_node, arguments_node, rparen_node])
+            simple_stmt_node = self.parser_simple_stmt()
+            if self.MatchToken(TokenType.NEWLINE) or self.MatchToken(TokenType.END) or self.MatchToken(TokenType.RBRACE):
+                node = Node(QUALIFIED_KINDS["NEWLINE"], value=self.tokenNow.same_line(TokenType.NEWLINE, "\n"))
+                if self.MatchToken(TokenType.NEWLINE):
+                    self.FetchToken()
+                return Node(Kind.statement, children=(simple_stmt_node, node))
+            else:
+                self.ReportError(TokenType.NEWLINE)
+
+    def parser_compound_stmt(self):
+        # compound_stmt-> function_def| if_stmt| for_stmt| while_stmt
+        if self.tokenNow.tokenType==TokenType.DEF:
+            function_def_node = self.parser_function_def()
+            return Node(Kind.compound_stmt, children=(function_def_node,))
+        elif self.tokenNow.tokenType==TokenType.IF:
+            if_stmt_node = self.parser_if_stmt()
+            return Node(Kind.compound_stmt, children=(if_stmt_node,))
+        elif self.tokenNow.tokenType==TokenType.FOR:
+            for_stmt_node = self.parser_for_stmt()
+            return Node(Kind.compound_stmt, children=(for_stmt_node,))
+        elif self.tokenNow.tokenType==TokenType.WHILE:
+            while_stmt_node = self.parser_while_stmt()
+            return Node(Kind.compound_stmt, children=(while_stmt_node,))
+
+
+    def parser_simple_stmt(self):
+        # simple_stmt-> identifier_stmt| atom_rest expr_rest
+        # |NOT inversion|PLUS factor| MINUS factor
+        # | return_stmt| import_stmt| PASS| BREAK| CONTINUE| global_stmt
+        if self.tokenNow.tokenType==TokenType.IDENTIFIER:
+            identifier_stmt_node = self.parser_identifier_stmt()
+            return Node(Kind.simple_stmt, children=(identifier_stmt_node,))
+        elif self.MatchToken(TokenType.NOT):
+            node = leaf(self.tokenNow)
+            self.FetchToken()
+            inversion_node = self.parser_expression(PREFIX_OPERATORS[TokenType.NOT])
+            return Node(Kind.simple_stmt, children=(node, inversion_node))
+        elif self.MatchToken(TokenType.PLUS) or self.MatchToken(TokenType.MINUS):
+            node = leaf(self.tokenNow)
+            self.FetchToken()
+            factor_node = self.parser_expression(PREFIX_OPERATORS[TokenType.PLUS])
+            return Node(Kind.simple_stmt, children=(node, factor_node))
+        elif self.tokenNow.tokenType==TokenType.RETURN:
+            return_stmt_node = self.parser_return_stmt()
+            return Node(Kind.simple_stmt, children=(return_stmt_node,))
+        elif self.tokenNow.tokenType==TokenType.IMPORT:
+            import_stmt_node = self.parser_import_stmt()
+            return Node(Kind.simple_stmt, children=(import_stmt_node,))
+        # elif self.tokenNow.tokenType==TokenType.GLOBAL:
+        #     global_stmt_node = parser_global_stmt()
+        #     return Node(Kind.simple_stmt, children=(global_stmt_node,))
+        elif self.tokenNow.tokenType in {
+            TokenType.PASS, TokenType.BREAK, TokenType.CONTINUE
+        }:
+            node = leaf(self.tokenNow)
+            self.FetchToken()
+            return Node(Kind.simple_stmt, children=(node,))
         else:
-            print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.RPAREN received ",
-                  tokenNow.tokenType)
-            exit(0)
+            atom_rest_node = self.parser_atom_rest()
+            expr_rest = self.parser_expr_rest()
+            return Node(Kind.simple_stmt, children=(atom_rest_node, expr_rest))
+
+    def parser_identifier_stmt(self):
+        # identifier_stmt-> IDENTIFIER identifier_opt
+        self.MatchToken(TokenType.IDENTIFIER)
+        token = self.tokenNow
+        node = leaf(token)
+        self.FetchToken()
+        dots = self.dots
+        identifier_opt_node = self.parser_identifier_opt()
+        self.call_sites.append(call_site(token, identifier_opt_node, self.dots != dots))
+        return Node(Kind.identifier_stmt, children=(node, identifier_opt_node))
+
+    def parser_identifier_opt(self):
+        # identifier_opt-> ASSIGN expression| AUGASSIGN expression| expr_rest
+        if self.MatchToken(TokenType.ASSIGN):
+            node = Node(QUALIFIED_KINDS[self.tokenNow.tokenType._name_], value=self.tokenNow)
+            self.FetchToken()
+            expression_node = self.parser_expression()
+            return Node(Kind.identifier_opt, children=(node, expression_node))
+        elif self.MatchToken(TokenType.AUGASSIGN):
+            node = Node(QUALIFIED_KINDS[self.tokenNow.tokenType._name_], value=self.tokenNow)
+            self.FetchToken()
+            expression_node = self.parser_expression()
+            return Node(Kind.identifier_opt, children=(node, expression_node))
+        elif self.tokenNow.tokenType in {
+            TokenType.NEWLINE, TokenType.END, TokenType.RBRACE,
+            TokenType.OR, TokenType.AND, TokenType.NOT,
+            TokenType.EQ, TokenType.NOTEQ, TokenType.LTEQ, TokenType.LT, TokenType.RT, TokenType.RTEQ,
+            TokenType.PLUS, TokenType.MINUS, TokenType.TIMES, TokenType.DIVIDE, TokenType.POWER,
+            TokenType.DOT, TokenType.LPAREN, TokenType.LBRACKET
+        }:
+            expr_rest_node = self.parser_expr_rest()
+            return Node(Kind.identifier_opt, children=(expr_rest_node,))
+
+    def parser_expr_rest(self):
+        # expr_rest-> /* 空 */
+        if self.tokenNow.tokenType in {
+            TokenType.NEWLINE, TokenType.END, TokenType.RBRACE,
+            TokenType.RBRACKET, TokenType.COMMA, TokenType.RPAREN, TokenType.COLON
+        }:
+            pass
+        # expr_rest->(OR|AND|NOT|EQ...)expression
+        elif self.tokenNow.tokenType in {
+            TokenType.OR, TokenType.AND, TokenType.NOT,
+            TokenType.EQ, TokenType.NOTEQ,
+            TokenType.LT, TokenType.LTEQ, TokenType.RT, TokenType.RTEQ,
+            TokenType.PLUS, TokenType.MINUS, TokenType.TIMES, TokenType.DIVIDE, TokenType.POWER,
+        }:
+            node = leaf(self.tokenNow)
+            self.FetchToken()
+            exp_node = self.parser_expression()
+            return Node(Kind.expr_rest, children=(node, exp_node))
+        # DOT IDENTIFIER object_rest
+        elif self.MatchToken(TokenType.DOT):
+            self.dots += 1
+            dot_node = leaf(self.tokenNow)
+            self.FetchToken()
+            if self.MatchToken(TokenType.IDENTIFIER):
+                id_node = leaf(self.tokenNow)
+                self.FetchToken()
+                object_rest_node = self.parser_object_rest()
+                return Node(Kind.expr_rest, children=(dot_node, id_node, object_rest_node))
+            else:
+                self.ReportError(TokenType.IDENTIFIER)
+        #  LPAREN arguments RPAREN
+        elif self.MatchToken(TokenType.LPAREN):
+            lparen_node = leaf(self.tokenNow)
+            self.FetchToken()
+            arguments_node = self.parser_arguments()
+            if self.MatchToken(TokenType.RPAREN):
+                rparen_node = leaf(self.tokenNow)
+                self.FetchToken()
+                return Node(Kind.expr_rest, children=(lparen_node, arguments_node, rparen_node))
+            else:
+                self.ReportError(TokenType.RPAREN)
+        # LBRACKET slices RBRACKET
+        elif self.MatchToken(TokenType.LBRACKET):
+            lbracket_node = leaf(self.tokenNow)
+            self.FetchToken()
+            slices_node = self.parser_slices()
+            if self.MatchToken(TokenType.RBRACKET):
+                rbracket_node = leaf(self.tokenNow)
+                self.FetchToken()
+                return Node(Kind.expr_rest, children=(lbracket_node, slices_node, rbracket_node))
+            else:
+                self.ReportError(TokenType.RBRACKET)
+        else:
+            self.ReportError()
 
-def parser_block():
-    # block-> NEWLINE LBRACE statements RBRACE
-    if MatchToken(TokenType.NEWLINE):
-        node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        if MatchToken(TokenType.LBRACE):
-            lbrace_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-            FetchToken()
-            statements_node = parse_statements()
-            if(MatchToken(TokenType.RBRACE)):
-                rbrace_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-                FetchToken()
-                if MatchToken(TokenType.NEWLINE):
-                    newline_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-                    FetchToken()
-                    return Node("block", children=[lbrace_node, statements_node, rbrace_node, newline_node])
+    def parser_object_rest(self):
+        # object_rest-> /* 空 */| LPAREN arguments RPAREN
+        if self.tokenNow.tokenType in {
+            TokenType.NEWLINE, TokenType.END, TokenType.RBRACE,
+        }:
+            pass
+        elif self.MatchToken(TokenType.LPAREN):
+            lparen_node = leaf(self.tokenNow)
+            self.FetchToken()
+            arguments_node = self.parser_arguments()
+            if self.MatchToken(TokenType.RPAREN):
+                rparen_node = leaf(self.tokenNow)
+                self.FetchToken()
+                return Node(Kind.object_rest, children=(lparen_node, arguments_node, rparen_node))
+            else:
+                self.ReportError(TokenType.RPAREN)
+
+    def parser_function_body(self):
+        # 函数定义的代码块；LazyParser中先跳过，第一次用到时才分析
+        return self.parser_block()
+
+    def parser_block(self):
+        # block-> NEWLINE LBRACE statements RBRACE
+        if self.MatchToken(TokenType.NEWLINE):
+            node = leaf(self.tokenNow)
+            self.FetchToken()
+            if self.MatchToken(TokenType.LBRACE):
+                lbrace_node = leaf(self.tokenNow)
+                self.FetchToken()
+                statements_node = self.parse_statements(block=True)
+                if(self.MatchToken(TokenType.RBRACE)):
+                    rbrace_node = leaf(self.tokenNow)
+                    self.FetchToken()
+                    if self.MatchToken(TokenType.NEWLINE):
+                        newline_node = leaf(self.tokenNow)
+                        self.FetchToken()
+                        return Node(Kind.block, children=(lbrace_node, statements_node, rbrace_node, newline_node))
+                    else:
+                        self.ReportError(TokenType.NEWLINE)
                 else:
-                    print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.NEWLINE received ",
-                          tokenNow.tokenType)
-                    exit(0)
+                    self.ReportError(TokenType.RBRACE)
             else:
-                print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.RBRACE received ",
-                      tokenNow.tokenType)
-                exit(0)
+                self.ReportError(TokenType.LBRACE)
+
+
+    def parser_expression(self, min_prec=0):
+        # 优先级爬升：expression-> unary {binop unary}
+        # 同一优先级的运算符在一个循环中处理，右操作数只分析优先级更高的部分；
+        # 同一优先级的左结合运算符链(a+b-c...)合并在一个binop结点中，
+        # 递归深度和树的深度都只与优先级层数有关，与运算符个数无关
+        left = self.parser_unary(min_prec)
+        chain = None  # 正在合并的运算符链[操作数, 运算符, 操作数, ...]，结束时才建binop结点
+        chain_prec = None
+        while True:
+            operator = BINARY_OPERATORS.get(self.tokenNow.tokenType)
+            if operator is None or operator[0] < min_prec:
+                break
+            prec, right_assoc = operator
+            op_node = leaf(self.tokenNow)
+            self.FetchToken()
+            right = self.parser_expression(prec if right_assoc else prec + 1)
+            if prec == chain_prec:
+                chain += (op_node, right)
+            else:
+                if chain:
+                    left = Node(Kind.binop, children=chain)
+                chain = [left, op_node, right]
+                chain_prec = None if right_assoc else prec
+        if chain:
+            left = Node(Kind.binop, children=chain)
+        if self.tokenNow.tokenType not in EXPRESSION_FOLLOW:
+            self.ReportError()
+        return left
+
+    def parser_unary(self, min_prec=0):
+        # unary-> (NOT|PLUS|MINUS) expression| primary
+        prec = PREFIX_OPERATORS.get(self.tokenNow.tokenType)
+        if prec is None:
+            return self.parser_primary()
+        if self.tokenNow.tokenType == TokenType.NOT and prec < min_prec:
+            self.ReportError()
+        op_node = leaf(self.tokenNow)
+        self.FetchToken()
+        operand = self.parser_expression(prec)
+        return Node(Kind.unary, children=(op_node, operand))
+
+    def parser_primary(self):
+        # primary-> atom {DOT IDENTIFIER| LPAREN arguments RPAREN| LBRACKET slices RBRACKET}
+        # 没有后缀时直接返回atom，有后缀时所有后缀依次挂在同一个primary结点下
+        atom_node = self.parser_atom()
+        if self.tokenNow.tokenType not in PRIMARY_TRAILERS:
+            return atom_node
+        trailers = [atom_node]
+        while self.tokenNow.tokenType in PRIMARY_TRAILERS:
+            if self.MatchToken(TokenType.DOT):
+                self.dots += 1
+                trailers.append(leaf(self.tokenNow))
+                self.FetchToken()
+                if self.MatchToken(TokenType.IDENTIFIER):
+                    trailers.append(leaf(self.tokenNow))
+                    self.FetchToken()
+                else:
+                    self.ReportError(TokenType.IDENTIFIER)
+            else:
+                close = TokenType.RPAREN if self.MatchToken(TokenType.LPAREN) else TokenType.RBRACKET
+                trailers.append(leaf(self.tokenNow))
+                self.FetchToken()
+                if close == TokenType.RPAREN:
+                    trailers.append(self.parser_arguments())
+                else:
+                    trailers.append(self.parser_slices())
+                if self.MatchToken(close):
+                    trailers.append(leaf(self.tokenNow))
+                    self.FetchToken()
+                else:
+                    self.ReportError(close)
+        return Node(Kind.primary, children=trailers)
+
+    def parser_slices(self):
+        # slices-> expression slices_rest
+        expression_node = self.parser_expression()
+        slices_rest_node = self.parser_slices_rest()
+        return Node(Kind.slices, children=(expression_node, slices_rest_node))
+
+    def parser_slices_rest(self):
+        # slices_rest-> COMMA slices| /* 空 */
+        if self.MatchToken(TokenType.COMMA):
+            comma_node = leaf(self.tokenNow)
+            self.FetchToken()
+            slices_node = self.parser_slices()
+            return Node(Kind.slices_rest, children=(comma_node, slices_node))
+        elif self.tokenNow.tokenType in {
+            TokenType.NEWLINE, TokenType.END, TokenType.RBRACKET
+        }:
+            pass
         else:
-            print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.LBRACE received ",
-                  tokenNow.tokenType)
-            exit(0)
-
-
-def parser_expression():
-    # expression-> disjunction
-    disjunction_node = parser_disjunction()
-    return Node("expression", children=[disjunction_node])
-
-def parser_disjunction():
-    # disjunction-> conjunction disjunction_rest
-    conjunction_node = parser_conjunction()
-    disjunction_rest_node = parser_disjunction_rest()
-    return Node("disjunction", children=[conjunction_node, disjunction_rest_node])
-
-def parser_disjunction_rest():
-    # disjunction_rest-> OR conjunction| /* 空 */
-    if MatchToken(TokenType.OR):
-        or_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        conjunction_node = parser_conjunction()
-        return Node("disjunction_rest", children=[or_node, conjunction_node])
-    elif tokenNow.tokenType in {
-        TokenType.NEWLINE, TokenType.END, TokenType.RBRACE,TokenType.IN,
-        TokenType.RBRACKET, TokenType.COMMA, TokenType.RPAREN, TokenType.COLON
-    }:
-        pass
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：received ",
-              tokenNow.tokenType)
-        exit(0)
-
-def parser_conjunction():
-    # conjunction-> inversion conjunction_rest
-    inversion_node = parser_inversion()
-    conjunction_rest_node = parser_conjunction_rest()
-    return Node("conjunction", children=[inversion_node, conjunction_rest_node])
-
-def parser_conjunction_rest():
-    # conjunction_rest->  AND inversion|  /* 空 */
-    if MatchToken(TokenType.AND):
-        and_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        inversion_node = parser_inversion()
-        return Node("conjunction_rest", children=[and_node, inversion_node])
-    elif tokenNow.tokenType in {
-        TokenType.NEWLINE, TokenType.END, TokenType.RBRACE,TokenType.IN,
-        TokenType.OR,
-        TokenType.RBRACKET, TokenType.COMMA, TokenType.RPAREN, TokenType.COLON
-    }:
-        pass
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：received ",
-              tokenNow.tokenType)
-        exit(0)
-
-def parser_inversion():
-    # inversion-> NOT inversion| comparison
-    if MatchToken(TokenType.NOT):
-        not_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        inversion_node = parser_inversion()
-        return Node("inversion", children=[not_node, inversion_node])
-    else:
-        comparison_node = parser_comparison()
-        return Node("inversion", children=[comparison_node])
-
-def parser_comparison():
-    # comparison-> sum comparison_rest
-    sum_node = parser_sum()
-    comparison_rest_node = parser_comparison_rest()
-    return Node("comparison", children=[sum_node, comparison_rest_node])
-
-def parser_comparison_rest():
-    # comparison_rest-> /* 空 */|EQ sum| NOTEQ sum| LTEQ sum| LT sum| RT sum| RTEQ sum
-    if tokenNow.tokenType in {
-        TokenType.EQ, TokenType.NOTEQ,
-        TokenType.LTEQ, TokenType.LT, TokenType.RT, TokenType.RTEQ
-    }:
-        node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        sum_node = parser_sum()
-        return Node("comparison_rest", children=[node, sum_node])
-    elif tokenNow.tokenType in {
-        TokenType.NEWLINE, TokenType.END, TokenType.RBRACE,TokenType.IN,
-        TokenType.OR, TokenType.NOT, TokenType.AND,
-        TokenType.RBRACKET, TokenType.COMMA, TokenType.RPAREN, TokenType.COLON
-    }:
-        pass
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：received ",
-              tokenNow.tokenType)
-        exit(0)
-
-def parser_sum():
-    # sum-> term sum_prime
-    term_node = parser_term()
-    sum_prime_node = parser_sum_prime()
-    return Node("sum", children=[term_node, sum_prime_node])
-
-def parser_sum_prime():
-    # sum_prime-> sum_rest sum_prime| /* 空 */
-    if tokenNow.tokenType==TokenType.PLUS or tokenNow.tokenType==TokenType.MINUS:
-        sum_rest_node = parser_sum_rest()
-        sum_prime_node = parser_sum_prime()
-        return Node("sum_prime", children=[sum_rest_node, sum_prime_node])
-    elif tokenNow.tokenType in {
-        TokenType.NEWLINE, TokenType.END, TokenType.RBRACE,TokenType.IN,
-        TokenType.OR, TokenType.AND, TokenType.NOT,
-        TokenType.EQ, TokenType.NOTEQ, TokenType.LTEQ, TokenType.LT, TokenType.RT, TokenType.RTEQ,
-        TokenType.RBRACKET, TokenType.COMMA, TokenType.RPAREN, TokenType.COLON
-    }:
-        pass
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：received ",
-              tokenNow.tokenType)
-        exit(0)
-
-def parser_sum_rest():
-    # sum_rest-> PLUS term| MINUS term
-    if MatchToken(TokenType.PLUS) or MatchToken(TokenType.MINUS):
-        node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        term_node = parser_term()
-        return Node("sum_rest", children=[node, term_node])
-
-def parser_term():
-    # term-> factor term_prime
-    factor_node = parser_factor()
-    term_prime_node = parser_term_prime()
-    return Node("term", children=[factor_node, term_prime_node])
-
-def parser_term_prime():
-    # term_prime-> term_rest term_prime| /* 空 */
-    if tokenNow.tokenType==TokenType.TIMES or tokenNow.tokenType==TokenType.DIVIDE:
-        term_rest_node = parser_term_rest()
-        term_prime_node = parser_term_prime()
-        return Node("term_prime", children=[term_rest_node, term_prime_node])
-    elif tokenNow.tokenType in {
-        TokenType.NEWLINE, TokenType.END, TokenType.RBRACE,TokenType.IN,
-        TokenType.PLUS, TokenType.MINUS,
-        TokenType.OR, TokenType.AND, TokenType.NOT,
-        TokenType.EQ, TokenType.NOTEQ, TokenType.LTEQ, TokenType.LT, TokenType.RT, TokenType.RTEQ,
-        TokenType.RBRACKET, TokenType.COMMA, TokenType.RPAREN, TokenType.COLON
-    }:
-        pass
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：received ",
-              tokenNow.tokenType)
-        exit(0)
-
-
-def parser_term_rest():
-    # term_rest: TIMES factor| DIVIDE factor
-    if MatchToken(TokenType.TIMES) or MatchToken(TokenType.DIVIDE):
-        node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        factor_node = parser_factor()
-        return Node("term_rest", children=[node, factor_node])
-
-def parser_factor():
-    # factor-> PLUS factor| MINUS factor| power
-    if MatchToken(TokenType.PLUS) or MatchToken(TokenType.MINUS):
-        node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        factor_node = parser_factor()
-        return Node("factor", children=[node, factor_node])
-    else:
-        power_node = parser_power()
-        return Node("factor", children=[power_node])
-
-def parser_power():
-    # power-> primary power_rest
-    primary_node = parser_primary()
-    power_rest_node = parser_power_rest()
-    return Node("power", children=[primary_node, power_rest_node])
-
-def parser_power_rest():
-    # power_rest-> POWER factor| /* 空 */
-    if MatchToken(TokenType.POWER):
-        node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        factor_node = parser_factor()
-        return Node("power_rest", children=[node, factor_node])
-    elif tokenNow.tokenType in {
-        TokenType.NEWLINE, TokenType.END, TokenType.RBRACE,TokenType.IN,
-        TokenType.PLUS, TokenType.MINUS, TokenType.TIMES, TokenType.DIVIDE,
-        TokenType.OR, TokenType.AND, TokenType.NOT,
-        TokenType.EQ, TokenType.NOTEQ, TokenType.LTEQ, TokenType.LT, TokenType.RT, TokenType.RTEQ,
-        TokenType.RBRACKET, TokenType.COMMA, TokenType.RPAREN, TokenType.COLON
-    }:
-        pass
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：received ",
-              tokenNow.tokenType)
-        exit(0)
-
-def parser_primary():
-    # primary-> atom primary_rest
-    atom_node = parser_atom()
-    primary_rest_node = parser_primary_rest()
-    return Node("primary", children=[atom_node, primary_rest_node])
-
-def parser_primary_rest():
-    # primary_rest->primary_operation primary_rest| /* 空 */
-    if tokenNow.tokenType in {
-        TokenType.DOT, TokenType.LPAREN, TokenType.LBRACKET
-    }:
-        primary_operation_node = parser_primary_operation()
-        primary_rest_node = parser_primary_rest()
-        return Node("primary_rest", children=[primary_operation_node, primary_rest_node])
-    elif tokenNow.tokenType in {
-        TokenType.NEWLINE, TokenType.END, TokenType.RBRACE,TokenType.IN,
-        TokenType.PLUS, TokenType.MINUS, TokenType.TIMES, TokenType.DIVIDE, TokenType.POWER,
-        TokenType.OR, TokenType.AND, TokenType.NOT,
-        TokenType.EQ, TokenType.NOTEQ, TokenType.LTEQ, TokenType.LT, TokenType.RT, TokenType.RTEQ,
-        TokenType.RBRACKET, TokenType.COMMA, TokenType.RPAREN, TokenType.COLON
-    }:
-        pass
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：received ",
-              tokenNow.tokenType)
-        exit(0)
-
-
-def parser_primary_operation():
-    # primary_operation-> DOT IDENTIFIER| LPAREN primary_lparen_rest| LBRACKET slices RBRACKET
-    if MatchToken(TokenType.DOT):
-        dot_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        if MatchToken(TokenType.IDENTIFIER):
-            id_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-            FetchToken()
-            return Node("primary_operation", children=[dot_node, id_node])
+            self.ReportError()
+
+    def parser_atom(self):
+        # atom-> IDENTIFIER| TRUE| FALSE| NONE| NUMBER| STRING| tuple| list
+        # 终结符直接作为叶子结点返回，不再包一层atom结点
+        if self.tokenNow.tokenType in{
+            TokenType.IDENTIFIER, TokenType.TRUE, TokenType.FALSE,
+            TokenType.NONE, TokenType.NUMBER, TokenType.STRING,
+        }:
+            node = leaf(self.tokenNow)
+            self.FetchToken()
+            return node
+        elif self.tokenNow.tokenType==TokenType.LPAREN:
+            return self.parser_tuple()
+        elif self.tokenNow.tokenType==TokenType.LBRACKET:
+            return self.parser_list()
         else:
-            print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.IDENTIFIER received ",
-                  tokenNow.tokenType)
-            exit(0)
-    elif MatchToken(TokenType.LPAREN):
-        lparen_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        primary_lparen_rest_node = parser_primary_lparen_rest()
-        return Node("primary_operation", children=[lparen_node, primary_lparen_rest_node])
-    elif MatchToken(TokenType.LBRACKET):
-        lbracket_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        slices_node = parser_slices()
-        if MatchToken(TokenType.RBRACKET):
-            rbracket_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-            FetchToken()
-            return Node("primary_operation", children=[lbracket_node, slices_node, rbracket_node])
+            self.ReportError()
+
+    def parser_tuple(self):
+        # tuple-> LPAREN tuple_rest
+        if self.MatchToken(TokenType.LPAREN):
+            lparen_node = leaf(self.tokenNow)
+            self.FetchToken()
+            tuple_rest_node = self.parser_tuple_rest()
+            return Node(Kind.tuple, children=(lparen_node, tuple_rest_node))
         else:
-            print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.RBRACKET received ",
-                  tokenNow.tokenType)
-            exit(0)
-
-def parser_primary_lparen_rest():
-    # primary_lparen_rest-> arguments RPAREN
-    arguments_node = parser_arguments()
-    if MatchToken(TokenType.RPAREN):
-        rparen_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        return Node("primary_lparen_rest", children=[arguments_node, rparen_node])
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.RPAREN received ",
-              tokenNow.tokenType)
-        exit(0)
-
-def parser_slices():
-    # slices-> expression slices_rest
-    expression_node = parser_expression()
-    slices_rest_node = parser_slices_rest()
-    return Node("slices", children=[expression_node, slices_rest_node])
-
-def parser_slices_rest():
-    # slices_rest-> COMMA slices| /* 空 */
-    if MatchToken(TokenType.COMMA):
-        comma_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        slices_node = parser_slices()
-        return Node("slices_rest", children=[comma_node, slices_node])
-    elif tokenNow.tokenType in {
-        TokenType.NEWLINE, TokenType.END, TokenType.RBRACKET
-    }:
-        pass
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：received ",
-              tokenNow.tokenType)
-        exit(0)
-
-def parser_atom():
-    # atom-> IDENTIFIER| TRUE| FALSE| NONE| NUMBER| STRING| tuple| list
-    if tokenNow.tokenType in{
-        TokenType.IDENTIFIER, TokenType.TRUE, TokenType.FALSE,
-        TokenType.NONE, TokenType.NUMBER, TokenType.STRING,
-    }:
-        node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        return Node("atom", children=[node])
-    elif tokenNow.tokenType==TokenType.LPAREN:
-        tuple_node = parser_tuple()
-        return Node("atom", children=[tuple_node])
-    elif tokenNow.tokenType==TokenType.LBRACKET:
-        list_node = parser_list()
-        return Node("atom", children=[list_node])
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：received ",
-              tokenNow.tokenType)
-        exit(0)
-
-def parser_tuple():
-    # tuple-> LPAREN tuple_rest
-    if MatchToken(TokenType.LPAREN):
-        lparen_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        tuple_rest_node = parser_tuple_rest()
-        return Node("tuple", children=[lparen_node, tuple_rest_node])
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.LPAREN received ",
-              tokenNow.tokenType)
-        exit(0)
+            self.ReportError(TokenType.LPAREN)
 
 
-def parser_tuple_rest():
-    # tuple_rest-> RPAREN|  expressions RPAREN
-    if MatchToken(TokenType.RPAREN):
-        rparen_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        return Node("tuple_rest", children=[rparen_node])
-    else:
-        expressions_node = parser_expressions()
-        if MatchToken(TokenType.RPAREN):
-            rparen_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-            FetchToken()
-            return Node("tuple_rest", children=[expressions_node, rparen_node])
+    def parser_tuple_rest(self):
+        # tuple_rest-> RPAREN|  expressions RPAREN
+        if self.MatchToken(TokenType.RPAREN):
+            rparen_node = leaf(self.tokenNow)
+            self.FetchToken()
+            return Node(Kind.tuple_rest, children=(rparen_node,))
         else:
-            print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.RPAREN received ",
-                  tokenNow.tokenType)
-            exit(0)
+            expressions_node = self.parser_expressions()
+            if self.MatchToken(TokenType.RPAREN):
+                rparen_node = leaf(self.tokenNow)
+                self.FetchToken()
+                return Node(Kind.tuple_rest, children=(expressions_node, rparen_node))
+            else:
+                self.ReportError(TokenType.RPAREN)
 
 
-def parser_list():
-    # list: LBRACKET list_rest
-    if MatchToken(TokenType.LBRACKET):
-        lbracket_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        list_rest_node = parser_list_rest()
-        return Node("list", children=[lbracket_node, list_rest_node])
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.LBRACKET received ",
-              tokenNow.tokenType)
-        exit(0)
+    def parser_list(self):
+        # list: LBRACKET list_rest
+        if self.MatchToken(TokenType.LBRACKET):
+            lbracket_node = leaf(self.tokenNow)
+            self.FetchToken()
+            list_rest_node = self.parser_list_rest()
+            return Node(Kind.list, children=(lbracket_node, list_rest_node))
+        else:
+            self.ReportError(TokenType.LBRACKET)
 
 
 
-def parser_list_rest():
-    # list_rest: RBRACKET| expressions RBRACKET
-    if MatchToken(TokenType.RBRACE):
-        rbracket_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        return Node("list_rest", children=[rbracket_node])
-    else:
-        expressions_node = parser_expressions()
-        if MatchToken(TokenType.RBRACKET):
-            rbracket_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-            FetchToken()
-            return Node("list_rest", children=[expressions_node, rbracket_node])
+    def parser_list_rest(self):
+        # list_rest: RBRACKET| expressions RBRACKET
+        if self.MatchToken(TokenType.RBRACKET):
+            rbracket_node = leaf(self.tokenNow)
+            self.FetchToken()
+            return Node(Kind.list_rest, children=(rbracket_node,))
         else:
-            print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.RBRACKET received ",
-                  tokenNow.tokenType)
-            exit(0)
+            expressions_node = self.parser_expressions()
+            if self.MatchToken(TokenType.RBRACKET):
+                rbracket_node = leaf(self.tokenNow)
+                self.FetchToken()
+                return Node(Kind.list_rest, children=(expressions_node, rbracket_node))
+            else:
+                self.ReportError(TokenType.RBRACKET)
+
+    def parser_expressions(self):
+        # expressions-> expression expressions_rest
+        expression_node = self.parser_expression()
+        expressions_rest_node = self.parser_expressions_rest()
+        return Node(Kind.expressions, children=(expression_node, expressions_rest_node))
+
+    def parser_expressions_rest(self):
+        # expressions_rest-> COMMA expression expressions_rest| /* 空 */
+        if self.MatchToken(TokenType.COMMA):
+            comma_node = leaf(self.tokenNow)
+            self.FetchToken()
+            expression_node = self.parser_expression()
+            expressions_rest_node = self.parser_expressions_rest()
+            return Node(Kind.expressions_rest, children=(comma_node, expression_node, expressions_rest_node))
+        elif self.tokenNow.tokenType in {
+            TokenType.RPAREN, TokenType.RBRACKET,
+        }:
+            pass
+        else:
+            self.ReportError(TokenType.RBRACKET)
 
-def parser_expressions():
-    # expressions-> expression expressions_rest
-    expression_node = parser_expression()
-    expressions_rest_node = parser_expressions_rest()
-    return Node("expressions", children=[expression_node, expressions_rest_node])
-
-def parser_expressions_rest():
-    # expressions_rest-> COMMA expression expressions_rest| /* 空 */
-    if MatchToken(TokenType.COMMA):
-        comma_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        expression_node = parser_expression()
-        expressions_rest_node = parser_expressions_rest()
-        return Node("expressions_rest", children=[comma_node, expression_node, expressions_rest_node])
-    elif tokenNow.tokenType in {
-        TokenType.RPAREN, TokenType.RBRACKET,
-    }:
-        pass
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.RBRACKET received ",
-              tokenNow.tokenType)
-        exit(0)
-
-def parser_arguments():
-    # arguments-> kwarg arguments_rest| /* 空 */
-    if MatchToken(TokenType.RPAREN):
-        pass
-    else:
-        kwarg_node = parser_kwarg()
-        arguments_rest_node = parser_arguments_rest()
-        return Node("arguments", children=[kwarg_node, arguments_rest_node])
-
-def parser_arguments_rest():
-    # arguments_rest-> COMMA arguments| /* 空 */
-    if MatchToken(TokenType.COMMA):
-        comma_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        arguments_node = parser_arguments()
-        return Node("arguments_rest", children=[comma_node, arguments_node])
-    elif MatchToken(TokenType.RPAREN):
-        pass
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.RPAREN 或 TokenType.COMMA received ",
-              tokenNow.tokenType)
-        exit(0)
-
-def parser_kwarg():
-    # kwarg-> IDENTIFIER kwarg_rest| atom_rest expr_rest
-    # |NOT inversion|PLUS factor| MINUS factor
-    if MatchToken(TokenType.IDENTIFIER):
-        node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        kwarg_rest_node = parser_kwarg_rest()
-        return Node("kwarg", children=[node, kwarg_rest_node])
-    elif MatchToken(TokenType.NOT):
-        node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        inversion_node = parser_inversion()
-        return Node("kwarg", children=[node, inversion_node])
-    elif MatchToken(TokenType.PLUS) or MatchToken(TokenType.MINUS):
-        node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        factor_node = parser_factor()
-        return Node("kwarg", children=[node, factor_node])
-    else:
-        atom_rest_node = parser_atom_rest()
-        expr_rest_node = parser_expr_rest()
-        return Node("kwarg", children=[atom_rest_node, expr_rest_node])
-
-def parser_atom_rest():
-    # atom_rest: TRUE| FALSE| NONE| NUMBER| STRING| tuple| list
-    if tokenNow.tokenType in{
-        TokenType.TRUE, TokenType.FALSE,
-        TokenType.NONE, TokenType.NUMBER, TokenType.STRING,
-    }:
-        node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        return Node("atom_rest", children=[node])
-    elif tokenNow.tokenType==TokenType.LPAREN:
-        tuple_node = parser_tuple()
-        return Node("atom_rest", children=[tuple_node])
-    elif tokenNow.tokenType==TokenType.LBRACKET:
-        list_node = parser_list()
-        return Node("atom_rest", children=[list_node])
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：received ",
-              tokenNow.tokenType)
-        exit(0)
-
-
-def parser_kwarg_rest():
-    # kwarg_rest-> ASSIGN expression| expr_rest
-    if MatchToken(TokenType.ASSIGN):
-        assign_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        expression_node = parser_expression()
-        return Node("kwarg_rest", children=[assign_node, expression_node])
-    else:
-        expr_rest_node = parser_expr_rest()
-        return Node("kwarg_rest", children=[expr_rest_node])
-
-def parser_return_stmt():
-    # return_stmt-> RETURN expression
-    if MatchToken(TokenType.RETURN):
-        node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        expression_node = parser_expression()
-        return Node("return_stmt", children=[node, expression_node])
-
-def parser_import_stmt():
-    # import_stmt->IMPORT dotted_as_names
-    if MatchToken(TokenType.IMPORT):
-        node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        dotted_as_names_node = parser_dotted_as_names()
-        return Node("import_stmt", children=[node, dotted_as_names_node])
-
-def parser_dotted_as_names():
-    # dotted_as_names->dotted_as_name dotted_as_names_rest
-    dotted_as_name_node = parser_dotted_as_name()
-    dotted_as_names_rest_node = parser_dotted_as_names_rest()
-    return Node("dotted_as_names", children=[dotted_as_name_node, dotted_as_names_rest_node])
-
-def parser_dotted_as_names_rest():
-    # dotted_as_names_rest-> COMMA dotted_as_names|  /* 空 */
-    if MatchToken(TokenType.COMMA):
-        node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        dotted_as_names_node = parser_dotted_as_names()
-        return Node("dotted_as_names_rest", children=[node, dotted_as_names_node])
-    elif tokenNow.tokenType in {
-        TokenType.NEWLINE, TokenType.END
-    }:
-        pass
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：received ",
-              tokenNow.tokenType)
-        exit(0)
-
-def parser_dotted_as_name():
-    # dotted_as_name->dotted_name dotted_as_name_rest
-    dotted_name_node = parser_dotted_name()
-    dotted_as_name_rest = parser_dotted_as_name_rest()
-    if dotted_as_name_rest!=None:
-        dotted_name_node.imported_names = []
-    return Node("dotted_as_name", children=[dotted_name_node, dotted_as_name_rest])
-
-def parser_dotted_as_name_rest():
-    # dotted_as_name_rest-> AS IDENTIFIER|  /* 空 */
-    if MatchToken(TokenType.AS):
-        as_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        if MatchToken(TokenType.IDENTIFIER):
-            id_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-            FetchToken()
-            return Node("dotted_as_name_rest", children=[as_node, id_node], imported_names=[id_node])
+    def parser_arguments(self):
+        # arguments-> kwarg arguments_rest| /* 空 */
+        if self.MatchToken(TokenType.RPAREN):
+            pass
         else:
-            print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.IDENTIFIER received ",
-                  tokenNow.tokenType)
-            exit(0)
-    elif tokenNow.tokenType in {
-        TokenType.NEWLINE, TokenType.END, TokenType.COMMA
-    }:
-        pass
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：received ",
-              tokenNow.tokenType)
-        exit(0)
-
-def parser_dotted_name():
-    # dotted_name: IDENTIFIER dotted_name_rest
-    if MatchToken(TokenType.IDENTIFIER):
-        id_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        dotted_name_rest_node = parser_dotted_name_rest()
-        return Node("dotted_name", children=[id_node, dotted_name_rest_node], imported_names=[id_node])
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.IDENTIFIER received ",
-              tokenNow.tokenType)
-        exit(0)
-
-
-def parser_dotted_name_rest():
-    # dotted_name_rest-> DOT IDENTIFIER |  /* 空 */
-    if MatchToken(TokenType.DOT):
-        dot_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        if MatchToken(TokenType.IDENTIFIER):
-            id_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-            FetchToken()
-            return Node("dotted_name_rest", children=[dot_node, id_node] )
+            kwarg_node = self.parser_kwarg()
+            arguments_rest_node = self.parser_arguments_rest()
+            return Node(Kind.arguments, children=(kwarg_node, arguments_rest_node))
+
+    def parser_arguments_rest(self):
+        # arguments_rest-> COMMA arguments| /* 空 */
+        if self.MatchToken(TokenType.COMMA):
+            comma_node = leaf(self.tokenNow)
+            self.FetchToken()
+            arguments_node = self.parser_arguments()
+            return Node(Kind.arguments_rest, children=(comma_node, arguments_node))
+        elif self.MatchToken(TokenType.RPAREN):
+            pass
         else:
-            print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.IDENTIFIER received ",
-                  tokenNow.tokenType)
-            exit(0)
-    elif tokenNow.tokenType in {
-        TokenType.NEWLINE, TokenType.END, TokenType.COMMA, TokenType.AS
-    }:
-        pass
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：received ",
-              tokenNow.tokenType)
-        exit(0)
-
-
-def parser_function_def():
-    # function_def-> DEF IDENTIFIER LPAREN arguments RPAREN COLON block
-    if MatchToken(TokenType.DEF):
-        def_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        if MatchToken(TokenType.IDENTIFIER):
-            id_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-            FetchToken()
-            if MatchToken(TokenType.LPAREN):
-                lparen_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-                FetchToken()
-                arguments_node = parser_arguments()
-                if MatchToken(TokenType.RPAREN):
-                    rparen_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-                    FetchToken()
-                    if MatchToken(TokenType.COLON):
-                        colon_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-                        FetchToken()
-                        block_node = parser_block()
-                        return Node("function_def", children=[def_node, id_node, lparen_node, arguments_node, rparen_node, colon_node, block_node])
-                    else:
-                        print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.COLON received ",
-                              tokenNow.tokenType)
-                        exit(0)
-                else:
-                    print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.RPAREN received ",
-                          tokenNow.tokenType)
-                    exit(0)
-            else:
-                print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.LPAREN received ",
-                      tokenNow.tokenType)
-                exit(0)
+            self.ReportError((TokenType.RPAREN, TokenType.COMMA))
+
+    def parser_kwarg(self):
+        # kwarg-> IDENTIFIER kwarg_rest| atom_rest expr_rest
+        # |NOT inversion|PLUS factor| MINUS factor
+        if self.MatchToken(TokenType.IDENTIFIER):
+            node = leaf(self.tokenNow)
+            self.FetchToken()
+            kwarg_rest_node = self.parser_kwarg_rest()
+            return Node(Kind.kwarg, children=(node, kwarg_rest_node))
+        elif self.MatchToken(TokenType.NOT):
+            node = leaf(self.tokenNow)
+            self.FetchToken()
+            inversion_node = self.parser_expression(PREFIX_OPERATORS[TokenType.NOT])
+            return Node(Kind.kwarg, children=(node, inversion_node))
+        elif self.MatchToken(TokenType.PLUS) or self.MatchToken(TokenType.MINUS):
+            node = leaf(self.tokenNow)
+            self.FetchToken()
+            factor_node = self.parser_expression(PREFIX_OPERATORS[TokenType.PLUS])
+            return Node(Kind.kwarg, children=(node, factor_node))
         else:
-            print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.IDENTIFIER received ",
-                  tokenNow.tokenType)
-            exit(0)
+            atom_rest_node = self.parser_atom_rest()
+            expr_rest_node = self.parser_expr_rest()
+            return Node(Kind.kwarg, children=(atom_rest_node, expr_rest_node))
+
+    def parser_atom_rest(self):
+        # atom_rest: TRUE| FALSE| NONE| NUMBER| STRING| tuple| list
+        if self.tokenNow.tokenType in{
+            TokenType.TRUE, TokenType.FALSE,
+            TokenType.NONE, TokenType.NUMBER, TokenType.STRING,
+        }:
+            node = leaf(self.tokenNow)
+            self.FetchToken()
+            return Node(Kind.atom_rest, children=(node,))
+        elif self.tokenNow.tokenType==TokenType.LPAREN:
+            tuple_node = self.parser_tuple()
+            return Node(Kind.atom_rest, children=(tuple_node,))
+        elif self.tokenNow.tokenType==TokenType.LBRACKET:
+            list_node = self.parser_list()
+            return Node(Kind.atom_rest, children=(list_node,))
+        else:
+            self.ReportError()
 
 
-def parser_if_stmt():
-    # if_stmt-> IF expression COLON block if_stmt_rest
-    if MatchToken(TokenType.IF):
-        if_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        expression_node = parser_expression()
-        if MatchToken(TokenType.COLON):
-            colon_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-            FetchToken()
-            block_node = parser_block()
-            if_stmt_rest_node = parser_if_stmt_rest()
-            return Node("if_stmt", children=[if_node, expression_node, colon_node, block_node, if_stmt_rest_node])
+    def parser_kwarg_rest(self):
+        # kwarg_rest-> ASSIGN expression| expr_rest
+        if self.MatchToken(TokenType.ASSIGN):
+            assign_node = leaf(self.tokenNow)
+            self.FetchToken()
+            expression_node = self.parser_expression()
+            return Node(Kind.kwarg_rest, children=(assign_node, expression_node))
         else:
-            print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.COLON received ",
-                  tokenNow.tokenType)
-            exit(0)
-
-def parser_if_stmt_rest():
-    # if_stmt_rest-> elif_stmt | else_block | /* 空 */
-    if tokenNow.tokenType==TokenType.ELIF:
-        elif_stmt_node = parser_elif_stmt()
-        return Node("if_stmt_rest", children=[elif_stmt_node])
-    elif tokenNow.tokenType==TokenType.ELSE:
-        else_block_node = parser_else_block()
-        return Node("else_block_node", children=[else_block_node])
-    elif tokenNow.tokenType in {
-        TokenType.NEWLINE, TokenType.END, TokenType.RBRACE
-    }:
-        pass
-    else:
-        print("line " + str(tokenNow.linenum) + " 语法错误：received ",
-              tokenNow.tokenType)
-        exit(0)
-
-def parser_elif_stmt():
-    # elif_stmt: ELIF expression COLON block if_stmt_rest
-    if MatchToken(TokenType.ELIF):
-        elif_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        expression_node = parser_expression()
-        if MatchToken(TokenType.COLON):
-            colon_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-            FetchToken()
-            block_node = parser_block()
-            if_stmt_rest_node = parser_if_stmt_rest()
-            return Node("elif_stmt", children=[elif_node, expression_node, colon_node, block_node, if_stmt_rest_node])
+            expr_rest_node = self.parser_expr_rest()
+            return Node(Kind.kwarg_rest, children=(expr_rest_node,))
+
+    def parser_return_stmt(self):
+        # return_stmt-> RETURN expression
+        if self.MatchToken(TokenType.RETURN):
+            node = leaf(self.tokenNow)
+            self.FetchToken()
+            expression_node = self.parser_expression()
+            return Node(Kind.return_stmt, children=(node, expression_node))
+
+    def parser_import_stmt(self):
+        # import_stmt->IMPORT dotted_as_names
+        if self.MatchToken(TokenType.IMPORT):
+            node = leaf(self.tokenNow)
+            self.FetchToken()
+            dotted_as_names_node = self.parser_dotted_as_names()
+            return Node(Kind.import_stmt, children=(node, dotted_as_names_node))
+
+    def parser_dotted_as_names(self):
+        # dotted_as_names->dotted_as_name dotted_as_names_rest
+        dotted_as_name_node = self.parser_dotted_as_name()
+        dotted_as_names_rest_node = self.parser_dotted_as_names_rest()
+        return Node(Kind.dotted_as_names, children=(dotted_as_name_node, dotted_as_names_rest_node))
+
+    def parser_dotted_as_names_rest(self):
+        # dotted_as_names_rest-> COMMA dotted_as_names|  /* 空 */
+        if self.MatchToken(TokenType.COMMA):
+            node = leaf(self.tokenNow)
+            self.FetchToken()
+            dotted_as_names_node = self.parser_dotted_as_names()
+            return Node(Kind.dotted_as_names_rest, children=(node, dotted_as_names_node))
+        elif self.tokenNow.tokenType in {
+            TokenType.NEWLINE, TokenType.END
+        }:
+            pass
         else:
-            print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.COLON received ",
-                  tokenNow.tokenType)
-            exit(0)
-
-def parser_else_block():
-    # else_block-> ELSE COLON block
-    if MatchToken(TokenType.ELSE):
-        else_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        if MatchToken(TokenType.COLON):
-            colon_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-            FetchToken()
-            block_node = parser_block()
-            return Node("else_block", children=[else_node, colon_node, block_node])
+            self.ReportError()
+
+    def parser_dotted_as_name(self):
+        # dotted_as_name->dotted_name dotted_as_name_rest
+        # 登记导入名：有as时是别名，否则是模块名的第一个标识符
+        dotted_name_node = self.parser_dotted_name()
+        dotted_as_name_rest = self.parser_dotted_as_name_rest()
+        if dotted_as_name_rest!=None:
+            self.imported_names.append(dotted_as_name_rest.children[1])
         else:
-            print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.COLON received ",
-                  tokenNow.tokenType)
-            exit(0)
-
-def parser_for_stmt():
-    # for_stmt: FOR IDENTIFIER IN expression COLON block
-    if MatchToken(TokenType.FOR):
-        for_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        if MatchToken(TokenType.IDENTIFIER):
-            id_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-            FetchToken()
-            if MatchToken(TokenType.IN):
-                in_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-                FetchToken()
-                expression_node = parser_expression()
-                if MatchToken(TokenType.COLON):
-                    colon_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-                    FetchToken()
-                    block_node = parser_block()
-                    return Node("for_stmt", children=[for_node, id_node, in_node, expression_node, colon_node, block_node])
-                else:
-                    print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.COLON received ",
-                          tokenNow.tokenType)
-                    exit(0)
+            self.imported_names.append(dotted_name_node.children[0])
+        return Node(Kind.dotted_as_name, children=(dotted_name_node, dotted_as_name_rest))
+
+    def parser_dotted_as_name_rest(self):
+        # dotted_as_name_rest-> AS IDENTIFIER|  /* 空 */
+        if self.MatchToken(TokenType.AS):
+            as_node = leaf(self.tokenNow)
+            self.FetchToken()
+            if self.MatchToken(TokenType.IDENTIFIER):
+                id_node = leaf(self.tokenNow)
+                self.FetchToken()
+                return Node(Kind.dotted_as_name_rest, children=(as_node, id_node))
             else:
-                print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.IN received ",
-                      tokenNow.tokenType)
-                exit(0)
+                self.ReportError(TokenType.IDENTIFIER)
+        elif self.tokenNow.tokenType in {
+            TokenType.NEWLINE, TokenType.END, TokenType.COMMA
+        }:
+            pass
         else:
-            print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.IDENTIFIER received ",
-                  tokenNow.tokenType)
-            exit(0)
-
-
-def parser_while_stmt():
-    # while_stmt: WHILE expression COLON block
-    if MatchToken(TokenType.WHILE):
-        while_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-        FetchToken()
-        expression_node = parser_expression()
-        if MatchToken(TokenType.COLON):
-            colon_node = Node(str(tokenNow.tokenType.name), children=[], value=tokenNow)
-            FetchToken()
-            block_node = parser_block()
-            return Node("for_stmt", children=[while_node, expression_node, colon_node, block_node])
+            self.ReportError()
+
+    def parser_dotted_name(self):
+        # dotted_name: IDENTIFIER dotted_name_rest
+        if self.MatchToken(TokenType.IDENTIFIER):
+            id_node = leaf(self.tokenNow)
+            self.FetchToken()
+            dotted_name_rest_node = self.parser_dotted_name_rest()
+            return Node(Kind.dotted_name, children=(id_node, dotted_name_rest_node))
         else:
-            print("line " + str(tokenNow.linenum) + " 语法错误：Expected TokenType.COLON received ",
-                  tokenNow.tokenType)
-            exit(0)
-
-
-def Parser(string):
-    global tokenIter  # 正确缩进，与函数内其他代码对齐
-
-    # 调用词法分析器得到记号表
-    tokenList = Lexer(string)
-    tokenIter = iter(tokenList)
-
-    FetchToken()
-    return parse_program()
-
-
-
-def getPaserTree():
-    str = read_file_to_string("test.py")
-    str = filterComment(str)
-    write_string_to_file(str, "test_filter.py")
-    tree = Parser(str)
-    tree.print_tree(0)
+            self.ReportError(TokenType.IDENTIFIER)
+
+
+    def parser_dotted_name_rest(self):
+        # dotted_name_rest-> DOT IDENTIFIER |  /* 空 */
+        if self.MatchToken(TokenType.DOT):
+            dot_node = leaf(self.tokenNow)
+            self.FetchToken()
+            if self.MatchToken(TokenType.IDENTIFIER):
+                id_node = leaf(self.tokenNow)
+                self.FetchToken()
+                return Node(Kind.dotted_name_rest, children=(dot_node, id_node))
+            else:
+                self.ReportError(TokenType.IDENTIFIER)
+        elif self.tokenNow.tokenType in {
+            TokenType.NEWLINE, TokenType.END, TokenType.COMMA, TokenType.AS
+        }:
+            pass
+        else:
+            self.ReportError()
+
+
+    def parser_function_def(self):
+        # function_def-> DEF IDENTIFIER LPAREN arguments RPAREN COLON block
+        if self.MatchToken(TokenType.DEF):
+            def_node = leaf(self.tokenNow)
+            self.FetchToken()
+            if self.MatchToken(TokenType.IDENTIFIER):
+                id_node = leaf(self.tokenNow)
+                self.FetchToken()
+                if self.MatchToken(TokenType.LPAREN):
+                    lparen_node = leaf(self.tokenNow)
+                    self.FetchToken()
+                    arguments_node = self.parser_arguments()
+                    if self.MatchToken(TokenType.RPAREN):
+                        rparen_node = leaf(self.tokenNow)
+                        self.FetchToken()
+                        if self.MatchToken(TokenType.COLON):
+                            colon_node = leaf(self.tokenNow)
+                            self.FetchToken()
+                            block_node = self.parser_function_body()
+                            return Node(Kind.function_def, children=(def_node, id_node, lparen_node, arguments_node, rparen_node, colon_node, block_node))
+                        else:
+                            self.ReportError(TokenType.COLON)
+                    else:
+                        self.ReportError(TokenType.RPAREN)
+                else:
+                    self.ReportError(TokenType.LPAREN)
+            else:
+                self.ReportError(TokenType.IDENTIFIER)
+
+
+    def parser_if_stmt(self):
+        # if_stmt-> IF expression COLON block if_stmt_rest
+        if self.MatchToken(TokenType.IF):
+            if_node = leaf(self.tokenNow)
+            self.FetchToken()
+            expression_node = self.parser_expression()
+            if self.MatchToken(TokenType.COLON):
+                colon_node = leaf(self.tokenNow)
+                self.FetchToken()
+                block_node = self.parser_block()
+                if_stmt_rest_node = self.parser_if_stmt_rest()
+                return Node(Kind.if_stmt, children=(if_node, expression_node, colon_node, block_node, if_stmt_rest_node))
+            else:
+                self.ReportError(TokenType.COLON)
+
+    def parser_if_stmt_rest(self):
+        # if_stmt_rest-> elif_stmt | else_block | /* 空 */
+        if self.tokenNow.tokenType==TokenType.ELIF:
+            elif_stmt_node = self.parser_elif_stmt()
+            return Node(Kind.if_stmt_rest, children=(elif_stmt_node,))
+        elif self.tokenNow.tokenType==TokenType.ELSE:
+            else_block_node = self.parser_else_block()
+            return Node(Kind.else_block_node, children=(else_block_node,))
+        elif self.tokenNow.tokenType in {
+            TokenType.NEWLINE, TokenType.END, TokenType.RBRACE
+        }:
+            pass
+        else:
+            self.ReportError()
+
+    def parser_elif_stmt(self):
+        # elif_stmt: ELIF expression COLON block if_stmt_rest
+        if self.MatchToken(TokenType.ELIF):
+            elif_node = leaf(self.tokenNow)
+            self.FetchToken()
+            expression_node = self.parser_expression()
+            if self.MatchToken(TokenType.COLON):
+                colon_node = leaf(self.tokenNow)
+                self.FetchToken()
+                block_node = self.parser_block()
+                if_stmt_rest_node = self.parser_if_stmt_rest()
+                return Node(Kind.elif_stmt, children=(elif_node, expression_node, colon_node, block_node, if_stmt_rest_node))
+            else:
+                self.ReportError(TokenType.COLON)
+
+    def parser_else_block(self):
+        # else_block-> ELSE COLON block
+        if self.MatchToken(TokenType.ELSE):
+            else_node = leaf(self.tokenNow)
+            self.FetchToken()
+            if self.MatchToken(TokenType.COLON):
+                colon_node = leaf(self.tokenNow)
+                self.FetchToken()
+                block_node = self.parser_block()
+                return Node(Kind.else_block, children=(else_node, colon_node, block_node))
+            else:
+                self.ReportError(TokenType.COLON)
+
+    def parser_for_stmt(self):
+        # for_stmt: FOR IDENTIFIER IN expression COLON block
+        if self.MatchToken(TokenType.FOR):
+            for_node = leaf(self.tokenNow)
+            self.FetchToken()
+            if self.MatchToken(TokenType.IDENTIFIER):
+                id_node = leaf(self.tokenNow)
+                self.FetchToken()
+                if self.MatchToken(TokenType.IN):
+                    in_node = leaf(self.tokenNow)
+                    self.FetchToken()
+                    expression_node = self.parser_expression()
+                    if self.MatchToken(TokenType.COLON):
+                        colon_node = leaf(self.tokenNow)
+                        self.FetchToken()
+                        block_node = self.parser_block()
+                        return Node(Kind.for_stmt, children=(for_node, id_node, in_node, expression_node, colon_node, block_node))
+                    else:
+                        self.ReportError(TokenType.COLON)
+                else:
+                    self.ReportError(TokenType.IN)
+            else:
+                self.ReportError(TokenType.IDENTIFIER)
+
+
+    def parser_while_stmt(self):
+        # while_stmt: WHILE expression COLON block
+        if self.MatchToken(TokenType.WHILE):
+            while_node = leaf(self.tokenNow)
+            self.FetchToken()
+            expression_node = self.parser_expression()
+            if self.MatchToken(TokenType.COLON):
+                colon_node = leaf(self.tokenNow)
+                self.FetchToken()
+                block_node = self.parser_block()
+                return Node(Kind.for_stmt, children=(while_node, expression_node, colon_node, block_node))
+            else:
+                self.ReportError(TokenType.COLON)
+
+
+def parse_with_errors(string):
+    """分析源程序，出错时不退出；返回(语法树, 错误列表)，错误为按出现顺序排列的Diagnostic。
+
+    语法树中去掉了出错的语句，没有错误时与Parser(string).parse()的结果相同。
+    """
+    parser = Parser(string, recover=True)
+    return parser.parse(), parser.errors
+
+
+# ---------------- 延迟分析函数体 ----------------
+# 很多处理只关心顶层结构(导入、函数名、模块级的调用)。LazyParser利用TokenIndex中配对的花括号，
+# 遇到def的代码块时直接跳到配对的RBRACE之后，留下一个LazyBlock结点；
+# 第一次访问它的children时才分析函数体，得到的子树与Parser完全相同。
+# 函数体中的语法错误也推迟到这时才报告。
+
+class LazyBlock(Node):
+    def __init__(self, index, lbrace):
+        super().__init__("block")
+        self.index = index
+        self.lbrace = lbrace
+        self._children = None
+
+    @property
+    def children(self):
+        if self._children is None:
+            parser = LazyParser(self.index, self.lbrace - 1)
+            parser.FetchToken()
+            self._children = parser.parser_block().children
+        return self._children
+
+    @children.setter
+    def children(self, children):
+        self._children = children
+
+
+class LazyParser(Parser):
+    # index是pylex.TokenIndex；start为开始分析的记号下标
+
+    def __init__(self, index, start=0):
+        self.recover = False
+        self.errors = []
+        self.imported_names = []
+        self.call_sites = []  # 跳过的函数体中的调用点不在其中，需要完整的调用点时用collect_call_sites
+        self.dots = 0
+        self.index = index
+        self.tokens = index.tokens
+        self.pos = start - 1
+        self.tokenNow = None
+
+    def parse(self):
+        self.FetchToken()
+        return self.parse_program()
+
+    def FetchToken(self):
+        self.pos += 1
+        if self.pos >= len(self.tokens):
+            sys.exit()
+        self.tokenNow = self.tokens[self.pos]
+        return self.tokenNow
+
+    def parser_function_body(self):
+        # block-> NEWLINE LBRACE statements RBRACE NEWLINE，花括号配对时跳过整个代码块；
+        # 含import的函数体照常分析，导入名要在这时登记
+        lbrace = self.pos + 1
+        rbrace = self.index.braces.get(lbrace)
+        if (self.tokenNow.tokenType is TokenType.NEWLINE and rbrace is not None
+                and not self.index.has_import(lbrace, rbrace)
+                and self.tokens[lbrace].tokenType is TokenType.LBRACE
+                and self.tokens[rbrace + 1].tokenType is TokenType.NEWLINE):
+            self.pos = rbrace + 1
+            self.FetchToken()
+            return LazyBlock(self.index, lbrace)
+        return self.parser_block()
+
+
+# ---------------- 增量语法分析 ----------------
+# 顶层语句各自从新的一行开始，修改第a..b行只需要重新分析与这些行重叠的顶层语句，
+# 其余语句的子树原样保留。语法树必须是由记号表tokens分析得到的(Parser(tokens)或parse_with_errors(tokens))，tokens来自EditableLexer，
+# 这样叶子结点和tokens共用记号对象(合成的NEWLINE也与下一个记号同行)，增删行后这些子树的行号也随之更新。
+
+def first_line(node):
+    # 结点中第一个记号所在的行
+    while node.value is None:
+        node = next(child for child in node.children if child is not None)
+    return node.value.linenum
+
+
+def reparse(tree, tokens, first, last, new_text):
+    """用new_text替换第first..last行后，就地更新记号表tokens和语法树tree，返回(语法树, 错误列表)。
+
+    只重新分析与修改的行重叠的顶层语句（以及它前面的一条语句，新加的elif/else会接在它后面），
+    其余顶层语句的子树直接复用。重新分析的部分出错时不退出：去掉出错的语句，
+    错误列表中是这部分的Diagnostic(与parse_with_errors相同)，new_text中的词法错误也按行号合并进来；
+    窗口之外以前的错误不再报告。修改后的最后一行与后面的语句连在一起时，退回到对整个记号表的parse_with_errors。
+    """
+    lexical = []
+
+    def with_lexical(tree, errors):
+        # 词法错误按行号并入语法错误列表
+        return tree, (sorted(lexical + errors, key=attrgetter("linenum")) if lexical else errors)
+
+    if tree.kind != Kind.program:
+        relex_lines(tokens, first, last, new_text, lexical)
+        return with_lexical(*parse_with_errors(tokens))
+    statements = tree.children[0].children
+    a = max(bisect_right(statements, first, key=first_line) - 2, 0)
+    b = bisect_right(statements, last, key=first_line)
+
+    def line_of(token):
+        return token.linenum
+
+    start = 0 if a == 0 else bisect_left(tokens, first_line(statements[a]), key=line_of)
+    end = len(tokens) - 1 if b == len(statements) else bisect_left(tokens, first_line(statements[b]), key=line_of)
+    # 导入名按行号分成窗口前、窗口内、窗口后三段，窗口内的一段换成重新分析得到的
+    names = tree.imported_names
+    lo = bisect_left(names, first_line(statements[a]), key=first_line) if a else 0
+    hi = bisect_left(names, first_line(statements[b]), key=first_line) if b < len(statements) else len(names)
+    old_count = len(tokens)
+    relex_lines(tokens, first, last, new_text, lexical)
+    end += len(tokens) - old_count
+
+    if tokens[end].tokenType is not TokenType.END and tokens[end - 1].tokenType is not TokenType.NEWLINE:
+        return with_lexical(*parse_with_errors(tokens))  # 修改后的最后一行与后面的语句连在了一起
+    window = tokens[start:end]
+    window.append(tokens[end].same_line(TokenType.END, ""))
+    # 窗口不在程序开头时只是一串语句，以一元运算符开头的语句是合法的
+    parser = Parser(window, recover=True)
+    parser.FetchToken()
+    part = parser.parse_program(start=a == 0)
+    errors = parser.errors
+    new_statements = part.children[0].children if part.kind == Kind.program else ()
+    if not new_statements and len(statements) == b - a:
+        return with_lexical(*parse_with_errors(tokens))  # 整个程序都在窗口内，结果可能是EMPTYprogram
+
+    tree.imported_names = names[:lo] + list(part.imported_names) + names[hi:]
+
+    tree.children[0].children = statements[:a] + new_statements + statements[b:]
+    return with_lexical(tree, errors)
+
+
+# ---------------- 子树共享 ----------------
+# 批量编译时同样的辅助函数在很多程序中反复出现。InternTable按结构给子树编号(hash-consing)：
+# 自底向上处理，子结点已经换成共享结点，所以一个结点的结构由(类型, 记号类型, 记号值, 各子结点的id)确定，
+# 查一次字典就能判断之前是否出现过相同的子树，结构相同的子树在整批程序中只存一份。
+# 行号不参与比较，共享的记号保留第一次出现时的行号。共享后的语法树是只读的，不要再reparse或平移行号。
+
+class InternTable:
+    def __init__(self):
+        self.nodes = {}  # 结构 -> 共享的结点
+        self.shared = 0  # 换成了已有结点的结点数
+
+    def intern(self, tree):
+        """返回与tree结构相同、子树尽量共享的语法树；tree中新出现的结点直接成为共享结点。"""
+        order = []  # 先序，含None子结点
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            if node is not None and node.children:
+                stack.extend(reversed(node.children))
+        # 倒着处理先序序列：处理一个结点时它的各子结点对应的共享结点依次在栈顶(第一个子结点在最上面)
+        nodes = self.nodes
+        shared = 0
+        for node in reversed(order):
+            if node is None:
+                stack.append(None)
+                continue
+            token = node.value
+            size = len(node.children)
+            if size:
+                children = tuple(stack[:-size - 1:-1])
+                del stack[-size:]
+                if token is None:
+                    key = (node.kind, None, None, *map(id, children))
+                else:
+                    key = (node.kind, token.tokenType, token.value, *map(id, children))
+            else:
+                children = ()
+                key = (node.kind, token.tokenType, token.value) if token is not None else (node.kind,)
+            canonical = nodes.get(key)
+            if canonical is None:
+                if size and children != node.children:
+                    node.children = children
+                canonical = nodes[key] = node
+            else:
+                shared += 1
+            stack.append(canonical)
+        self.shared += shared
+        root = stack.pop()
+        if root is tree and tree.imported_names:
+            # 导入名是树中的IDENTIFIER结点，按结构换成共享结点
+            names = tree.imported_names
+            tree.imported_names = [nodes[(name.kind, name.value.tokenType, name.value.value)] for name in names]
+        return root
+
+
+# 批量编译时按结构认出重复的函数：function_def的子树完全由它的记号序列(记号类型和值，不含行号)决定。
+# BatchParser分析时顺带记下每个function_def的记号序列作为结构键，以及分析它时登记的调用点的范围；
+# 键直接从记号表中切出，不遍历子树，比InternTable逐个结点共享便宜得多。
+# 记号类型用TokenType的值(各不相同)，枚举成员的__hash__是Python函数，作为键太慢。
+TOKEN_TYPE_VALUE = attrgetter("tokenType._value_")
+TOKEN_VALUE = attrgetter("value")
+
+
+class BatchParser(Parser):
+    def __init__(self, string):
+        self.tokens = list(table_tokens(string)) if isinstance(string, str) else list(string)
+        super().__init__(self.tokens)
+        self.functions = []  # [(function_def结点, 结构键, 调用点开始下标, 调用点结束下标)]，内层函数在外层之前
+
+    def position(self):
+        # tokenNow在记号表中的下标：列表迭代器剩下的记号个数是精确的，取记号时不必另外计数
+        return len(self.tokens) - length_hint(self.tokenIter) - 1
+
+    def parser_function_def(self):
+        start = self.position()
+        sites = len(self.call_sites)
+        node = super().parser_function_def()
+        span = self.tokens[start:self.position()]
+        key = (tuple(map(TOKEN_TYPE_VALUE, span)), tuple(map(TOKEN_VALUE, span)))
+        self.functions.append((node, key, sites, len(self.call_sites)))
+        return node
+
+
+# ---------------- 多进程分块语法分析 ----------------
+# 顶层语句互不依赖：源程序按split_statements在顶层语句之间切成若干块，
+# 每块在子进程中做词法和语法分析，得到的语句按顺序挂在同一个program结点下。
+# 每块的imported_names也按顺序拼接，与顺序分析时登记的结果相同。
+# 子进程把语法树按pytree的紧凑格式传回，比直接pickle Node对象小一个数量级，编解码也快得多。
+
+def _parse_chunk(chunk, linenum):
+    # 子进程中执行；返回这一块的program(或EMPTYprogram)结点按pytree格式编码的字节串。
+    # 语法树中没有循环引用，分析期间关掉循环垃圾回收，否则大量新建的结点会反复触发全量回收
+    import pytree  # pytree依赖本模块，在函数里导入
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return pytree.dumps(Parser(table_tokens(chunk, linenum)).parse())
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def ParallelParser(string, workers=None, chunk_size=1 << 16):
+    import pytree
+    statements = []
+    imported_names = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_parse_chunk, chunk, linenum)
+                   for chunk, linenum in split_statements(string, chunk_size)]
+        for future in futures:
+            part = pytree.loads(future.result())
+            if part.kind == Kind.program:
+                statements.extend(part.children[0].children)
+                imported_names.extend(part.imported_names)
+    if not statements:
+        return Node(Kind.EMPTYprogram)
+    return Node(Kind.program, children=(Node(Kind.statements, children=statements),), imported_names=imported_names)
+
+
+# ---------------- 按语法规则剖析 ----------------
+# 找出分析慢的程序中哪些产生式最耗时。只在profile_parse中把一个Parser对象上的
+# parse_*/parser_*方法换成计时的包装(实例属性)；不剖析时Parser和Node与原来完全相同，没有任何额外开销。
+# 结点数在分析完成后从语法树中统计：每个结点算在返回的子树包含它的最内层规则上，
+# 分析中建立后又丢弃的结点不计入，各规则的结点数之和就是语法树的结点数。
+# 统计只经过这个Parser对象，不修改Node，其他线程可以同时做语法分析。
+
+class RuleProfiler:
+    def __init__(self):
+        self.stats = {}  # 规则名 -> [调用次数, 累计时间, 自身时间, 语法树中属于它的结点数]
+        self.active = {}  # 规则名 -> 正在执行的层数，递归调用只把最外层计入累计时间
+        self.stack = []  # 正在执行的规则：[开始时间, 子调用耗时]
+        self.owners = {}  # id(规则返回的结点) -> (结点, 规则名)，先返回的(内层的)规则优先；保留结点使id不被重用
+
+    def wrap(self, name, method):
+        stats = self.stats.setdefault(name, [0, 0.0, 0.0, 0])
+        active = self.active
+        active[name] = 0
+        stack = self.stack
+        owners = self.owners
+        clock = time.perf_counter
+
+        def profiled(*args, **kwargs):
+            frame = [clock(), 0.0]
+            stack.append(frame)
+            active[name] += 1
+            try:
+                result = method(*args, **kwargs)
+                if result is not None and id(result) not in owners:
+                    owners[id(result)] = (result, name)
+                return result
+            finally:
+                elapsed = clock() - frame[0]
+                stack.pop()
+                active[name] -= 1
+                stats[0] += 1
+                if not active[name]:
+                    stats[1] += elapsed
+                stats[2] += elapsed - frame[1]
+                if stack:
+                    stack[-1][1] += elapsed
+        return profiled
+
+    def attach(self, parser):
+        for name in dir(type(parser)):
+            if name.startswith(("parse_", "parser_")):
+                setattr(parser, name, self.wrap(name, getattr(parser, name)))
+        return parser
+
+    def count_nodes(self, tree):
+        # 把语法树的每个结点计入最内层包含它的规则；用显式栈遍历，树再深也不递归
+        owners, stats = self.owners, self.stats
+        stack = [(tree, None)]
+        while stack:
+            node, owner = stack.pop()
+            entry = owners.get(id(node))
+            if entry is not None:
+                owner = entry[1]
+            if owner is not None:
+                stats[owner][3] += 1
+            stack.extend((child, owner) for child in node.children if child is not None)
+        owners.clear()
+
+    def rows(self, sort="own"):
+        # [(规则名, 调用次数, 累计秒数, 自身秒数, 结点数)]，按sort(calls/cumulative/own/nodes)从大到小，没有调用过的规则不列出
+        key = {"calls": 1, "cumulative": 2, "own": 3, "nodes": 4}[sort]
+        rows = [(name, *stats) for name, stats in self.stats.items() if stats[0]]
+        rows.sort(key=lambda row: row[key], reverse=True)
+        return rows
+
+    def table(self, sort="own", limit=None):
+        lines = [f"{'rule':<28}{'calls':>10}{'cum ms':>12}{'own ms':>12}{'nodes':>10}"]
+        for name, calls, cumulative, own, nodes in self.rows(sort)[:limit]:
+            lines.append(f"{name:<28}{calls:>10}{cumulative * 1e3:>12.2f}{own * 1e3:>12.2f}{nodes:>10}")
+        return "\n".join(lines)
+
+    def to_json(self, sort="own"):
+        return json.dumps([{"rule": name, "calls": calls, "cumulative": cumulative, "own": own, "nodes": nodes}
+                           for name, calls, cumulative, own, nodes in self.rows(sort)], ensure_ascii=False)
+
+
+def profile_parse(string, recover=False):
+    """分析源程序并按语法规则剖析，返回(语法树, RuleProfiler)。
+
+    每个parse_*/parser_*方法记录调用次数、累计时间、自身时间(不含它调用的其他规则)
+    和语法树中由它建立的结点数；用profiler.table()或profiler.to_json()输出。
+    """
+    profiler = RuleProfiler()
+    parser = profiler.attach(Parser(string, recover=recover))
+    tree = parser.parse()
+    profiler.count_nodes(tree)
+    return tree, profiler
+
+
+# filter_file不为空时，把过滤注释后的源程序写入该文件；
+# mapped=True时用mmap映射源文件，在字节上直接做词法分析
+# dumper(pydump.Dumper)不为空时输出语法树
+def getPaserTree(filter_file=None, mapped=False, dumper=None):
+    if mapped:
+        with MappedSource("test.py") as source:
+            tree = Parser(source).parse()
+            if filter_file:
+                str = source.data[:].decode("utf-8")  # 用已映射的内容，不再读一遍文件
+    else:
+        str = read_file_to_string("test.py")
+        tree = Parser(str).parse()
+    if filter_file:
+        write_string_to_file(filterComment(str), filter_file)
+    if dumper is not None:
+        dumper.tree(tree)
     return tree
 
-getPaserTree()
+if __name__ == "__main__":
+    getPaserTree().print_tree(0)
@@ -1,127 +1,206 @@
 import re
 
-from pylex import Lexer, write_string_to_file
-from pylex import TokenType
 from pylex import read_file_to_string
-from pylex import filterComment
-from pyparser import Parser, FetchToken, parse_program, getPaserTree
+from pylex import translate_run_only
+from pyparser import Parser, BatchParser, Kind, collect_call_sites, getPaserTree
+from pyast import lower, lower_imports, lower_arguments, AstVisitor, Lowering
+from pyast import Module, FunctionDef, If, For, While
 
-# 根据语法树生成可执行文件
-def generate_python_code(node, lvl=0):
-    code = ""
-    # 终结符node.value为token 非终结符为None
-    if node.value!=None:
-        if str(node.value.value)=="{" or str(node.value.value)=="}":
-            return code
-        elif node.value.tokenType.value == "字符串":
-            code += "\"" + node.value.value + "\""
-        elif node.value.tokenType.value == "常数":
-            # token创建时所以数字均为float 检查是否小数点后全为0
-            if node.value.value.is_integer():
-                code += str(int(node.value.value))  # 将其转为整数
+class SyntaxContext:
+    # 一次语义检查的上下文：发现的问题，代替原来的全局变量，
+    # 不同程序的检查互不干扰，可以在多个线程中同时进行
+    def __init__(self, echo=True):
+        self.faults = []
+        self.echo = echo
+
+    def report(self, message):
+        self.faults.append(message)
+        if self.echo:
+            print(message)
+
+
+def comma_separated(nodes):
+    # [a, ",", b, ",", c]
+    if not nodes:
+        return []
+    parts = [","] * (2 * len(nodes) - 1)
+    parts[::2] = nodes
+    return parts
+
+
+# 表达式和简单语句的代码，按类分派到visit_*方法，由AstVisitor.emit用显式栈展开，
+# 很长的运算链也不递归。处理函数返回文本，或者字符串与子结点交替的片段列表。
+# raw=True时得到语义检查用的原始记号串：各记号的值直接相连，
+# 数字保持float的写法、字符串不加引号、and/or/not两边不加空格
+class ExpressionCode(AstVisitor):
+    def __init__(self, raw):
+        self.raw = raw
+
+    def visit_Name(self, node):
+        return node.id
+
+    def visit_Constant(self, node):
+        value = node.value
+        if self.raw:
+            return str(value)
+        elif value.__class__ is str:
+            return "\"" + value + "\""
+        elif value.__class__ is float and value.is_integer():
+            # token创建时所有数字均为float 小数点后全为0时转为整数
+            return str(int(value))
+        return str(value)
+
+    def visit_Call(self, node):
+        return [node.func, "(", *comma_separated(node.args), ")"]
+
+    def visit_Attribute(self, node):
+        return [node.value, "." + node.attr]
+
+    def visit_BinOp(self, node):
+        op = node.op
+        if not self.raw and op.isalpha():
+            op = " " + op + " "
+        return [node.left, op, node.right]
+
+    def visit_UnaryOp(self, node):
+        op = node.op
+        if not self.raw and op.isalpha():
+            op += " "
+        return [op, node.operand]
+
+    def visit_Tuple(self, node):
+        return ["(", *comma_separated(node.elts), ")"]
+
+    def visit_List(self, node):
+        return ["[", *comma_separated(node.elts), "]"]
+
+    def visit_Keyword(self, node):
+        return [node.arg + "=", node.value]
+
+    def visit_Subscript(self, node):
+        return [node.value, "[", *comma_separated(node.slices), "]"]
+
+    def visit_Expr(self, node):
+        return [node.value]
+
+    def visit_Assign(self, node):
+        return [node.target, "=", node.value]
+
+    def visit_AugAssign(self, node):
+        return [node.target, node.op, node.value]
+
+    def visit_Return(self, node):
+        return ["return ", node.value]
+
+    def visit_Import(self, node):
+        return ["import ", *comma_separated(node.names)]
+
+    def visit_Alias(self, node):
+        return node.name if node.asname is None else node.name + " as " + node.asname
+
+    def visit_Pass(self, node):
+        return "pass"
+
+    def visit_Break(self, node):
+        return "break"
+
+    def visit_Continue(self, node):
+        return "continue"
+
+
+EXPRESSION_CODE = ExpressionCode(raw=False)
+RAW_CODE = ExpressionCode(raw=True)
+
+def expression_code(node, raw=False):
+    return (RAW_CODE if raw else EXPRESSION_CODE).emit(node)
+
+# 简单语句与表达式一样由ExpressionCode处理
+simple_statement_code = expression_code
+
+
+# 根据抽象语法树(pyast)生成可执行文件。复合语句按类分派到visit_*方法，片段(语句, 层数)接着展开成
+# 这条语句的代码；简单语句和其中的表达式直接按ExpressionCode的方法展开。整个程序在一次emit中生成，
+# 代码块嵌套再深也不递归。turtle调用的检查不在这里做，见check_call_sites
+class StatementCode(ExpressionCode):
+    def __init__(self):
+        super().__init__(raw=False)
+
+    def visit_FunctionDef(self, node, lvl):
+        return [lvl*"    " + "def " + node.name + "(", *comma_separated(node.args), "):\n",
+                *self.block(node.body, lvl)]
+
+    def visit_If(self, node, lvl, keyword="if"):
+        # elif分支也是If结点，展开时带上关键字"elif"
+        parts = [lvl*"    " + keyword + " ", node.test, ":\n", *self.block(node.body, lvl)]
+        if node.orelse.__class__ is If:
+            parts.append((node.orelse, lvl, "elif"))
+        elif node.orelse is not None:
+            parts.append(lvl*"    " + "else:\n")
+            parts += self.block(node.orelse, lvl)
+        return parts
+
+    def visit_For(self, node, lvl):
+        return [lvl*"    " + "for " + node.target.id + " in ", node.iter, ":\n", *self.block(node.body, lvl)]
+
+    def visit_While(self, node, lvl):
+        return [lvl*"    " + "while ", node.test, ":\n", *self.block(node.body, lvl)]
+
+    def statements(self, body, lvl):
+        # 每句statement根据block层数进行缩进；简单语句后面的换行也按block层数缩进
+        indent = lvl*"    "
+        end = indent + "\n"
+        parts = []
+        for statement in body:
+            if statement.__class__ in COMPOUND_STATEMENTS:
+                parts.append((statement, lvl))
             else:
-                code += str(node.value.value)  # 保持为浮点数
-        else:
-            code += str(node.value.value)
-        return code
-    else:
-        # identifier_stmt后可能为函数调用
-        if node.type == "identifier_stmt":
-            turtle_fun_syntax_anlysis(node)
-        # 每句statement根据block层数进行缩进
-        if node.type == "statement":
-            for child in node.children:
-                if child:
-                    # lvl = 0 没有缩进
-                    code += lvl*"    "+ generate_python_code(child, lvl)
-        elif node.type == "block":
-            for child in node.children:
-                if child:
-                    code += generate_python_code(child, lvl+1)
-        elif node.type == "import_stmt":
-            code += generate_python_code(node.children[0], lvl)
-            code += " "
-            code += generate_python_code(node.children[1], lvl)
-        elif node.type == "if_stmt":
-            code += generate_python_code(node.children[0], lvl)
-            code += " "
-            code += generate_python_code(node.children[1], lvl)
-            code += generate_python_code(node.children[2], lvl)
-            code += "\n"
-            code += generate_python_code(node.children[3], lvl)
-            code += generate_python_code(node.children[4], lvl)
-        elif node.type == "else_block":
-            code += lvl*"    "+generate_python_code(node.children[0], lvl)
-            code += generate_python_code(node.children[1], lvl)
-            code += "\n"
-            code += generate_python_code(node.children[2], lvl)
-        elif node.type == "for_stmt":
-            code += generate_python_code(node.children[0], lvl)
-            code += " "
-            code += generate_python_code(node.children[1], lvl)
-            code += " "
-            code += generate_python_code(node.children[2], lvl)
-            code += " "
-            code += generate_python_code(node.children[3], lvl)
-            code += generate_python_code(node.children[4], lvl)
-            code += "\n"
-            code += generate_python_code(node.children[5], lvl)
-        elif node.type == "while_stmt":
-            code += generate_python_code(node.children[0], lvl)
-            code += " "
-            code += generate_python_code(node.children[1], lvl)
-            code += "\n"
-            code += generate_python_code(node.children[1], lvl)
-        elif node.type == "function_def":
-            code += generate_python_code(node.children[0], lvl)
-            code += " "
-            code += generate_python_code(node.children[1], lvl)
-            code += generate_python_code(node.children[2], lvl)
-            code += generate_python_code(node.children[3], lvl)
-            code += generate_python_code(node.children[4], lvl)
-            code += generate_python_code(node.children[5], lvl)
-            code += "\n"
-            code += generate_python_code(node.children[6], lvl)
-        else:
-            for child in node.children:
-                if child:
-                    code += generate_python_code(child, lvl)
-    return code
+                parts += (indent, statement, end)
+        return parts
+
+    def block(self, body, lvl):
+        # 代码块结束后空一行
+        parts = self.statements(body, lvl+1)
+        parts.append("\n")
+        return parts
+
 
+COMPOUND_STATEMENTS = frozenset({FunctionDef, If, For, While})
+STATEMENT_CODE = StatementCode()
 
-def turtle_fun_syntax_anlysis(node):
-    # 处理对象.函数()调用的可能出现的错误
-    # node.print_tree()
-    for t in turtle_id:
-        is_fun = is_function_call(node)
-        node_father = node
-        node = node.children[0]
-        if t.value.value==node.value.value and is_fun:
-            extracted_args = node_father.extract_arguments()
-            fun_str = ""
-            for arg in extracted_args:
-                fun_str += str(arg.value.value)
-            check_turtle_function_syntax(fun_str, t.value.value)
-        elif t.value.value==node.value.value and not is_fun:
-            print("Syntax Fualt: 非法的标识符命名！"+node.value.value+" 与 import包名 "+t.value.value+" 冲突")
-        elif t.value.value!=node.value.value and is_fun:
-            print("Syntax Fualt: 未import的对象名！" + node.value.value)
-
-    # print(node.children[0].value.value)
-    # print(turtle_id[0].value.value)
-
-def is_function_call(node):
-    if node!=None:
-        if node.type=="DOT":
-            return True
-        # 否则递归检查所有子节点
-        else:
-            for child in node.children:
-                if is_function_call(child):  # 如果任何子节点含有 'DOT'
-                    return True
-    return False  # 如果没有找到 'DOT' 类型的节点
-
-def check_turtle_function_syntax(call_str, t):
+# node是Module或一条语句
+def generate_python_code(node, lvl=0):
+    body = node.body if node.__class__ is Module else (node,)
+    return STATEMENT_CODE.emit(*STATEMENT_CODE.statements(body, lvl))
+
+
+# check_turtle_function_syntax只检查这几个函数的参数
+CHECKED_FUNCTIONS = frozenset({'setpos', 'towards', 'distance', 'color'})
+
+def check_call_sites(call_sites, imports, ctx, checked=None):
+    # 按语句顺序扫一遍调用点(pyparser.call_site)，处理对象.函数()调用可能出现的错误；
+    # 导入名放在集合中，每条语句只查一次。checked是 调用的原始记号串 -> 发现的问题 的字典时，
+    # 相同的调用只检查一次
+    names = {name.id for name in imports}
+    for name, method, arguments, line, dotted in call_sites:
+        if name in names:
+            if not dotted:
+                ctx.report("Syntax Fualt: 非法的标识符命名！"+name+" 与 import包名 "+name+" 冲突")
+            elif method in CHECKED_FUNCTIONS:
+                call_str = name + "." + method + "(" + ",".join(expression_code(arg, raw=True) for arg in lower_arguments(arguments)) + ")"
+                if checked is None:
+                    check_turtle_function_syntax(call_str, name, ctx)
+                    continue
+                faults = checked.get(call_str)
+                if faults is None:
+                    part = SyntaxContext(echo=False)
+                    check_turtle_function_syntax(call_str, name, part)
+                    faults = checked[call_str] = part.faults
+                for fault in faults:
+                    ctx.report(fault)
+        elif names and dotted:
+            ctx.report("Syntax Fualt: 未import的对象名！" + name)
+
+def check_turtle_function_syntax(call_str, t, ctx):
     # 解析函数名和参数
     match = re.match(t+"\.(\w+)\((.*)\)", call_str)
 
@@ -138,20 +217,20 @@ def check_turtle_function_syntax(call_str, t):
                 if isinstance(arguments[0], (int, float)) and isinstance(arguments[1], (int, float)):
                     pass
                 else:
-                    print("Syntax Fault: 类型错误（Type Error）"+function_name+"(x, y=None) x参数为元组时，y应当为空")
+                    ctx.report("Syntax Fault: 类型错误（Type Error）"+function_name+"(x, y=None) x参数为元组时，y应当为空")
             elif isinstance(arguments, (tuple)) and len(arguments) == 1:
                 # 参数是单个元素的列表或元组，错误情形
-                print("Syntax Fault: 类型错误（Type Error）"+function_name+"(x, y=None) x参数为元组时，元组应当包含2个number")
+                ctx.report("Syntax Fault: 类型错误（Type Error）"+function_name+"(x, y=None) x参数为元组时，元组应当包含2个number")
             else:
                 # 参数是两个分开的数字
                 if not isinstance(arguments, (list, tuple)) or len(arguments) != 2:
-                    print("Syntax Fault: 类型错误（Type Error）"+function_name+"(x, y=None) 参数应当为2个number")
+                    ctx.report("Syntax Fault: 类型错误（Type Error）"+function_name+"(x, y=None) 参数应当为2个number")
                 elif not all(isinstance(arg, (int, float)) for arg in arguments):
-                    print("Syntax Fault: 类型错误（Type Error）"+function_name+"(x, y=None) 有参数不是number")
+                    ctx.report("Syntax Fault: 类型错误（Type Error）"+function_name+"(x, y=None) 有参数不是number")
                 else:
                     pass
         except Exception as e:
-            print(f"Error parsing arguments: {e}")
+            ctx.report(f"Error parsing arguments: {e}")
     elif function_name in ['color']:
         try:
             # 解析参数
@@ -165,53 +244,155 @@ def check_turtle_function_syntax(call_str, t):
                 if len(arguments) == 3:
                     # 单个RGB元组
                     if any(color > 1.0 for color in arguments):
-                        print(f"Syntax Fault: 值错误（Value Error）{function_name}(r, g, b) RGB的值不应大于1.0")
+                        ctx.report(f"Syntax Fault: 值错误（Value Error）{function_name}(r, g, b) RGB的值不应大于1.0")
                 elif len(arguments) == 2 and all(isinstance(sub, tuple) for sub in arguments):
                     # 两个RGB元组
                     if any(color > 1.0 for tuple_color in arguments for color in tuple_color):
-                        print(
+                        ctx.report(
                             f"Syntax Fault: 值错误（Value Error）{function_name}((r1, g1, b1), (r2, g2, b2)) RGB的值不应大于1.0")
                 else:
-                    print(f"Syntax Fault: 类型错误（Type Error）{function_name} 使用不正确的RGB元组格式")
+                    ctx.report(f"Syntax Fault: 类型错误（Type Error）{function_name} 使用不正确的RGB元组格式")
             elif isinstance(arguments, list):
                 if len(arguments) == 3 and all(isinstance(color, (int, float)) for color in arguments):
                     # 分开的三个RGB分量
                     if any(color > 1.0 for color in arguments):
-                        print(f"Syntax Fault: 值错误（Value Error）{function_name}(r, g, b) RGB的值不应大于1.0")
+                        ctx.report(f"Syntax Fault: 值错误（Value Error）{function_name}(r, g, b) RGB的值不应大于1.0")
                 elif len(arguments) == 2 and all(isinstance(color, str) for color in arguments):
                     # 两个颜色字符串，正常，无需额外动作
                     pass
                 else:
-                    print(f"Syntax Fault: 类型错误（Type Error）{function_name} 使用不正确的参数组合或类型")
+                    ctx.report(f"Syntax Fault: 类型错误（Type Error）{function_name} 使用不正确的参数组合或类型")
             elif not arguments_str:  # 检查是否没有参数
                 # 无参数调用
                 pass
             else:
-                print(f"Syntax Fault: 类型错误（Type Error）{function_name} 使用了不支持的参数类型或格式")
+                ctx.report(f"Syntax Fault: 类型错误（Type Error）{function_name} 使用了不支持的参数类型或格式")
         except Exception as e:
             pass
 
 
 def analyse_tree():
     str = read_file_to_string("test.py")
-    str = filterComment(str)
-    write_string_to_file(str, "test_filter.py")
-    tokenlist = Lexer(str)
-    tokenIter = iter(tokenlist)
-
-    FetchToken()
-    return parse_program()
-
-def analyse_syntax():
-    global turtle_id
-    tree = getPaserTree()
-    if len(tree.imported_names)<1:
-        print("Syntax Fault: 没有引入任何包！")
-    else:
-        turtle_id = tree.imported_names
-    str = generate_python_code(tree)
+    return Parser(str).parse()
+
+# 对语法树做语义检查并生成代码，发现的问题记录在ctx中；
+# call_sites是Parser分析时登记的调用点，没有时从语法树中找出；checked见check_call_sites
+def analyse_program(tree, ctx, call_sites=None, checked=None):
+    module = lower(tree)
+    if len(module.imports)<1:
+        ctx.report("Syntax Fault: 没有引入任何包！")
+    code = generate_python_code(module)
+    check_call_sites(collect_call_sites(tree) if call_sites is None else call_sites, module.imports, ctx, checked)
+    return code
+
+# 编译一个源程序，返回(生成的代码, 发现的问题)；
+# 每次调用都有自己的Parser和SyntaxContext，可以在多个线程中同时调用
+def compile_source(string):
+    ctx = SyntaxContext(echo=False)
+    parser = Parser(string)
+    code = analyse_program(parser.parse(), ctx, parser.call_sites)
+    return code, ctx.faults
+
+# 批量编译很多个程序：同样的辅助函数在一批程序中反复出现。BatchParser分析时记下每个函数定义的结构键，
+# 结构相同的函数定义(外层函数不同、内层的辅助函数相同时也一样)在整批程序中只转换一次、按层数只生成一次代码，
+# 最外层函数体中调用的检查结果按(结构键, 导入名)缓存，其余turtle函数参数的检查结果按调用的原始记号串缓存。
+# 每个程序的结果与compile_source相同。缓存随批次增长，一批编译完就丢掉这个对象。
+class BatchLowering(Lowering):
+    # 结构键相同的function_def直接用第一次转换得到的FunctionDef，不再访问它的子结点
+    def __init__(self):
+        self.keys = {}  # 当前程序中 id(function_def结点) -> 结构键
+        self.functions = {}  # 结构键 -> FunctionDef
+        self.hits = 0
+
+    def children_function_def(self, node):
+        if self.keys.get(id(node)) in self.functions:
+            return ()
+        return Lowering.children_function_def(self, node)
+
+    def visit_function_def(self, node, values):
+        key = self.keys.get(id(node))
+        function = self.functions.get(key)
+        if function is not None:
+            self.hits += 1
+            return function
+        function = Lowering.visit_function_def(self, node, values)
+        if key is not None:
+            self.functions[key] = function
+        return function
+
+
+class BatchStatementCode(StatementCode):
+    # 函数定义的代码按(FunctionDef, 层数)缓存；共享的FunctionDef在不同程序中是同一个对象
+    def __init__(self):
+        super().__init__()
+        self.functions = {}
+
+    def visit_FunctionDef(self, node, lvl):
+        code = self.functions.get((node, lvl))
+        if code is None:
+            code = self.functions[node, lvl] = self.emit(*StatementCode.visit_FunctionDef(self, node, lvl))
+        return code
+
+
+class BatchCompiler:
+    def __init__(self):
+        self.lowering = BatchLowering()
+        self.code = BatchStatementCode()
+        self.checked = {}  # 调用的原始记号串 -> 问题
+        self.function_faults = {}  # (结构键, 导入名) -> 函数体中调用的问题
+
+    @property
+    def hits(self):
+        # 直接用了之前转换结果的函数定义个数
+        return self.lowering.hits
+
+    def compile(self, string):
+        # 返回(生成的代码, 发现的问题)，与compile_source(string)相同
+        parser = BatchParser(string)
+        tree = parser.parse()
+        ctx = SyntaxContext(echo=False)
+        imports = lower_imports(tree)
+        if len(imports)<1:
+            ctx.report("Syntax Fault: 没有引入任何包！")
+        self.lowering.keys = {id(node): key for node, key, start, end in parser.functions}
+        body = self.lowering.visit(tree.children[0]) if tree.kind == Kind.program else []
+        code = self.code.emit(*self.code.statements(body, 0))
+        self.check(parser.call_sites, parser.functions, imports, ctx)
+        return code, ctx.faults
+
+    def check(self, call_sites, functions, imports, ctx):
+        # 按顺序检查调用点；最外层函数体中的调用点是连续的一段，整段的问题按(结构键, 导入名)缓存
+        names = frozenset(name.id for name in imports)
+        position = 0
+        for node, key, start, end in sorted(functions, key=lambda function: (function[2], -function[3])):
+            if start < position:
+                continue  # 内层函数，已经随外层函数检查过
+            check_call_sites(call_sites[position:start], imports, ctx, self.checked)
+            faults = self.function_faults.get((key, names))
+            if faults is None:
+                part = SyntaxContext(echo=False)
+                check_call_sites(call_sites[start:end], imports, part, self.checked)
+                faults = self.function_faults[key, names] = part.faults
+            for fault in faults:
+                ctx.report(fault)
+            position = end
+        check_call_sites(call_sites[position:], imports, ctx, self.checked)
+
+
+def compile_batch(sources):
+    compiler = BatchCompiler()
+    return [compiler.compile(source) for source in sources]
+
+def analyse_syntax(mapped=False):
+    tree = getPaserTree(mapped=mapped)
+    str = analyse_program(tree, SyntaxContext())
     write_final_file(str, "test_final.py")
 
+# 只需要运行可信程序时跳过语法分析和语义检查，直接在记号流上翻译出可执行文件
+def analyse_run_only():
+    str = translate_run_only(read_file_to_string("test.py"))
+    write_final_file(str, "test_run.py")
+
 def write_final_file(content, filename):
     try:
         with open(filename, 'w', encoding='utf-8') as file:
@@ -219,4 +400,6 @@ def write_final_file(content, filename):
     except IOError:
         return "文件写入失败。"
 
-analyse_syntax()
\ No newline at end of file
+if __name__ == "__main__":
+    analyse_syntax()
+    analyse_run_only()
\ No newline at end of file
@@ -0,0 +1,260 @@
+import gc
+import io
+import struct
+
+from pylex import Token, TokenType
+from pyparser import Node, KIND_NAMES, kind_of
+
+
+# 语法树的二进制格式，用于缓存分析结果和在进程之间传递语法树：
+#   文件头  MAGIC
+#   结点    按先序逐个，根结点的子树读完时结束:
+#           标记         0表示None子结点；否则为 (类型名的字符串下标 << 1 | 有无记号) + 1
+#           子结点个数
+#           有记号时再跟 记号类型名的字符串下标, 记号值, 行号与上一个记号行号之差(zigzag编码)
+#           记号值       0表示None，1后面跟8字节的float，其余为 字符串下标 + 2
+#   导入名  有imported_names的结点个数, 再逐个: 结点下标, 名字个数, 各名字结点的下标
+# 结点类型名、记号类型名和字符串记号值只存一份：字符串按第一次出现的顺序编号，
+# 下标等于已出现的字符串个数时表示新字符串，后面紧跟它的定义 字节长度, UTF-8字节。
+# 这样写的时候不必先收集字符串表，结点边生成边分块写出；读的时候也按块从文件中读，不必一次读入整个文件。
+# 除float外所有整数都是varint(每字节7位，低位在前，最高位为1表示后面还有)。
+
+MAGIC = b"PYTREE\x02"
+DOUBLE = struct.Struct("<d")
+CHUNK = 1 << 16  # 分块读写的字节数
+MARGIN = 64  # 读一个结点前缓冲区中至少留的字节数，够放一个结点除新字符串定义外的所有内容
+
+
+def write_varint(out, n):
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def write_string(out, strings, string, offset=0):
+    # 写字符串下标 + offset；第一次出现的字符串在下标后面跟上定义
+    key = strings.get(string)
+    if key is not None:
+        write_varint(out, key + offset)
+        return
+    key = strings[string] = len(strings)
+    write_varint(out, key + offset)
+    data = string.encode("utf-8")
+    write_varint(out, len(data))
+    out += data
+
+
+def dump(tree, file):
+    """把语法树tree写入二进制文件对象file，每攒够CHUNK字节写出一次。"""
+    strings = {}  # 字符串 -> 下标
+    out = bytearray(MAGIC)
+    index = {}  # id(结点) -> 先序下标，只记有imported_names的结点和导入名结点
+    wanted = set()
+    owners = []
+    count = 0
+    last_line = 0
+    stack = [tree]
+    while stack:
+        if len(out) >= CHUNK:
+            file.write(out)
+            out = bytearray()
+        node = stack.pop()
+        if node is None:
+            out.append(0)
+            count += 1
+            continue
+        if node.imported_names:
+            owners.append(node)
+            index[id(node)] = count
+            wanted.update(map(id, node.imported_names))
+        elif id(node) in wanted:
+            index[id(node)] = count
+        count += 1
+        name = KIND_NAMES[node.kind]
+        token = node.value
+        key = strings.get(name)
+        if key is None:
+            # 新的类型名：标记后面跟它的定义
+            write_varint(out, (len(strings) << 1 | (token is not None)) + 1)
+            strings[name] = len(strings)
+            data = name.encode("utf-8")
+            write_varint(out, len(data))
+            out += data
+        else:
+            write_varint(out, (key << 1 | (token is not None)) + 1)
+        children = node.children
+        write_varint(out, len(children))
+        if token is not None:
+            write_string(out, strings, token.tokenType._name_)
+            value = token.value
+            if value is None:
+                out.append(0)
+            elif value.__class__ is float:
+                out.append(1)
+                out += DOUBLE.pack(value)
+            else:
+                write_string(out, strings, value, 2)
+            delta = token.linenum - last_line
+            write_varint(out, delta << 1 if delta >= 0 else (-delta << 1) - 1)
+            last_line = token.linenum
+        stack.extend(reversed(children))
+
+    write_varint(out, len(owners))
+    for node in owners:
+        write_varint(out, index[id(node)])
+        write_varint(out, len(node.imported_names))
+        for name in node.imported_names:
+            write_varint(out, index[id(name)])
+    file.write(out)
+
+
+def load(file):
+    """从二进制文件对象file读出dump写入的语法树，每次从文件读CHUNK字节。"""
+    # 语法树中没有循环引用，重建期间关掉循环垃圾回收，否则大量新建的结点会反复触发全量回收
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _load_nodes(file)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _load_nodes(file):
+    data = b""
+    pos = 0
+    limit = 0  # pos超过limit时从文件补充缓冲区
+    eof = False
+
+    def fill(need):
+        # 缓冲区中从pos开始至少留need字节(文件剩下的不够时留下全部)
+        nonlocal data, pos, limit, eof
+        while len(data) - pos < need and not eof:
+            more = file.read(CHUNK)
+            eof = not more
+            data = data[pos:] + more
+            pos = 0
+        limit = len(data) if eof else len(data) - MARGIN
+
+    def read_varint():
+        nonlocal pos
+        result = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    strings = []
+    # 结点类型编码在第一次遇到时按类型名查出，记号类型名换成TokenType，解码时直接按下标取
+    kinds = []
+    types = []
+
+    def define():
+        # 读新字符串的定义，读完后缓冲区中仍留够一个结点的字节
+        nonlocal pos
+        length = read_varint()
+        fill(length)
+        string = data[pos:pos + length].decode("utf-8")
+        pos += length
+        fill(MARGIN)
+        strings.append(string)
+        kinds.append(None)
+        types.append(TokenType.__members__.get(string))
+
+    def read_string(offset=0):
+        key = read_varint() - offset
+        if key == len(strings):
+            define()
+        return key
+
+    fill(len(MAGIC))
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("不是语法树文件")
+    pos = len(MAGIC)
+    fill(MARGIN)
+    unpack = DOUBLE.unpack_from
+
+    nodes = []
+    pending = []  # [结点, 子结点个数, 已挂上的子结点]
+    last_line = 0
+    while True:
+        if pos > limit:
+            fill(MARGIN)
+        # 绝大多数整数只有一个字节，先试一下，不必每次都调用read_varint
+        tag = data[pos]
+        if tag < 0x80:
+            pos += 1
+        else:
+            tag = read_varint()
+        if tag:
+            tag -= 1
+            if tag >> 1 == len(strings):
+                define()
+            size = data[pos]
+            if size < 0x80:
+                pos += 1
+            else:
+                size = read_varint()
+            kind = kinds[tag >> 1]
+            if kind is None:
+                kind = kinds[tag >> 1] = kind_of(strings[tag >> 1])
+            if tag & 1:
+                token_type = types[read_string()]
+                marker = data[pos]
+                if marker == 0:
+                    pos += 1
+                    value = None
+                elif marker == 1:
+                    value = unpack(data, pos + 1)[0]
+                    pos += 9
+                else:
+                    value = strings[read_string(2)]
+                delta = read_varint()
+                last_line += -(delta + 1 >> 1) if delta & 1 else delta >> 1
+                node = Node(kind, value=Token(token_type, value, last_line))
+            else:
+                node = Node(kind)
+        else:
+            node = None
+            size = 0
+        nodes.append(node)
+        if pending:
+            # 结点一建好就挂到父结点下，父结点的最后一个子结点挂上时它就完整了
+            parent = pending[-1]
+            parent[2].append(node)
+            if len(parent[2]) == parent[1]:
+                pending.pop()
+                parent[0].children = tuple(parent[2])
+        else:
+            root = node
+        if size:
+            pending.append([node, size, []])
+        if not pending:
+            break  # 根结点的子树读完了
+
+    fill(MARGIN)
+    for _ in range(read_varint()):
+        if pos > limit:
+            fill(MARGIN)
+        owner = nodes[read_varint()]
+        names = []
+        for _ in range(read_varint()):
+            if pos > limit:
+                fill(MARGIN)
+            names.append(nodes[read_varint()])
+        owner.imported_names = names
+    return root
+
+
+def dumps(tree):
+    buffer = io.BytesIO()
+    dump(tree, buffer)
+    return buffer.getvalue()
+
+
+def loads(data):
+    return load(io.BytesIO(data))
@@ -0,0 +1,136 @@
+# 语法树遍历的公共部分：先序、后序迭代器和按结点类型分派的访问者。
+# 全部用显式栈，不递归，树再深也不会超过Python的递归深度限制。
+# 语法分析树(pyparser.Node)和抽象语法树(pyast)都可以遍历：children函数给出一个结点的子结点序列，
+# 序列中的None子结点被跳过。
+
+from operator import attrgetter
+
+
+def node_children(node):
+    return node.children
+
+
+def preorder(root, children=node_children):
+    """先序遍历，依次产生各个结点。"""
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node is not None:
+            yield node
+            stack.extend(reversed(children(node)))
+
+
+def preorder_depth(root, children=node_children, depth=0):
+    """先序遍历，产生(结点, 深度)，root的深度为depth。"""
+    stack = [(root, depth)]
+    while stack:
+        node, depth = stack.pop()
+        if node is not None:
+            yield node, depth
+            depth += 1
+            stack.extend([(child, depth) for child in reversed(children(node))])
+
+
+def postorder(root, children=node_children):
+    """后序遍历：一个结点的子结点都在它之前产生。"""
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if not expanded:
+            kids = children(node)
+            if kids:
+                stack.append((node, True))
+                stack.extend([(child, False) for child in reversed(kids) if child is not None])
+                continue
+        yield node
+
+
+def leaves(root):
+    """按源程序顺序列出语法分析树中带记号的结点，不再进入它们的子结点。"""
+    result = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            continue
+        if node.value is not None:
+            result.append(node)
+        else:
+            stack.extend(reversed(node.children))
+    return result
+
+
+class Dispatch(dict):
+    # 结点类型 -> 处理函数；没有登记的类型交给default
+    def __init__(self, default):
+        super().__init__()
+        self.default = default
+
+    def __missing__(self, key):
+        return self.default
+
+
+class Visitor:
+    # 按结点类型分派的访问者。子类把处理函数写成visit_<类型名>(self, node, values)方法，
+    # values是结点各子结点的值组成的序列；需要计算哪些子结点由children_<类型名>(self, node)给出，
+    # 没有这个方法时是generic_children(node)，children_<类型名> = None表示这种结点没有要计算的子结点。
+    # 定义子类时生成dispatch和operands两个字典(结点类型 -> 函数)，
+    # 分派只查字典，不用一长串if比较类型。
+    # key(node)给出结点类型，key_of(类型名)把方法名中的类型名换成结点类型；
+    # 默认按语法分析树结点的类型编码kind分派，pyast.AstVisitor按抽象语法树结点的类分派。
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        dispatch = Dispatch(cls.generic_visit)
+        operands = Dispatch(cls.generic_children)
+        for klass in reversed(cls.__mro__):
+            for name, function in vars(klass).items():
+                if name.startswith("visit_"):
+                    dispatch[cls.key_of(name[6:])] = function
+                elif name.startswith("children_"):
+                    operands[cls.key_of(name[9:])] = function
+        for kind in dispatch:
+            # 登记过的类型不经过__missing__
+            operands.setdefault(kind, cls.generic_children)
+        cls.dispatch = dispatch
+        cls.operands = operands
+
+    @staticmethod
+    def key_of(name):
+        from pyparser import kind_of  # pyparser依赖本模块，在函数里导入
+        return kind_of(name)
+
+    key = staticmethod(attrgetter("kind"))
+
+    def generic_children(self, node):
+        # 语法分析树结点的全部子结点，跳过None
+        return [child for child in node.children if child is not None]
+
+    def generic_visit(self, node, values):
+        # 没有对应visit_方法的结点
+        return None
+
+    def visit(self, root):
+        """计算root的值。用显式栈按后序进行：一个结点的子结点都算好后才调用它的处理函数，
+        树再深也不递归。栈中的元组(结点, 处理函数, 子结点个数)表示这个结点等着归约。"""
+        dispatch, operands, key = self.dispatch, self.operands, self.key
+        values = []
+        stack = [root]
+        pop, push, extend, append = stack.pop, stack.append, stack.extend, values.append
+        while stack:
+            node = pop()
+            if node.__class__ is tuple:
+                node, handle, count = node
+                args = values[-count:]
+                del values[-count:]
+                append(handle(self, node, args))
+                continue
+            kind = key(node)
+            children = operands[kind]
+            if children is not None and (children := children(self, node)):
+                push((node, dispatch[kind], len(children)))
+                extend(reversed(children))
+            else:
+                append(dispatch[kind](self, node, ()))
+        return values[0]
+